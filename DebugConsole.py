@@ -48,18 +48,37 @@ try:
 except:
 	HAVE_MEIPASS = False
 
-from collections import OrderedDict, namedtuple
+from array import array
+from collections import OrderedDict, namedtuple, deque
+from heapq import heappush, heappop, heapify, nlargest
+from binascii import hexlify
+from itertools import count as itercount, islice, chain
 from ooliteConsoleServer import *
-from twisted.internet.protocol import Factory
-from twisted.internet import stdio, reactor, tksupport
+from ooliteConsoleServer.ConfigurationState import ConfigurationState
+if dca.g['twisted']:					# always, on Python 2
+	from twisted.internet.protocol import Factory
+	from twisted.internet import stdio, reactor, tksupport
+else:									# asyncio: Twisted isn't needed, nor imported
+	import asyncio
+	from _tkinter import DONT_WAIT, ALL_EVENTS
+	reactor = None
 from OoliteDebugCLIProtocol import OoliteDebugCLIProtocol
 from pickle import load as pickle_load
-from pickle import dump as pickle_dump
+from pickle import dumps as pickle_dumps
+from json import loads as json_loads, dumps as json_dumps
 
-from re import compile
-from logging import StreamHandler, basicConfig, Formatter, getLogger, shutdown, DEBUG, WARNING
+from re import compile, escape as re_escape, error as re_error, IGNORECASE
+from bisect import bisect_left, bisect_right, insort
+from logging import StreamHandler, FileHandler, Formatter, getLogger, makeLogRecord, shutdown, DEBUG, INFO, WARNING
+try:
+	from logging.handlers import QueueHandler, QueueListener
+	from queue import Queue, Full
+except ImportError:						# Python 2: the log file is written as records are logged
+	QueueHandler = QueueListener = None
+from atexit import register as atexit_register
 from traceback import format_tb
 from errno import ENOENT, ENOSPC
+from threading import Thread, Lock
 
 from platform import system as platform_system
 platformIsLinux = platform_system() == 'Linux'
@@ -78,14 +97,16 @@ if Python2:
 	from Tkinter import *
 	import tkFont
 	import tkColorChooser as tkColor
-	from time import clock, asctime
+	from time import clock, asctime, time, strftime, localtime
 	from string import maketrans
+	from StringIO import StringIO
 else:
 	import configparser
 	from tkinter import *
 	import tkinter.font as tkFont
 	import tkinter.colorchooser as tkColor
-	from time import perf_counter, asctime
+	from time import perf_counter, asctime, time, strftime, localtime
+	from io import StringIO
 
 
 # constants
@@ -97,6 +118,9 @@ DEFAULT_ALIAS_POSN = '[{}, {}]'.format(int(MINIMUM_WIDTH/8), int(MINIMUM_HEIGHT)
 DEBUGGER_TITLE = 'Oolite - Javascript Debug Console ({})'.format('executable' if FROZEN else 'Python2' if Python2 else 'Python3')
 GEOMETRY_RE = compile(r'(\d+)x(\d+)\+(\d+)\+(\d+)')
 TRIMSECT_RE = compile(r"\[ *(?P<header>[^]]+?) *\]") # trim section names
+NEWLINE_RE = compile(r'\n')
+WORD_RE = compile(r'\S+')
+DIGITS_RE = compile(r'\d+')
 CONNECTMSG = "Please (re)start Oolite in order to connect."
 
 #Flibble : Adding cli args stuff with sane default paths.
@@ -113,20 +137,49 @@ LOG_BASE = os.path.join ( LOG_PATH, BASE_FNAME )
 
 CFGFILE = CFG_BASE + CFG_EXT
 HISTFILE = HIST_BASE + HIST_EXT
+HISTJOURNAL = HIST_BASE + '-journal' + HIST_EXT	# commands run since HISTFILE was written
 LOGFILE = LOG_BASE + LOG_EXT
 
 
-MAX_HIST_CMDS = 200
-MAX_HIST_SIZE = MAX_HIST_CMDS * 1000
+MAX_HIST_CMDS = 100000
+MAX_HIST_SIZE = 32 * 1024 * 1024	# characters, over all the commands kept
 
 MAX_HIST_VERSION = 3
 MAX_CFG_VERSION = 3
 MAX_LOG_VERSION = 5
+LOG_VERSIONS_MAX_AGE = None		# seconds an old log is kept, None for no limit
+LOG_VERSIONS_MAX_BYTES = None	# bytes kept over all the old logs, None for no limit
+
+LOG_STORE_RECORDS = 1000000			# lines of output kept for scrolling back, beyond what bodyText holds
+LOG_STORE_ARENA = 64 * 1024 * 1024	# bytes of (utf-8) text shared by those lines
+									#   (both in all, split between MaxConnections sessions)
+
+GLYPH_CACHE_WORDS = 4096	# word widths remembered per font for truncating command echoes
+
+HIST_SEARCH_RESULTS = 50		# commands the history search lists
+HIST_SEARCH_CANDIDATES = 2000	# matches ranked for a search, newest first
+HIST_SEARCH_CHECKS = 10000		# commands checked for in-order characters per search, at most
 
 # in seconds
+CONFIG_SAVE_DELAY = 2	# after the last change to an option, before the configuration is saved
 CMD_TIMEOUT = 2			# elapsed time before sending next in queue (current goes in timedOutCmds)
 CMD_TIMEOUT_LONG = 4	#    "  except for a couple long running cmds
 CMD_TIMEOUT_ABORT = 15	#    "  when cmd is abandonded (deleted from timedOutCmds) as data considered stale
+ALIAS_POLL_TIMEOUT = 5	# alias poll is abandoned, allowing the next round of polls
+DECODER_STOP_TIMEOUT = 1	# waiting for the packet decoder's thread to finish, on exit
+
+SILENT_CMDS_IN_FLIGHT = 4	# internal cmds sent ahead of their replies
+SESSION_DEADLINES = ('reply', 'stale', 'aliasPoll')	# deadline kinds that belong to a game, see parkSession
+
+RENDER_BUDGET = 0.008	# time spent printing messages per frame, in seconds
+LIVE_SEARCH_BUDGET = 0.008	# time a search-as-you-type scan runs before yielding to Tk
+RENDER_INTERVAL = 10	# ms between frames, so Tk can redraw & handle input
+RENDER_BACKLOG = 20000	# messages waiting to print before reading from Oolite pauses (until half are done)
+BACKLOG_REPORT = 1000	# a backlog this deep gets its stats logged once cleared
+CONSOLE_LOG_INTERVAL = 50	# ms between moves of logged messages to the render queue
+CONSOLE_LOG_BATCH = 200		# logged messages moved each time, at most
+CONSOLE_LOG_BACKLOG = 5000	# logged messages waiting for the console before more are dropped (from it, not the log file)
+LOG_QUEUE_SIZE = 10000		# records waiting to be written to the log file before more are dropped
 
 TKCOLORS = {
 	'black':	'#000000',
@@ -218,9 +271,14 @@ defaultConfig = OrderedDict((
 				('Geometry', 			DEFAULT_GEOMETRY),
 				('AliasWindow', 		DEFAULT_ALIAS_POSN),
 				('ConsolePort', 		8563),
+				('_MaxConnections_', 	'more than 1 accepts several Oolites at once, switched via the Sessions menu'),
+				('MaxConnections', 		1),
 				('EnableShowConsole',	'Yes'),
 				('MacroExpansion',		'Yes'),
 				('TruncateCmdEcho',		'No'),
+				('CollapseRepeats',		'No'),
+				('_CollapseWindow_', 	'if > 0, a line differing only in its numbers from one of the last this many lines is counted with it (showing the last numbers)'),
+				('CollapseWindow', 		0),
 				('ResetCmdSizeOnRun',	'Yes'),
 				('_PlistOverrides_', 	'if Yes, colors and fonts are replaced with those received from Oolite'),
 				('PlistOverrides', 		'No'),
@@ -245,6 +303,11 @@ defaultConfig = OrderedDict((
 		  ),
 		  ('Aliases', OrderedDict()
 		  ),
+		  ('Routes', OrderedDict((
+				('_Routes_', 	'name = action:colorKeys:regex, action is show, drop or log (to the log file only), '
+								'colorKeys a comma separated list or *; the first rule whose regex matches wins'),
+		   ))
+		  ),
 		))
 
 # globals
@@ -254,59 +317,115 @@ debugLogger = None
 cmdLineHandler = None 
 openMessages = []
 
-SilentMsg = namedtuple('SilentMsg', 'cmd, label, tkVar, discard, timeSent')
+SilentMsg = namedtuple('SilentMsg', 'cmd, label, tkVar, discard, timeSent, rid')
 
 class SimpleConsoleDelegate:
 	__active = Active = False
-
+	attached = False					# output goes to the console window, else to logStore
+	sessionNum = 0
+	ooliteVersion = None
+	unseen = 0							# messages stored while another session is shown
+	clientState = None					# app's silent cmd & alias state for this Oolite while
+										#   another session is shown, see AppWindow.parkSession
 	def __init__(self, protocol):
 		self.protocol = protocol
 		self.identityString = "DebugConsole"
+		self.logStore = None			# its output pane's contents, app.logStore while shown
+		self.replies = []				# replies to its silent cmds while another session is shown
 
 	def __del__(self):
 		if self.__active: self.protocol.factory.activeCount -= 1
 		if cmdLineHandler.inputReceiver is self:  cmdLineHandler.inputReceiver = None
 
 	def acceptConnection(self):
-		return self.protocol.factory.activeCount < 1
+		return self.protocol.factory.activeCount < self.protocol.factory.maxConnections
 
 	def connectionOpened(self, ooliteVersionString):
-		app.colorPrint("Opened connection with Oolite version {}".format(ooliteVersionString))
-		app.colorPrint('')
-		app.bodyText.update_idletasks()
-		app.bodyText.edit_modified(False)
 		self.protocol.factory.activeCount += 1
 		self.__active = self.Active = True
-		cmdLineHandler.inputReceiver = self
-		app.client = self.protocol
-
-	def loadConfig(self, config):		# settings received from client; config is a dict of debugger settings
+		self.ooliteVersion = ooliteVersionString
+		if app.client is None:
+			app.colorPrint("Opened connection with Oolite version {}".format(ooliteVersionString))
+			app.colorPrint('')
+			app.bodyText.update_idletasks()
+			app.bodyText.edit_modified(False)
+			self.attached = True
+			cmdLineHandler.inputReceiver = self
+			app.client = self.protocol
+			self.logStore = app.logStore
+		else:
+			self.logStore = app.newLogStore()
+		app.addSession(self)
+
+	def classifyOutput(self, message, colorKey, emphasisRanges):
+		# called as the packet is decoded, on the decoder's thread: find the request ID,
+		#   result and whether to print for replies to silent cmds, see processMessage
+		reply = None
+		if colorKey in ['command', 'command-result'] and message:
+			ridStart = message.find('<rid:')
+			if ridStart >= 0:
+				ridEnd = message.find('>', ridStart + 5)	# len('<rid:')
+				if ridEnd >= 0 and message[ ridStart + 5:ridEnd ].isdigit():
+					reply = (int(message[ ridStart + 5:ridEnd ]), message[ :ridStart ],
+								not message.startswith('no result') and message.find('<discard:no>') >= 0)
+		return message, colorKey, emphasisRanges, reply
+
+	def bufferMessage(self, message, colorKey, emphasisRanges, reply=None):
+		# while another session is shown: output is stored (routed as it would be printed), replies
+		#   are kept for the silent cmds parked with this session, to be processed when it's shown
+		if reply is not None:
+			self.replies.append(( message, colorKey, emphasisRanges, reply ))
+		elif colorKey in ['command', 'command-result'] and message and '<rid:' in message:
+			return						# a reply without a valid rid
+		elif app.storeMessage(self.logStore, message, colorKey, emphasisRanges):
+			self.unseen += 1
+
+	def loadConfig(self, config, removed):	# settings received from client; config is a dict of all debugger settings
+										#   on connecting, thereafter only those that have changed (and a list of removed keys)
+		if not self.attached:
+			return						# app.selectSession reads them from protocol
 		if not app.connectedToOolite:
 			app.initClientSettings(config)
 		else:
-			app.noteConfig(config)
+			app.noteConfig(config, removed)
 
 	def connectionClosed(self, message):
+		if not self.attached:			# a background session or a rejected connection
+			if self.__active:
+				self.protocol.factory.activeCount -= 1
+				self.__active = self.Active = False
+			app.removeSession(self)
+			return
+		notice = None
 		if message is None or isinstance(message, str):
 			if message is not None and len(message) > 0:
-				app.colorPrint('Connection closed: "{}"'.format(message))
+				notice = 'Connection closed: "{}"'.format(message)
 			else:
-				app.colorPrint("Connection closed with no message at {}.".format(asctime))
+				notice = "Connection closed with no message at {}.".format(asctime)
 		if self.__active:
 			self.protocol.factory.activeCount -= 1
 			self.__active = self.Active = False
 		app.tried=0
 		app.client = None
+		self.attached = False
 		app.disableClientSettings()
+		app.removeSession(self, shown=True, notice=notice)
 
-	def writeToConsole(self, message, colorKey, emphasisRanges):
-		app.handleMessage(message, colorKey, emphasisRanges)
+	def writeToConsole(self, message, colorKey, emphasisRanges, reply=None):
+		if self.attached:
+			app.handleMessage(message, colorKey, emphasisRanges, reply)
+		else:							# idle sessions cost no UI time
+			self.bufferMessage(message, colorKey, emphasisRanges, reply)
 
 	def clearConsole(self):
-		app.bodyClear()
+		if self.attached:
+			app.bodyClear()
+		else:
+			self.logStore.clear()
+			self.unseen = 0
 
 	def showConsole(self):
-		if app.localOptions['EnableShowConsole']:
+		if self.attached and app.localOptions['EnableShowConsole']:
 			if app.top.state() != 'zoomed' and app.top.state() != 'normal':
 				app.top.state('normal')
 			app.top.wm_attributes("-topmost", 1)
@@ -324,6 +443,603 @@ class SimpleConsoleDelegate:
 		self.protocol.closeConnection(message)
 # end class SimpleConsoleDelegate
 
+class TrackedDict(dict):				# a dict that notes the keys set to new values or deleted
+	# dirty holds those keys until the owner clears it; onChange, if set, is
+	# called after each such change.  Setting a key to the value it has is no change.
+	def __init__(self, *args, **kwargs):
+		dict.__init__(self, *args, **kwargs)
+		self.dirty = set()
+		self.onChange = None
+
+	def __setitem__(self, key, value):
+		if key in self and self[key] == value:
+			return
+		dict.__setitem__(self, key, value)
+		self.changed(key)
+
+	def __delitem__(self, key):
+		dict.__delitem__(self, key)
+		self.changed(key)
+
+	def pop(self, key, *default):
+		if key in self:
+			self.changed(key)
+		return dict.pop(self, key, *default)
+
+	def update(self, *args, **kwargs):
+		for key, value in dict(*args, **kwargs).items():
+			self[key] = value
+
+	def setdefault(self, key, value=None):
+		if key not in self:
+			self[key] = value
+		return self[key]
+
+	def clear(self):
+		self.dirty.update(self)
+		dict.clear(self)
+		if self.onChange:
+			self.onChange()
+
+	def changed(self, key):
+		self.dirty.add(key)
+		if self.onChange:
+			self.onChange()
+
+	def setUntracked(self, key, value):	# a value that isn't the owner's to save, eg. one from Oolite
+		dict.__setitem__(self, key, value)
+		self.dirty.discard(key)
+# end class TrackedDict
+
+class DeadlineScheduler:				# one Tk after() for every pending timeout
+	# Each entry has a key; scheduling a key again replaces its deadline.  Entries
+	# live in a heap (superseded ones are skipped when popped) and the single
+	# after() is armed for the earliest, so nothing wakes until a deadline is due.
+	def __init__(self, widget):
+		self.widget = widget
+		self.heap = []					# [deadline, seq, key]
+		self.entries = {}				# key: (seq, fn, args), current entry for key
+		self.seq = itercount()
+		self.afterID = None
+		self.armedFor = None			# deadline afterID will fire at
+
+	def __contains__(self, key):
+		return key in self.entries
+
+	def __len__(self):
+		return len(self.entries)
+
+	def schedule(self, key, delay, fn, *args):	# delay in seconds
+		seq = next(self.seq)
+		deadline = (clock() if Python2 else perf_counter()) + delay
+		self.entries[key] = (seq, fn, args)
+		heappush(self.heap, (deadline, seq, key))
+		if len(self.heap) > 2 * len(self.entries) + 64:	# mostly superseded entries
+			self.compact()
+		self.arm()
+
+	def cancel(self, key):				# heap entry is discarded when it comes due
+		self.entries.pop(key, None)
+
+	def cancelKinds(self, *kinds):		# every key that's a (kind, ...) tuple of one of kinds
+		entries = self.entries
+		for key in [key for key in entries if isinstance(key, tuple) and key[0] in kinds]:
+			del entries[key]
+		self.compact()
+		self.arm()
+
+	def compact(self):
+		entries = self.entries
+		self.heap = [item for item in self.heap
+						if item[2] in entries and entries[item[2]][0] == item[1]]
+		heapify(self.heap)
+
+	def arm(self):
+		heap, entries = self.heap, self.entries
+		while heap and (heap[0][2] not in entries or entries[heap[0][2]][0] != heap[0][1]):
+			heappop(heap)				# drop superseded & cancelled
+		deadline = heap[0][0] if heap else None
+		if deadline == self.armedFor:
+			return
+		if self.afterID is not None:
+			self.widget.after_cancel(self.afterID)
+			self.afterID = None
+		self.armedFor = deadline
+		if deadline is not None:
+			delay = deadline - (clock() if Python2 else perf_counter())
+			self.afterID = self.widget.after(max(0, int(delay * 1000) + 1), self.fire)
+
+	def fire(self):
+		self.afterID = self.armedFor = None
+		heap, entries = self.heap, self.entries
+		now = clock() if Python2 else perf_counter()
+		while heap and heap[0][0] <= now:
+			_, seq, key = heappop(heap)
+			entry = entries.get(key)
+			if entry is None or entry[0] != seq:
+				continue
+			del entries[key]
+			_, fn, args = entry
+			try:
+				fn(*args)
+			except Exception as exc:
+				errmsg = 'Exception in deadline for {}: {}'.format(key, exc)
+				if dca.g['debug']:
+					print(errmsg)
+					print_exc()
+					pdb.set_trace()
+				else:
+					debugLogger.exception(errmsg)
+		self.arm()
+# end class DeadlineScheduler
+
+class LogStore:						# console output, oldest dropped once either limit is reached
+	# Records are numbered in the order added (seq).  Record seq has slot
+	# seq % maxRecords in parallel arrays of timestamp, color tag, and start &
+	# length of its utf-8 text in arena, a bytearray used as a ring.  The rare
+	# emphasis ranges and repeat counts (see AppWindow.collapseRepeat) are kept
+	# in dicts by seq.  Nothing is allocated up front; the arrays and arena grow
+	# until they reach their limits.
+	def __init__(self, maxRecords=LOG_STORE_RECORDS, arenaSize=LOG_STORE_ARENA):
+		self.maxRecords = maxRecords
+		self.arenaSize = arenaSize
+		self.clear()
+
+	def __len__(self):
+		return self.end - self.first
+
+	def clear(self):
+		self.times = array('d')
+		self.keys = []
+		self.starts = array('l')
+		self.lengths = array('l')
+		self.emphases = {}
+		self.repeats = {}				# seq: (copies not stored, last copy's text if it differs)
+		self.arena = bytearray()
+		self.head = 0					# arena offset for the next text
+		self.first = self.end = 0		# seq of the oldest record, seq of the next
+
+	def append(self, text, key, emphasisRanges=None):	# returns seq of the new record
+		data = text if isinstance(text, bytes) else text.encode('utf-8')
+		size = min(len(data), self.arenaSize)
+		start = self.head
+		if start + size > self.arenaSize:	# wrap, dropping what's left from the previous lap
+			self.dropOverlapping(start, self.arenaSize)
+			start = 0
+		stop = start + size
+		self.dropOverlapping(start, stop)
+		if self.end - self.first >= self.maxRecords:
+			self.drop(1)
+		self.arena[start:stop] = data[:size]
+		self.head = stop
+		seq = self.end
+		slot = seq % self.maxRecords
+		if slot == len(self.times):
+			self.times.append(time())
+			self.keys.append(key)
+			self.starts.append(start)
+			self.lengths.append(size)
+		else:
+			self.times[slot] = time()
+			self.keys[slot] = key
+			self.starts[slot] = start
+			self.lengths[slot] = size
+		if emphasisRanges:
+			self.emphases[seq] = tuple(emphasisRanges)
+		self.end = seq + 1
+		return seq
+
+	def dropOverlapping(self, start, stop):	# drop oldest records with text in arena[start:stop]
+		# Texts are in the arena in seq order, so the first one clear of
+		# start..stop ends the overlap; empty ones have no bytes to tell by,
+		# and go only if an overlapping one after them does.
+		starts, lengths, maxRecords = self.starts, self.lengths, self.maxRecords
+		seq, end, dropTo = self.first, self.end, self.first
+		while seq < end:
+			slot = seq % maxRecords
+			seq += 1
+			if lengths[slot] == 0:
+				continue
+			if starts[slot] >= stop or starts[slot] + lengths[slot] <= start:
+				break
+			dropTo = seq
+		if dropTo > self.first:
+			self.drop(dropTo - self.first)
+
+	def drop(self, count):
+		for extras in (self.emphases, self.repeats):
+			if extras:
+				for seq in range(self.first, self.first + count):
+					extras.pop(seq, None)
+		self.first += count
+
+	def addRepeat(self, seq, variant=None):	# another copy of record seq, False if it's gone
+		if seq < self.first or seq >= self.end:
+			return False
+		count, _ = self.repeats.get(seq, (0, None))
+		self.repeats[seq] = (count + 1, variant)
+		return True
+
+	def repeat(self, seq):				# (count, variant) as for addRepeat, or None
+		return self.repeats.get(seq)
+
+	def record(self, seq):				# (timestamp, color tag, text, emphasis ranges or None)
+		slot = seq % self.maxRecords
+		start = self.starts[slot]
+		text = self.arena[start:start + self.lengths[slot]].decode('utf-8', 'replace')
+		return self.times[slot], self.keys[slot], text, self.emphases.get(seq)
+
+	def key(self, seq):
+		return self.keys[seq % self.maxRecords]
+
+	def records(self, start, stop):		# records start..stop-1 that are still kept
+		for seq in range(max(start, self.first), min(stop, self.end)):
+			yield self.record(seq)
+# end class LogStore
+
+class CommandHistory:				# commands run, oldest first, each kept once
+	# entries holds the commands in the order last run, with None where one was
+	# run again, deleted or trimmed; entries are compacted when half are None, so
+	# a position stays valid until the next add().  where maps each command to
+	# its position and ordered is every command sorted, for prefix searches.
+	# Changes are appended to a journal as they happen, one json string a line
+	# after '+' (run) or '-' (deleted), and folded into the pickled list (the
+	# format the history file has always had) by save().
+	def __init__(self, versions, journalPath):
+		self.versions = versions		# FileVersions of the history file
+		self.journalPath = journalPath
+		self.journal = None				# open journal, for appending
+		self.journalFailed = False
+		self.clear()
+
+	def __len__(self):
+		return len(self.where)
+
+	def __contains__(self, cmd):
+		return cmd in self.where
+
+	def clear(self):
+		self.entries = []
+		self.where = {}
+		self.ordered = []
+		self.start = 0					# entries before this are all None
+		self.size = 0					# characters in all commands
+		self.changed = False			# since load or save
+
+	def get(self, pos):					# command at pos, or None
+		return self.entries[pos] if 0 <= pos < len(self.entries) else None
+
+	def last(self):						# position of the newest command, or -1
+		return self.newer(len(self.entries), -1)
+
+	def older(self, pos):				# position of the command before pos, or -1
+		entries, start = self.entries, self.start
+		pos -= 1
+		while pos >= start and entries[pos] is None:
+			pos -= 1
+		return pos if pos >= start else -1
+
+	def newer(self, pos, direction=1):	# position of the command after pos, or -1
+		if direction < 0:
+			return self.older(pos)
+		entries = self.entries
+		pos += 1
+		while pos < len(entries) and entries[pos] is None:
+			pos += 1
+		return pos if pos < len(entries) else -1
+
+	def commands(self):					# oldest first
+		return [cmd for cmd in islice(self.entries, self.start, None) if cmd is not None]
+
+	def matches(self, prefix):			# positions of the commands starting with prefix, ascending
+		if not prefix:
+			return [pos for pos in range(self.start, len(self.entries))
+						if self.entries[pos] is not None]
+		ordered, where = self.ordered, self.where
+		hits = []
+		for idx in range(bisect_left(ordered, prefix), len(ordered)):
+			if not ordered[idx].startswith(prefix):
+				break
+			hits.append(where[ordered[idx]])
+		hits.sort()
+		return hits
+
+	def add(self, cmd, journal=True):
+		pos = self.where.get(cmd)
+		if pos is None:
+			insort(self.ordered, cmd)
+			self.size += len(cmd)
+		else:
+			self.entries[pos] = None
+		if len(self.entries) - self.start > 2 * len(self.where) + 64:
+			self.compact()
+		self.where[cmd] = len(self.entries)
+		self.entries.append(cmd)
+		self.changed = True
+		if journal:
+			self.record('+', cmd)
+		self.trim()
+
+	def remove(self, pos, journal=True):
+		cmd = self.get(pos)
+		if cmd is not None:
+			self.discard(pos)
+			self.changed = True
+			if journal:
+				self.record('-', cmd)
+
+	def discard(self, pos):
+		cmd = self.entries[pos]
+		self.entries[pos] = None
+		del self.where[cmd]
+		del self.ordered[bisect_left(self.ordered, cmd)]
+		self.size -= len(cmd)
+
+	def trim(self):						# drop the oldest commands over the limits
+		while len(self.where) > MAX_HIST_CMDS or (self.size > MAX_HIST_SIZE and self.where):
+			pos = self.newer(self.start - 1)
+			self.discard(pos)
+			self.start = pos + 1
+			self.changed = True
+
+	def setCommands(self, commands):	# replace all with commands, oldest first, as if each were add()ed
+		latest = dict((cmd, pos) for pos, cmd in enumerate(commands))
+		kept, size = [], 0
+		for pos in range(len(commands) - 1, -1, -1):	# newest first, as many as trim() would keep
+			cmd = commands[pos]
+			if latest[cmd] != pos:		# run again later
+				continue
+			if len(kept) >= MAX_HIST_CMDS or size + len(cmd) > MAX_HIST_SIZE:
+				break
+			kept.append(cmd)
+			size += len(cmd)
+		kept.reverse()
+		self.entries = kept
+		self.where = dict((cmd, pos) for pos, cmd in enumerate(kept))
+		self.ordered = sorted(self.where)
+		self.start, self.size = 0, size
+		self.changed = True
+
+	def compact(self):
+		self.entries = self.commands()
+		self.where = dict((cmd, pos) for pos, cmd in enumerate(self.entries))
+		self.start = 0
+
+	def record(self, op, cmd):			# append to the journal, so a crash loses nothing
+		if self.journalFailed:
+			return
+		try:
+			if self.journal is None:
+				self.journal = open(self.journalPath, 'ab')
+			self.journal.write('{}{}\n'.format(op, json_dumps(cmd)).encode('ascii'))
+			self.journal.flush()
+		except Exception as exc:
+			self.journalFailed = True
+			debugLogger.exception('Failed to journal command history: {}'.format(exc))
+
+	def load(self):						# the saved list, then the journal of any session that didn't save
+		self.clear()
+		commands = None
+		try:
+			with open(self.versions.fname, 'rb') as hfile:
+				commands = pickle_load(hfile)
+		except IOError as exc:
+			if exc.errno == ENOENT:
+				debugLogger.debug('No command history file found')
+			else:
+				debugLogger.exception('IOError loading command history: {}'.format(exc))
+		except Exception as exc:
+			debugLogger.exception('Error loading command history: {}'.format(exc))
+		if isinstance(commands, list):
+			self.setCommands(commands)
+		self.changed = False
+		replayed = 0
+		try:
+			with open(self.journalPath, 'rb') as jfile:
+				for line in jfile:
+					try:			# a crash may have cut the last line short
+						op, cmd = line[:1].decode('ascii'), json_loads(line[1:].decode('ascii'))
+					except ValueError:
+						continue
+					if op == '+':
+						self.add(cmd, journal=False)
+					elif op == '-' and cmd in self.where:
+						self.remove(self.where[cmd], journal=False)
+					replayed += 1
+		except IOError as exc:
+			if exc.errno != ENOENT:
+				debugLogger.exception('IOError loading command history journal: {}'.format(exc))
+		return replayed
+
+	def save(self, keep=True):			# fold the journal into the history file (keep=False discards it)
+		self.closeJournal()
+		if keep and self.changed:		# the journal is kept unless this succeeds
+			replaceFile(self.versions.fname, pickle_dumps(self.commands(), protocol=2),
+						self.versions.rotate, mode='wb')
+			self.changed = False
+		if os.path.exists(self.journalPath):
+			os.remove(self.journalPath)
+
+	def closeJournal(self):
+		if self.journal is not None:
+			try:
+				self.journal.close()
+			except Exception:
+				pass
+			self.journal = None
+# end class CommandHistory
+
+class HistorySearch:				# ranked fuzzy search over every kept version of the history
+	# Commands from the rotated history files and the current history get an id
+	# each, higher for more recently run; freq counts the versions (and runs this
+	# session) a command is in.  build() indexes from the newest down, a slice at
+	# a time: grams maps each trigram of the lowercased command to an array of ids
+	# (descending), chars maps each character to a bitmask of ids.  Commands run
+	# after the build started are in recent, which is scanned.
+	# A query's matches are commands containing it (found through the rarest of
+	# its trigrams), then ones containing its characters in order (through the
+	# bitmasks, checked with a regex); they are ranked on how closely they match,
+	# then recency and frequency.
+	def __init__(self, history):
+		self.history = history
+		self.texts = []					# by id; None once a command is run again (under a new id)
+		self.lowered = []
+		self.freq = array('l')
+		self.ids = {}					# command: id
+		self.grams = {}
+		self.chars = {}					# character: int, bitmask of ids
+		self.charBits = {}				# character: bytearray, bitmask being built
+		self.recent = []				# ids added since the build started
+		self.pending = []				# (command, run) changes before build() has ids
+		self.indexedFrom = None			# lowest id indexed, None before build() has ids
+
+	def versions(self):					# lists of commands, oldest first
+		for fname in reversed(self.history.versions.versions()):
+			try:
+				with open(fname, 'rb') as hfile:
+					commands = pickle_load(hfile)
+			except IOError as exc:
+				if exc.errno != ENOENT:
+					debugLogger.exception('IOError loading command history: {}'.format(exc))
+				continue
+			except Exception as exc:
+				debugLogger.exception('Error loading command history: {}'.format(exc))
+				continue
+			if isinstance(commands, list):
+				yield commands
+
+	def build(self):					# a generator, doing a slice of the work each step
+		merged, freq = OrderedDict(), {}
+		for commands in chain(self.versions(), [self.history.commands()]):
+			yield
+			for count, cmd in enumerate(commands, 1):
+				if cmd in merged:
+					del merged[cmd]
+				merged[cmd] = None
+				freq[cmd] = freq.get(cmd, 0) + 1
+				if count & 4095 == 0:
+					yield
+		ids, texts, lowered = self.ids, self.texts, self.lowered
+		for cmd in merged:
+			ids[cmd] = len(texts)
+			texts.append(cmd)
+			lowered.append(cmd.lower())
+			self.freq.append(freq[cmd])
+			if len(texts) & 8191 == 0:
+				yield
+		merged = freq = None
+		top = self.indexedFrom = len(self.texts)
+		for cmd, run in self.pending:	# changes while the versions loaded
+			if run:
+				self.add(cmd)
+			else:
+				self.remove(cmd)
+		self.pending = None
+		yield
+		size = (top >> 3) + 1
+		grams, charBits, lowered = self.grams, self.charBits, self.lowered
+		for cid in range(top - 1, -1, -1):
+			text = lowered[cid]
+			for gram in set([text[pos:pos + 3] for pos in range(len(text) - 2)]):
+				if gram in grams:
+					grams[gram].append(cid)
+				else:
+					grams[gram] = array('l', (cid,))
+			byte, bit = cid >> 3, 1 << (cid & 7)
+			for ch in set(text):
+				if ch not in charBits:
+					charBits[ch] = bytearray(size)
+				charBits[ch][byte] |= bit
+			self.indexedFrom = cid
+			if cid & 511 == 0:
+				self.updateChars()
+				yield
+		self.updateChars()
+		self.charBits = None
+
+	def updateChars(self):				# bitmasks from charBits, for searching
+		for ch, bits in self.charBits.items():
+			self.chars[ch] = int(hexlify(bytes(bits[::-1])), 16)
+
+	def add(self, cmd):					# a command just run
+		if self.indexedFrom is None:
+			self.pending.append((cmd, True))
+			return
+		cid = self.ids.get(cmd)
+		count = 1
+		if cid is not None:
+			self.texts[cid] = self.lowered[cid] = None
+			count += self.freq[cid]
+		cid = self.ids[cmd] = len(self.texts)
+		self.texts.append(cmd)
+		self.lowered.append(cmd.lower())
+		self.freq.append(count)
+		self.recent.append(cid)
+
+	def remove(self, cmd):				# a command deleted from the history
+		if self.indexedFrom is None:
+			self.pending.append((cmd, False))
+			return
+		cid = self.ids.pop(cmd, None)
+		if cid is not None:
+			self.texts[cid] = self.lowered[cid] = None
+
+	def search(self, query, limit=HIST_SEARCH_RESULTS):	# best matching commands, best first
+		query = query.strip().lower()
+		letters = ''.join(query.split())	# for in-order matching, where spaces match anything
+		texts, lowered = self.texts, self.lowered
+		if not query:					# newest first
+			found = []
+			for cid in range(len(texts) - 1, -1, -1):
+				if texts[cid] is not None:
+					found.append(texts[cid])
+					if len(found) == limit:
+						break
+			return found
+		fuzzy = compile(''.join('{}[^{}]*'.format(re_escape(ch), re_escape(nxt))
+							for ch, nxt in zip(letters, letters[1:])) + re_escape(letters[-1]))
+		size = len(letters)
+		matches = {}					# id: how closely it matches, 0..1
+		def check(cid):
+			text = lowered[cid]
+			if text is None or cid in matches:
+				return
+			pos = text.find(query)
+			if pos == 0:
+				matches[cid] = 1.0
+			elif pos > 0:
+				matches[cid] = 0.8
+			else:
+				match = fuzzy.search(text)
+				if match:
+					matches[cid] = 0.6 * size / (match.end() - match.start())
+		for cid in reversed(self.recent):
+			check(cid)
+		if self.indexedFrom is not None and size >= 3:
+			postings = [self.grams.get(query[pos:pos + 3]) for pos in range(size - 2)]
+			if None not in postings:
+				for cid in min(postings, key=len):
+					if len(matches) >= HIST_SEARCH_CANDIDATES:
+						break
+					if lowered[cid] is not None and query in lowered[cid]:
+						check(cid)
+		chars = self.chars
+		if chars and all(ch in chars for ch in letters):
+			mask = -1
+			for ch in set(letters):
+				mask &= chars[ch]
+			bits = bin(mask)			# '0b1...', the newest id's bit first
+			last, idx, checks = len(bits) - 1, bits.find('1', 2), 0
+			while idx > 0 and len(matches) < HIST_SEARCH_CANDIDATES and checks < HIST_SEARCH_CHECKS:
+				check(last - idx)
+				checks += 1
+				idx = bits.find('1', idx + 1)
+		total, freq = float(len(texts)), self.freq
+		ranked = nlargest(limit, matches, key=lambda cid:
+							4 * matches[cid] + cid / total + min(freq[cid], 8) / 8.0)
+		return [texts[cid] for cid in ranked]
+# end class HistorySearch
+
 class TopWindow(Toplevel):
 	def __init__(self, parent, name=True, enduring=False, showNow=True):
 		Toplevel.__init__(self, parent)
@@ -558,6 +1274,111 @@ class OoBarMenu(Menu):					# for menubar pulldown menus that support fonts!
 		self.destroy()
 # end class OoBarMenu
 
+class GlyphWidths:					# a font's advance widths, for measuring text without Tcl calls
+	# The printable ascii glyphs are measured when the table is built, others the
+	# first time they're seen; widths are sums of advances, so kerning is ignored.
+	# Whole words are also kept, in an LRU cache of at most cacheSize.
+	def __init__(self, font, cacheSize=GLYPH_CACHE_WORDS):
+		self.font = font
+		self.advances = dict((chr(code), font.measure(chr(code))) for code in range(32, 127))
+		self.words = OrderedDict()
+		self.cacheSize = cacheSize
+
+	def glyph(self, ch):				# measure a character not yet in the table
+		width = self.advances[ch] = self.font.measure(ch)
+		return width
+
+	def width(self, text):
+		advances = self.advances
+		try:
+			return sum(map(advances.__getitem__, text))
+		except KeyError:
+			return sum(advances[ch] if ch in advances else self.glyph(ch) for ch in text)
+
+	def measure(self, word):			# width of word, via the cache
+		words = self.words
+		if word in words:
+			width = words[word] = words.pop(word)	# now most recently used
+			return width
+		width = words[word] = self.width(word)
+		if len(words) > self.cacheSize:
+			words.popitem(last=False)
+		return width
+
+class TextSnapshot:					# a Text's contents fetched once, for searching with re
+	# Matches are found in Python and their offsets converted to Tk indices via a
+	# table of line starts, so a search costs one .get however many it finds.
+	# The snapshot is of txt from index start (eg. a mark) to its end.
+	def __init__(self, txt, start='1.0'):
+		self.txt = txt
+		line, char = txt.index(start).split('.')
+		self.firstLine, self.firstChar = int(line), int(char)
+		self.text = txt.get(start, 'end-1c')
+		self.end = txt.index('end-1c')
+		# output added moves end-1c past this mark, trimming moves the mark up a
+		#   line or more, so it catches both at once (when end-1c alone may not)
+		txt.mark_set('snapshotEnd', self.end)
+		txt.mark_gravity('snapshotEnd', LEFT)
+		self.lineStarts = None			# built when first needed
+
+	def isCurrent(self):
+		txt = self.txt
+		return txt.index('end-1c') == self.end and txt.index('snapshotEnd') == self.end
+
+	def getLineStarts(self):
+		if self.lineStarts is None:
+			self.lineStarts = [0]
+			self.lineStarts.extend(match.end() for match in NEWLINE_RE.finditer(self.text))
+		return self.lineStarts
+
+	def index(self, offset):			# Tk "line.char" of offset into text
+		lineStarts = self.getLineStarts()
+		line = bisect_right(lineStarts, offset)
+		char = offset - lineStarts[line - 1]
+		return '{}.{}'.format(line + self.firstLine - 1, char + self.firstChar if line == 1 else char)
+
+	def offset(self, index):			# offset into text of a Tk index (at or after start)
+		lineStarts = self.getLineStarts()
+		line, char = self.txt.index(index).split('.')
+		line, char = int(line) - self.firstLine + 1, int(char)
+		if line <= 1:
+			line, char = 1, max(0, char - self.firstChar) if line == 1 else 0
+		line = min(line, len(lineStarts))
+		return min(lineStarts[line - 1] + char, len(self.text))
+
+	def count(self, regex):				# number of non-empty matches
+		if regex.groups == 0:			# findall is quickest, but returns groups if there are any
+			found = regex.findall(self.text)
+			return len(found) - found.count('')
+		return sum(1 for match in regex.finditer(self.text) if match.end() > match.start())
+
+	def findAll(self, regex):			# spans of all non-empty matches
+		return [match.span() for match in regex.finditer(self.text) if match.end() > match.start()]
+
+	def findNext(self, regex, offset, backwards=False):	# span of nearest match starting after offset
+		if not backwards:				#   (before offset if backwards), or None
+			for match in regex.finditer(self.text, offset + 1):
+				if match.end() > match.start():
+					return match.span()
+			return None
+		found = None
+		for match in regex.finditer(self.text):
+			if match.start() >= offset:
+				break
+			if match.end() > match.start():
+				found = match.span()
+		return found
+
+	def tagSpans(self, tag, spans):		# add tag to all spans, 1000 per call
+		index = self.index
+		for start in range(0, len(spans), 1000):
+			ranges = []
+			for first, last in spans[start:start + 1000]:
+				ranges.append(index(first))
+				ranges.append(index(last))
+			self.txt.tag_add(tag, *ranges)
+# end class TextSnapshot
+
 class TextPopup(Menu):
 	_count = 0
 	def __init__(self, master, histCmd=None):
@@ -666,7 +1487,7 @@ class TextPopup(Menu):
 										value=1, text='/\\', bg='#ddd', relief='raised', bd=2,
 										 command=self.startSearch, font=defaultFont)
 										 
-		searchRegexText = 'Regex (POSIX extended REs with some extensions)'
+		searchRegexText = 'Regex (Python regular expression syntax)'
 		searchEntryWidth = len(searchRegexText)
 		self.searchHistory = ScrollingListBox(searchBoxFrame, font=defaultFont, exportselection=0, height=5)
 		scrollW = self.searchHistory.scrollbar.winfo_reqwidth()
@@ -698,7 +1519,7 @@ class TextPopup(Menu):
 		self.searchBackwardsBtn = Checkbutton(searchBoxFrame, variable=self.searchBackwards, pady=3,
 											text='Backwards', font=defaultFont)	# pady=3 to match height of Button
 		self.searchWordsOnly = IntVar(name='textPopup_'+str(TextPopup._count)+'_searchWordsOnly')
-		# - default any match, word boundary not detected by tk.search
+		# - default any match, else match must not be next to a word character
 		self.searchWordsOnlyBtn = Checkbutton(searchBoxFrame, variable=self.searchWordsOnly, pady=3,
 											text='Words only', font=defaultFont)
 		self.searchCase = IntVar(value=1, name='textPopup_'+str(TextPopup._count)+'_searchCase')
@@ -710,7 +1531,7 @@ class TextPopup(Menu):
 		self.searchWrapBtn = Checkbutton(searchBoxFrame, variable=self.searchWrap, pady=3,
 										text='Wrap search', font=defaultFont)
 		self.searchRegex = IntVar(name='textPopup_'+str(TextPopup._count)+'_searchRegex')
-		# - default off, regexp=0 or exact=1; subset of Py's regexs: . ^ [c 1 …] (…) * + ? e1|e2
+		# - default off, pattern is escaped; see compileSearch
 		self.searchRegexBtn = Checkbutton(searchBoxFrame, variable=self.searchRegex, pady=3,
 										text=searchRegexText, font=defaultFont)
 		self.searchLabelStr = StringVar(name='textPopup_'+str(TextPopup._count)+'_searchLabelStr')
@@ -806,6 +1627,8 @@ class TextPopup(Menu):
 			self.searchTargetEntryClear.config(state=NORMAL)
 			self.searchCountBtn.config(state=NORMAL)
 			self.searchMarkall.config(state=NORMAL)
+		self.cancelLiveSearch()			# search as you type, once typing pauses
+		self.liveAfterID = self.after(self.liveSearchDelay, self.liveSearch)
 		return True						# allow all changes
 
 	def getGeometry(self, widget, coords=False):
@@ -917,6 +1740,7 @@ class TextPopup(Menu):
 	patternMatched = False
 	lastPatternFound = True
 	def startSearch(self, counting=False, marking=False):
+		self.cancelLiveSearch()
 		reverseSearch = self.searchBackwards.get()
 		searchBack = self.searchDirn.get() 		# arrow buttons; for consistency, 1 => backwards
 		if searchBack == 0 or searchBack == 1:	# came in via a button, they override searchBackwards
@@ -942,62 +1766,33 @@ class TextPopup(Menu):
 				self.searchLabelStr.set('')
 				return
 		self.lastPattern = pattern
-		if self.lastSearchIdx == '':	# first time visit
-			searchFrom = self.lastSearchIdx = self.formatMouseIndex()
-		else:
-			searchFrom = self.lastSearchIdx if searchBack else '{} +1c'.format(self.lastSearchIdx)
-		idx = searchFrom if searchBack else '{} -1c'.format(searchFrom)
-		stopSearch = None if wrapping or counting or marking else '1.0' if searchBack else END
-		findings = []
-		found = False
-		wrapped = False
-		while not found or counting or marking:
-			searchFrom = idx if searchBack else '{} +1c'.format(idx)
-			idx = ''
-			try:
-				idx = txt.search(pattern, searchFrom, backwards=searchBack, stopindex=stopSearch,
-								 count=self.searchResultLen, nocase=ignoreCase, elide=1, regexp=regularExpn)
-			except TclError as exc:
-				errmsg = 'TclError: \n{}\n\n(www.tcl.tk/man/tcl8.5/TclCmd/re_syntax.htm)'.format(
-						exc.message.replace(':','\n'))
-				openMessages.append(OoInfoBox(self.top, errmsg, font=self.defaultFont))
-				debugLogger.error(errmsg)
-			except Exception as exc:
-				errmsg = 'Exception: {}'.format(exc)
-				if dca.g['debug']:
-					print(errmsg)
-					print_exc()
-					pdb.set_trace()
-				else:
-					debugLogger.exception(errmsg)
-
-			found = idx != ''
-			if not found: break
-			foundLength = self.searchResultLen.get()
-			if foundLength == 0: break # degenerate case for re's
-			endIdx = txt.index('{}+{}c'.format(idx, foundLength))
-			if wordsOnly:
-				if txt.compare(idx, '!=', '{} wordstart'.format(idx)) or \
-				   txt.compare('{} +1c'.format(endIdx), '!=', '{} wordend'.format(endIdx)): # it's not a word
-					continue
-			if not found and not (counting or  marking):
-				break					# quit on 1st match in normal search
-			if idx in findings:
-				break					# we've wrapped around
-			elif found:
-				findings.append(idx)
-				if marking:
-					txt.tag_add('searchMark', idx, endIdx)
-		haveMarks = len(txt.tag_ranges('searchMark')) > 0
-		self.searchMarkall.config(text='Clear marks' if haveMarks else 'Mark all')
+		regex = self.compileSearch(pattern, regularExpn, ignoreCase, wordsOnly)
+		if regex is None:
+			return
+		snapshot = TextSnapshot(txt)
 		if counting or marking:
-			count = len(findings)
+			if marking:
+				spans = snapshot.findAll(regex)
+				snapshot.tagSpans('searchMark', spans)
+				count = len(spans)
+			else:
+				count = snapshot.count(regex)
+			haveMarks = len(txt.tag_ranges('searchMark')) > 0
+			self.searchMarkall.config(text='Clear marks' if haveMarks else 'Mark all')
 			self.searchLabelStr.set('{} matches {}'.format(
 				('no' if count == 0 else count), ('found' if counting else 'marked')))
 			return
-		if stopSearch is None and found and self.lastPatternFound: # check if we wrapped
-			wrapped = txt.compare(idx, '>=' if searchBack else '<=', self.lastSearchIdx)
+		if self.lastSearchIdx == '':	# first time visit
+			self.lastSearchIdx = self.formatMouseIndex()
+		searchFrom = snapshot.offset(self.lastSearchIdx)
+		span = snapshot.findNext(regex, searchFrom, searchBack)
+		wrapped = False
+		if span is None and wrapping:
+			span = snapshot.findNext(regex, len(snapshot.text) if searchBack else -1, searchBack)
+			wrapped = span is not None and self.lastPatternFound
+		found = span is not None
 		if found: 						# "line.char" of start of match
+			idx, endIdx = snapshot.index(span[0]), snapshot.index(span[1])
 			txt.tag_remove(SEL, '1.0', END)
 			txt.tag_add(SEL, idx, endIdx)
 			txt.see(idx)
@@ -1014,6 +1809,152 @@ class TextPopup(Menu):
 			self.lastSearchIdx = '1.0' if searchBack else END
 		self.lastPatternFound = True if self.patternMatched else found
 
+	def compileSearch(self, pattern, regularExpn, ignoreCase, wordsOnly, quiet=False):
+		if not regularExpn:
+			pattern = re_escape(pattern)
+		if wordsOnly:
+			pattern = r'(?<!\w)(?:{})(?!\w)'.format(pattern)
+		try:
+			return compile(pattern, IGNORECASE if ignoreCase else 0)
+		except re_error as exc:
+			if quiet:					# still being typed
+				return None
+			errmsg = 'Invalid regular expression: \n{}\n\n(docs.python.org/library/re.html)'.format(exc)
+			openMessages.append(OoInfoBox(self.top, errmsg, font=self.defaultFont))
+			debugLogger.error(errmsg)
+		except Exception as exc:
+			errmsg = 'Exception: {}'.format(exc)
+			if dca.g['debug']:
+				print(errmsg)
+				print_exc()
+				pdb.set_trace()
+			else:
+				debugLogger.exception(errmsg)
+		return None
+
+	# Search as you type: each change to the target marks all its matches,
+	# scanning in slices of LIVE_SEARCH_BUDGET so Tk stays responsive and the
+	# next key cancels the rest.  For a plain (non-regex) target, the start of
+	# every occurrence is kept in liveStarts; when the target is extended, only
+	# those starts are rechecked instead of rescanning the text.
+	# Output arriving (or being trimmed) during a scan doesn't restart it: the
+	# marks made move with the text, and so does the 'liveSearchFrom' mark, set
+	# after each slice where the scan got to, so it goes on from there over a
+	# fresh snapshot of the rest (from that line's start, for any lookbehind).
+	liveSearchDelay = 50				# ms after a key before searching
+	liveAfterID = None
+	liveScan = None						# generator of the running scan, see liveMatches
+	liveSnapshot = None
+	liveRegex = liveLiteral = None		# of the running scan
+	liveResumed = False					# the running scan went on over a fresh snapshot
+	liveKey = None						# (target, options) liveStarts is complete for
+	liveStarts = None
+	liveCount = 0
+	def cancelLiveSearch(self):
+		if self.liveAfterID is not None:
+			self.after_cancel(self.liveAfterID)
+			self.liveAfterID = None
+		self.liveScan = None
+
+	def liveSearch(self):
+		self.liveAfterID = None
+		txt = self.master
+		pattern = self.searchTarget.get()
+		txt.tag_remove('searchMark', '1.0', END)
+		self.searchMarkall.config(text='Mark all')
+		self.liveCount = 0
+		if len(pattern) == 0:
+			self.liveKey = None
+			self.searchLabelStr.set('')
+			return
+		wordsOnly = self.searchWordsOnly.get() == 1
+		ignoreCase = self.searchCase.get() == 1
+		regularExpn = self.searchRegex.get() == 1
+		regex = self.compileSearch(pattern, regularExpn, ignoreCase, wordsOnly, quiet=True)
+		if regex is None:
+			self.searchLabelStr.set('incomplete regular expression')
+			return
+		options = (regularExpn, ignoreCase, wordsOnly)
+		previous, lastKey = self.liveStarts, self.liveKey
+		self.liveKey = self.liveStarts = None
+		literal = None
+		if not regularExpn:				# zero width, so finditer gives overlapping occurrences
+			literal = compile('(?={})'.format(re_escape(pattern)), IGNORECASE if ignoreCase else 0)
+			refining = lastKey is not None and lastKey[1] == options and \
+						pattern.startswith(lastKey[0]) and self.liveSnapshot.isCurrent()
+			if not refining:
+				previous = None
+			self.liveStarts = []
+		if previous is None:
+			self.liveSnapshot = TextSnapshot(txt)
+		txt.mark_set('liveSearchFrom', '1.0')
+		txt.mark_gravity('liveSearchFrom', LEFT)	# not past output appended at it
+		self.liveRegex, self.liveLiteral, self.liveResumed = regex, literal, False
+		self.liveScan = self.liveMatches(self.liveSnapshot.text, regex, literal, previous)
+		self.liveSearchStep((pattern, options))
+
+	def liveMatches(self, text, regex, literal, previous, pos=0):
+		# yields the span of each match from pos, else the offset scanned to
+		if literal is None:				# regex, scan it all
+			for match in regex.finditer(text, pos):
+				yield match.span() if match.end() > match.start() else match.end()
+			return
+		starts, lastEnd = self.liveStarts if self.liveStarts is not None else [], pos
+		for start in (previous if previous is not None else
+						(match.start() for match in literal.finditer(text, pos))):
+			if previous is not None and literal.match(text, start) is None:
+				yield max(start, lastEnd)
+				continue
+			starts.append(start)
+			match = regex.match(text, start) if start >= lastEnd else None
+			if match is None or match.end() == start:
+				yield max(start + 1, lastEnd)
+				continue
+			lastEnd = match.end()
+			yield match.span()
+
+	def liveSearchStep(self, key):
+		self.liveAfterID = None
+		snapshot, scan = self.liveSnapshot, self.liveScan
+		if scan is None:
+			return
+		if not snapshot.isCurrent():	# text changed under us, go on from where the scan got to
+			self.liveStarts = None		# no longer every occurrence, so can't be refined
+			self.liveResumed = True
+			snapshot = self.liveSnapshot = TextSnapshot(self.master, 'liveSearchFrom linestart')
+			scan = self.liveScan = self.liveMatches(snapshot.text, self.liveRegex, self.liveLiteral,
+													None, snapshot.offset('liveSearchFrom'))
+		deadline = (clock() if Python2 else perf_counter()) + LIVE_SEARCH_BUDGET
+		spans, finished, count, scannedTo = [], True, 0, None
+		for span in scan:				# marking takes longer than finding, so 1000 marks per slice at most
+			if span.__class__ is tuple:
+				spans.append(span)
+				scannedTo = span[1]
+				if len(spans) == 1000:
+					finished = False
+					break
+			else:
+				scannedTo = span
+			count += 1
+			if count % 256 == 0 and (clock() if Python2 else perf_counter()) > deadline:
+				finished = False
+				break
+		snapshot.tagSpans('searchMark', spans)
+		if scannedTo is not None and not finished:
+			self.master.mark_set('liveSearchFrom', snapshot.index(scannedTo))
+		self.liveCount += len(spans)
+		if self.liveCount:
+			self.searchMarkall.config(text='Clear marks')
+		if finished:
+			self.liveScan = None
+			if self.liveResumed:		# liveCount includes matches trimmed since
+				self.liveCount = TextSnapshot(self.master).count(self.liveRegex)
+			self.liveKey = key if self.liveStarts is not None else None
+			self.searchLabelStr.set('{} matches'.format(self.liveCount or 'no'))
+		else:
+			self.searchLabelStr.set('{} matches so far ...'.format(self.liveCount))
+			self.liveAfterID = self.after(1, self.liveSearchStep, key)
+
 	def cutText(self, event=None):
 		self.copyText()
 		self.deleteText()
@@ -1339,7 +2280,7 @@ class AppWindow(Frame):
 
 	client = None						# pointer to OoliteDebugConsoleProtocol instance
 	connectedToOolite = False			# connection flag
-	COLORS = {}							# working dict of all colors, local & oolite
+	COLORS = TrackedDict()				# working dict of all colors, local & oolite
 	settings = {}						# local copy of oolite debug setting (w/o macros)
 	afterLoopIDs = {}					# dict of ID # from tkinter's after cmd, saved for termination
 
@@ -1359,6 +2300,11 @@ class AppWindow(Frame):
 		self.rowconfigure(0, weight=1)		# make row 0 stretchable and
 		self.columnconfigure(0, weight=1)	# make column 0 stretchable so it fills its frame
 		self.grid(row=1, sticky=N+S+E+W)	# make the Application fill its cell of the top-level window
+		self.deadlines = DeadlineScheduler(self)	# all timeouts, eg. for silent cmds & alias polls
+		for options in self.configDicts():	# changes from here on are saved, see saveConfigFile
+			options.onChange = self.configChanged
+		self.logStore = self.newLogStore()	# all output, bodyText shows only the latest
+		self.sessions = []					# delegates of open connections, in order opened
 		self.gameStarted = IntVar(name='gameStarted')
 		self.addTraceTkVar(self.gameStarted, self.checkGameStatus)
 		self.createWindows()
@@ -1366,10 +2312,11 @@ class AppWindow(Frame):
 		self.createOptionsMenus()
 		self.createAliasFrame()
 		self.createFontMenus()				# Settings menu is created upon connection, as they vary
+		if self.localOptions['MaxConnections'] > 1:
+			self.createSessionsMenu()
 		self.loadCmdHistory()
 		self.setconnectPort()
 		self.processMessage()
-		self.sendSilentCmd()				# initiate polling
 		self.top.bind_all('<<closeAnyOpenFrames>>', self.closeAnyOpenFrames)
 
 	def init_toplevel(self):
@@ -1461,6 +2408,8 @@ class AppWindow(Frame):
 									 exportselection=0, wrap=WORD)
 		self.bodyText.tag_config('emphasis', font=self.emphasisFont)
 		self.bodyText.tag_config('searchMark', font=self.searchMarkFont)
+		self.bodyText['yscrollcommand'] = self.bodyScrolled	# pages in older output at the top
+		self.bodyText.bind('<Configure>', self.bodyResized, add='+')	# width for truncating command echoes
 		# command window
 		self.cmdLine = ScrollingText(self.appWindow, editable=True, undo=True, histCmd=self.deleteCurrentCmd, 
 									 font=self.defaultFont, exportselection=0, wrap=WORD)
@@ -1493,6 +2442,7 @@ class AppWindow(Frame):
 		self.cmdLine.bind('<Shift-Tab>', lambda e: self.cmdSearchHistory(1))
 		self.cmdLine.bind('<Control-Delete>', self.deleteCurrentCmd)
 		self.cmdLine.bind('<Control-BackSpace>', self.deleteCurrentCmd)
+		self.cmdLine.bind('<Control-r>', self.openHistorySearch)
 		self.cmdLine.focus_set()
 	
 	def updateForFontChange(self):			# update cmdLine buttons, sash, menus after a font size change
@@ -1506,11 +2456,7 @@ class AppWindow(Frame):
 		
 		self.update_idletasks()				# required for sash_place to work after above changes
 		self.appWindow.sash_place(0, 0, self.btnCmdClr.winfo_rooty())
-		self.screenLines = None				# recompute height of screen lines
-		self.spaceLen = self.eSpaceLen = None # recompute length of spaces
-		self.ellipsisLen = None
-		self.measuredWords.clear()			# clear cached measurements
-		self.measuredEWords.clear()			#   "
+		self.glyphWidths = None				# re-measure glyphs
 		self.aliasValueWidth = None
 		font = self.defaultFont
 		self.lineSpace = font.metrics('linespace')
@@ -1534,6 +2480,8 @@ class AppWindow(Frame):
 			self.bodyText.popup.searchBox.closeTop()
 		if hasattr(self.cmdLine.popup, 'searchBox') and self.cmdLine.popup.searchBox.state() == 'normal':
 			self.cmdLine.popup.searchBox.closeTop()
+		if hasattr(self, 'histSearchTop') and self.histSearchTop.state() == 'normal':
+			self.histSearchTop.closeTop()
 		for msg in openMessages:
 			msg.closeMessageBox()
 		del openMessages[0:]
@@ -1578,11 +2526,12 @@ class AppWindow(Frame):
 	def createDebugMenus(self):			# create an Debug pulldown menu
 		debugMenu = self.debugMenu = OoBarMenu(self.menubar, label='Debug', 
 										font=self.defaultFont,
-										postcommand=self.closeAnyOpenFrames)
+										postcommand=self.postDebugMenu)
 		debug = self.debugOptions
 
 		# showLog is a local option placed here for consistency w/ Mac version
 		debug['showLog'] = IntVar(value=1, name='dbgMenu_showLog')		
+		self.addTraceTkVar(debug['showLog'], self.routesChanged)
 		debugMenu.add_checkbutton(label='Show Log', variable=debug['showLog'])
 
 		self.logMsgMenu = Menu(debugMenu, tearoff=0, font=self.defaultFont)
@@ -1716,7 +2665,13 @@ class AppWindow(Frame):
 		debugMenu.add_command(label='Dump Target State', stateChange=True, command=self.checkPlayersTarget, state=DISABLED)
 
 		debugMenu.add_separator()
+		debugMenu.add_command(label=self.renderStatus())	# info only, updated by postDebugMenu
+		self.renderStatusIndex = debugMenu.index(END)
 		debugMenu.add_command(label='Exit', command=self.exitCmd)
+
+	def postDebugMenu(self):
+		self.closeAnyOpenFrames()
+		self.debugMenu.entryconfigure(self.renderStatusIndex, label=self.renderStatus())
 		
 	def sixteenths(self, value):
 		# arg 'factor' has time factor encoded 1..15 is a fractional value, factor/16
@@ -1757,7 +2712,7 @@ class AppWindow(Frame):
 	def writeLogMarker(self):
 		self.queueSilentCmd('console.writeLogMarker()', 'logMarker')
 
-	def dumpEntityList(self):			#  send IIFE as not in oolite-debug-console.js
+	def dumpEntityList(self):			#  use IIFE as not in oolite-debug-console.js
 		# don't worry about when enabled, as there exists player & ship @ start of game
 		#  ie. 1st screen: 'Start new...', 'Load...'
 		showLog = self.debugOptions['showLog'].get()
@@ -1768,12 +2723,11 @@ class AppWindow(Frame):
 				  'var list = system.filteredEntities(console, function(){return true;}, player.ship); '
 				  'for( let i = 0, len = list.length; i < len; i++ ) text += "\\n" + list[i]; '
 				  'log("console", text); '
-				  'return "no result<label:dumpEntityList><discard:yes>"; '
+				  'return "no result"; '
 				'})()')
 		self.queueSilentCmd(cmd, 'dumpEntityList')
 		if showLog:
-			cmd = ('(function() { return "no result<label:entityDumpVar><discard:yes>"; })()') # signals dump complete
-			self.queueSilentCmd(cmd, 'entityDumpVar', self.entityDumpVar)
+			self.queueSilentCmd('"no result"', 'entityDumpVar', self.entityDumpVar) # signals dump complete
 		self.colorPrint('')
 		self.colorPrint('Entity list saved to   Latest.log')
 
@@ -1897,22 +2851,26 @@ class AppWindow(Frame):
 
 ## Options Menu ############################################################
 
-	localOptions = {  					# local options (except font*) from CFGFILE
+	localOptions = TrackedDict({		# local options (except font*) from CFGFILE
 		'SaveConfigOnExit': True,
 		'SaveConfigNow': False,			# this is a local tkvar, not written to .cfg
 		'SaveHistoryOnExit': True,
 		'Geometry': DEFAULT_GEOMETRY,
 		'AliasWindow': DEFAULT_ALIAS_POSN,
 		'ConsolePort': 8563,
+		'MaxConnections': 1,			# > 1 for hub mode, one session per Oolite
 		'EnableShowConsole': True,
 		'MacroExpansion': True,			# show 'macro-expansion' messages in console
 		'TruncateCmdEcho': False,		# shorten commands echo'd to a single line
+		'CollapseRepeats': False,		# print a repeated line once, with a count
+		'CollapseWindow': 0,			# > 0 also counts near repeats, see collapseRepeat
 		'ResetCmdSizeOnRun': True,		# reset cmdLine's size after cmd is run
 		'MsWheelHistory': False,		# allow mouse wheel to scroll through cmd history
 		'PlistOverrides': True,
 		'DebugToggle': False,
 		'Aliases': {},
-	}
+		'Routes': OrderedDict(),		# user's routing rules, see compileRoute
+	})
 	localOptnText = OrderedDict((
 		('SaveConfigOnExit', 	'Save configuration on exit'),
 		('SaveConfigNow', 		'Save configuration Now!'),
@@ -1920,6 +2878,7 @@ class AppWindow(Frame):
 		('EnableShowConsole', 	'Enable ShowConsole'),
 		('MacroExpansion',		'Expand macro when executing'),
 		('TruncateCmdEcho', 	'Truncate commands when echoing'),
+		('CollapseRepeats', 	'Collapse repeated lines'),
 		('ResetCmdSizeOnRun', 	'Resize the command window on Run'),
 		('MsWheelHistory', 		'Mouse wheel scrolls History'),
 		('PlistOverrides', 		'Use Oolite plist for local font/colors'),
@@ -1939,6 +2898,8 @@ class AppWindow(Frame):
 			tkvars[key] = IntVar(name='optMenu_'+key, value=1 if opt[key] else 0)
 			menu.add_checkbutton(label=text, variable=tkvars[key],
 							command=lambda k=key: self.setOptionFromCheckButton(k, tkvars[k]))
+		self.addTraceTkVar(tkvars['MacroExpansion'], self.routesChanged)
+		self.addTraceTkVar(tkvars['TruncateCmdEcho'], self.routesChanged)
 
 		menu.add_command(label='Aliases ...', command=self.showAliasWindow)
 		self.sessionStartTime = StringVar(name='sessionStartTime')
@@ -2038,10 +2999,9 @@ class AppWindow(Frame):
 
 ## Alias Functions #########################################################
 
-	aliasDefns = {}						# dictionary of all defined aliases
+	aliasDefns = TrackedDict()			# dictionary of all defined aliases
 	aliasCurrValues = {}				# dictionary of current value of alias
-	aliasesPolled = {}					# dictionary of aliases polled
-	aliasPollQueue = OrderedDict()
+	aliasesPolled = TrackedDict()		# dictionary of aliases polled
 	def createAliasFrame(self):
 		self.aliasWindow = TopWindow(self.top, 'Aliases', enduring=True, showNow=False)
 		self.aliasWindow.bind('<Escape>', self.aliasWindow.closeTop)
@@ -2148,7 +3108,7 @@ class AppWindow(Frame):
 	def doSaveAPposn(self, event=None):
 		self.saveAPafterID = None
 		self.aliasWindow.savePosition()
-		self.localOptions['AliasWindow'] = self.aliasWindow.mouseXY
+		self.localOptions['AliasWindow'] = str(self.aliasWindow.mouseXY)
 	
 	def resetAliasEntry(self, focus=True):# handler for 'Clear' button
 		self.aliasDefinition.set('')
@@ -2461,24 +3421,18 @@ class AppWindow(Frame):
 		self.updateAliasButtons()
 		return 'break' # so default event handlers don't fire
 
-	ellipsisLen = None
 	def showAliasValue(self, alias):
-		font = self.defaultFont
-		if self.ellipsisLen is None:		# 1st time or font's changed, see addWords()
-			self.spaceLen = font.measure(' ')
-			self.ellipsisLen = font.measure(' ...')
-		spaceLen = self.spaceLen
+		glyphs = self.fontGlyphs()[0]
+		spaceLen = glyphs.advances[' ']
 		value = self.aliasCurrValues[alias].replace('\n', ' ').replace('\t', ' ')
 		while '  ' in value:
 			value = value.replace('  ', ' ')
-		width, maxWidth = font.measure(value), self.aliasValueWidth
+		width, maxWidth = glyphs.width(value), self.aliasValueWidth
 		if width > maxWidth:
 			words, trunc = value.split(), ''
-			measuredWords, width = self.measuredWords, self.ellipsisLen
+			width = glyphs.width(' ...')
 			for word in words:
-				if word not in measuredWords:
-					measuredWords[word] = font.measure(word)
-				wordLen = measuredWords[word]
+				wordLen = glyphs.measure(word)
 				if width + wordLen > maxWidth: break
 				trunc += word
 				width += wordLen
@@ -2503,12 +3457,19 @@ class AppWindow(Frame):
 				elif alias not in self.aliasListBox.get(0, END):	# a newly created alias
 					self.aliasMsgStr.set('definition accepted')
 		elif op == 'poll':								# NB: tkVar is None on 'send's
-			if alias in self.aliasPollsPending:
-				del self.aliasPollsPending[alias]
-			self.aliasCurrValues[alias] = value
-			valid = value != 'undefined' and not value.startswith('no result')
-			if not valid: 		
-				self.aliasRegistry[alias].set(0)
+			self.aliasPollsPending.pop(alias, None)
+			self.notePolledValue(alias, value)
+		elif op == 'polls':								# from pollAliases, a JSON object of changed alias: value
+			self.deadlines.cancel(('aliasPoll', '*'))
+			self.aliasPollsPending.clear()
+			try:
+				values = json_loads(value)
+			except ValueError:
+				values = {}
+				debugLogger.warning('setAliasRegistry, invalid poll reply "{}"'.format(value[:80]))
+			for alias, polled in values.items():
+				if alias in self.aliasDefns:			# may have been deleted since
+					self.notePolledValue(alias, polled)
 		elif op == 'check':
 			if alias in self.aliasRegistry:
 				if isinstance(value, str) and value in ['true', 'false']:
@@ -2682,32 +3643,50 @@ class AppWindow(Frame):
 					debugLogger.warning(errmsg)
 
 	aliasPollsPending = {}
-	def pollAliases(self, count):
+	aliasPollGen = 0					# changed whenever we lose track of the values cached in Oolite
+	def pollAliases(self):				# poll every polled alias in a single IIFE
 		if self.connectedToOolite:
-			if len(self.aliasPollQueue) == 0:	# create new queue
-				self.aliasPollQueue = OrderedDict(sorted([(k,v) for k,v in self.aliasDefns.items() \
-											if k in self.aliasesPolled], key=lambda t: t[0]))
-				self.aliasPollQueue = OrderedDict(sorted([(k,v) \
-					    for k,v in self.aliasDefns.items() \
-						if k in self.aliasesPolled and self.aliasesPolled[k]], \
-						    key=lambda t: t[0]))
-
-			while count > 0 and len(self.aliasPollQueue) > 0:
-				alias, defn = self.aliasPollQueue.popitem(last=False) # False => FIFO
-				if self.sendAliasRegistration(alias, poll=True):
-					self.aliasPollsPending[alias] = clock() if Python2 else perf_counter()
-					count -= 1
+			defns = self.aliasDefns
+			aliases = sorted(alias for alias, polled in self.aliasesPolled.items() if polled and alias in defns)
+			if len(aliases) == 0:
+				return
+			# Oolite keeps the last value sent for each alias in console.script, so only changes are returned;
+			# - the cache is rebuilt (ie. all values sent) when its generation differs from ours
+			cmd = ['(function() {{ var cs = console.script, cache = cs["$debugConsolePolled"], changed = {{}}, value; '
+					'if (!cache || cache.gen !== {0}) cache = cs["$debugConsolePolled"] = {{ gen: {0}, values: {{}} }}; '
+					.format(self.aliasPollGen)]
+			# same eval as sendAliasRegistration, each in its own try so one failure doesn't spoil the rest
+			for alias in aliases:
+				cmd.append('try {{ value = "" + eval("console.script.{0} = {1}"); }} catch (e) {{ value = "no result"; }} '
+							'if (cache.values.{0} !== value) changed.{0} = cache.values.{0} = value; '
+							.format(alias, defns[alias].replace('\n', ' ')))
+			cmd.append('return JSON.stringify(changed); })()')
+			self.queueSilentCmd(''.join(cmd), 'alias-*-polls')
+			sentTime = clock() if Python2 else perf_counter()
+			for alias in aliases:
+				self.aliasPollsPending[alias] = sentTime
+			self.deadlines.schedule(('aliasPoll', '*'), ALIAS_POLL_TIMEOUT, self.expireAliasPolls)
+
+	def expireAliasPolls(self):			# deadline handler, abandon poll
+		self.aliasPollsPending.clear()
+		self.aliasPollGen += 1			# any changes in a lost reply are resent
+
+	def notePolledValue(self, alias, value):
+		self.aliasCurrValues[alias] = value
+		valid = value != 'undefined' and not value.startswith('no result')
+		if not valid and alias in self.aliasRegistry:
+			self.aliasRegistry[alias].set(0)
 
 ## Font Menu ############################################################
 
-	FONTS = {							# like COLORS, these are internal working values
+	FONTS = TrackedDict({				# like COLORS, these are internal working values
 		# these 2 exist in console.settings(font-face, font-size), so changes of those also stored here (see PlistOverrides)
 		'Family': 'arial',				# The font family name as a string.
 		'Size': '10',					# The font height as an integer in points. To get a font n pixels high, use -n.
 		# these 2 only appear locally in Font menu, as they are not supported in oolite
 		'Weight': 'normal',				# "bold" for boldface, "normal" for regular weight.
 		'Slant': 'roman',				# "italic" for italic, "roman" for unslanted.
-	}
+	})
 	fontOptionVars = {}					# dict of tkinter vars for fonts
 
 	def createFontMenus(self): 			# create a Font pulldown menu
@@ -2860,19 +3839,21 @@ class AppWindow(Frame):
 		self.FONTS['Weight'] = weight
 		self.defaultFont.config(weight=weight)
 		self.emphasisFont.config(weight=weight)
+		self.glyphWidths = None
 
 	def setFontSlant(self):
 		slant = self.fontOptionVars['Slant'].get()
 		self.FONTS['Slant'] = slant
 		self.defaultFont.config(slant=slant)
 		self.emphasisFont.config(slant=slant)
+		self.glyphWidths = None
 
 ## Settings Menu ###########################################################
 
 	# upon opening a new connection, oolite sends a dictionary of its settings, regardless of
 	# whether or not the game has loaded/started.  We process those, then start polling
 	# for the actual start before completing setup
-	def initClientSettings(self, settings):	# create an Options pulldown menu; settings is a dict of all debugger settings
+	def initClientSettings(self, settings):	# show the Oolite plist menu; settings is a dict of all debugger settings
 											# excepting 'font-face' & 'font-size', settings are booleans or colours
 		self.disableClientSettings()	
 		# this is not guaranteed to be called via connectionClosed (eg. terminate before disconnect), 
@@ -2881,101 +3862,150 @@ class AppWindow(Frame):
 		self.top.title('{}: {}'.format(DEBUGGER_TITLE, TCP_Port))
 		if len(self.scriptProps):	# not the 1st connection in this session
 			debugLogger.debug('connected {}'.format('=' * 70))
-		self.settingsMenu = OoBarMenu(self.menubar, label='Oolite plist', 
-										font=self.defaultFont, 
-										postcommand=self.closeAnyOpenFrames) 
-		settingsMenu, sortFn = self.settingsMenu, self.sortClientSettings
-		pairs = OrderedDict( sorted(settings.items(), key=lambda t: sortFn( t[0] )) )
-		settingsKeys = settings.keys()
-		plistTkvars = self.plistTkvars
+		if self.settingsMenu is None:
+			self.settingsMenu = OoBarMenu(self.menubar, label='Oolite plist', 
+											font=self.defaultFont, 
+											postcommand=self.closeAnyOpenFrames) 
+		else:						# hidden by disableClientSettings
+			self.settingsMenu.menuButton.grid()
+		self.plistShown.replace(settings)	# only what differs from the last game shown is applied
+		self.applyClientSettings(*self.plistShown.takeChanges())
+		self.settingsMenu.changeAllStates(DISABLED if self.pollingSuspended else NORMAL)
+		self.cmdLine.tag_raise(SEL)
+		self.initStartTime = clock() if Python2 else perf_counter()
+		self.gameStarted.set(-1)			# var is traced, setting will initiate polling
+
+	settingsMenu = None
+	plistShown = ConfigurationState()	# the settings the menu & colors show, across connections
+	def plistMenuKind(self, key, value):	# the kind of menu item for a setting, or None
+		if 'macros' in key or key.startswith('font'):	# NB: 's' as color keys use singular
+			return None
+		if type(value) == list:
+			return 'color'
+		if type(value) == bool or (type(value) == int and value in [0, 1]) \
+				or value in ['1', '0', 'true', 'false', 'yes', 'no']:
+			return 'check'
+		return None
+
+	def buildSettingsMenu(self):		# (re)build the menu's items, in sortClientSettings order
+		settingsMenu, plistTkvars = self.settingsMenu, self.plistTkvars
+		settingsMenu.delete(0, END)
+		settingsMenu.menuItems.clear()
+		settingsMenu.statesVary.clear()
 		colorsSep = False
-		override = self.localOptions['PlistOverrides']
-		for key, value in pairs.items():	# add menu items for each setting
-			if 'macros' in key:
-				continue					# NB: 's' as color keys use singular
-			valueType = type(value)
-			if key == 'font-face':
-				if 'Family' not in self.loadedConfig or override:
-					self.setFontFace(value, plist=True, skipUpdate='font-size' in settingsKeys)
-				self.settings[ key ] = value
-			elif key == 'font-size':
-				if 'Size' not in self.loadedConfig or override:
-					self.setFontSize(value, plist=True)
-				self.settings[ key ] = value
-			elif valueType == list:
+		shown = self.plistShown.snapshot()
+		for key in sorted(shown, key=self.sortClientSettings):
+			kind = self.plistMenuKind(key, shown[key])
+			if kind == 'color':
 				if not colorsSep and key.count('-') == 3:# add separator between general and event specific colors
 					settingsMenu.add_separator()		 # - this only works because of sortClientSettings
 					colorsSep = True
 				settingsMenu.add_command(label=key, stateChange=True,
 										state=DISABLED if self.pollingSuspended else NORMAL,
 										command=lambda k=key: self.pickMsgColour(k))
-				self.setMsgColor(key, value)
-				if override and key.endswith('-color'): # check for missing fg/bg
-					parts = key.split('-')
-					keyClass = parts[0] if len(parts) == 3 else '{}-{}'.format(parts[0], parts[1])
-					if '-foreground-color' in key and '{}-background-color'.format(keyClass) not in settingsKeys:
-						if 'general-background-color' in self.COLORS:
-							missingbg = self.COLORS['general-background-color']
-						else:
-							missingbg = self.COLORS['background']
-						self.bodyText.tag_config(keyClass, background=missingbg)
-						if keyClass == 'command':
-							self.cmdLine.tag_config(keyClass, background=missingbg)
-					elif '-background-color' in key and '{}-foreground-color'.format(keyClass) not in settingsKeys:
-						if 'general-background-color' in self.COLORS:
-							missingfg = self.COLORS['general-foreground-color']
-						else:
-							missingfg = self.COLORS['foreground']
-						self.bodyText.tag_config(keyClass, foreground=missingfg)
-						if keyClass == 'command':
-							self.cmdLine.tag_config(keyClass, foreground=missingfg)
-				self.settings[ key ] = value
-			else:
-				if valueType == bool or (valueType == int and value in [0, 1]) \
-						or value in ['1', '0', 'true', 'false', 'yes', 'no']:
-					if valueType == bool:
+			elif kind == 'check':
+				if key not in plistTkvars:	# some are added when debug menu is created
+					plistTkvars[ key ] = IntVar(name='oo_{}'.format(key))
+				settingsMenu.add_checkbutton(label=key, stateChange=True, variable=plistTkvars[ key ],
+											state=DISABLED if self.pollingSuspended else NORMAL,
+											command=lambda k=key: self.setClientCheckButton(k, plistTkvars[k]))
+
+	def applyClientSettings(self, changed, removed):	# changes from plistShown.takeChanges()
+		key = value = None
+		try:
+			shown = self.plistShown.snapshot()
+			menuItems = self.settingsMenu.menuItems
+			if any(key in menuItems for key in removed) \
+					or any(key not in menuItems and self.plistMenuKind(key, value) is not None
+							for key, value in changed.items()):
+				self.buildSettingsMenu()	# items come or go, rare as Oolite sends the same keys
+				changed = shown			# new items need their colors
+			for key in removed:
+				self.settings.pop(key, None)
+			override = self.localOptions['PlistOverrides']
+			for key, value in changed.items():
+				kind = self.plistMenuKind(key, value)
+				if 'macros' in key:
+					continue
+				elif key == 'font-face':
+					if 'Family' not in self.loadedConfig or override:
+						self.setFontFace(value, plist=True, skipUpdate='font-size' in changed)
+					self.settings[ key ] = value
+				elif key == 'font-size':
+					if 'Size' not in self.loadedConfig or override:
+						self.setFontSize(value, plist=True)
+					self.settings[ key ] = value
+				elif kind == 'color':
+					self.setMsgColor(key, value)
+					if override and key.endswith('-color'): # check for missing fg/bg
+						self.fillMissingColor(key, shown)
+					self.settings[ key ] = value
+				elif kind == 'check':
+					if type(value) == bool:
 						tkValue = 1 if value else 0
-					if valueType == int:
+					elif type(value) == int:
 						tkValue = value
 					else:
 						tkValue = 1 if value in ['1', 'true', 'yes'] else 0
-					if key not in plistTkvars:	# some are added when debug menu is created
-						plistTkvars[ key ] = IntVar(name='oo_{}'.format(key))
-					plistTkvars[ key ].set(tkValue)
-					settingsMenu.add_checkbutton(label=key, stateChange=True, variable=plistTkvars[ key ],
-												state=DISABLED if self.pollingSuspended else NORMAL,
-												command=lambda k=key: self.setClientCheckButton(k, plistTkvars[k]))
+					self.plistTkvars[ key ].set(tkValue)
 					self.settings[ key ] = bool(tkValue)
 				else:
-					errmsg = 'Unsupported var {}: {}, type: {}'.format(key, value, valueType)
+					errmsg = 'Unsupported var {}: {}, type: {}'.format(key, value, type(value))
 					if dca.g['debug']:
 						print(errmsg)
 						print_exc()
 						pdb.set_trace()
 					else:
 						debugLogger.error(errmsg)
-		self.cmdLine.tag_raise(SEL)
-		self.initStartTime = clock() if Python2 else perf_counter()
-		self.gameStarted.set(-1)			# var is traced, setting will initiate polling
+		except Exception as exc:
+			errmsg = 'Exception {}: key = {}, value = {}'.format(exc, key, value)
+			if dca.g['debug']:
+				print(errmsg)
+				print_exc()
+				pdb.set_trace()
+			else:
+				debugLogger.exception(errmsg)
+
+	def fillMissingColor(self, key, shown):	# a color's other half, when Oolite only sends one of fg/bg
+		parts = key.split('-')
+		keyClass = parts[0] if len(parts) == 3 else '{}-{}'.format(parts[0], parts[1])
+		if '-foreground-color' in key and '{}-background-color'.format(keyClass) not in shown:
+			if 'general-background-color' in self.COLORS:
+				missingbg = self.COLORS['general-background-color']
+			else:
+				missingbg = self.COLORS['background']
+			self.bodyText.tag_config(keyClass, background=missingbg)
+			if keyClass == 'command':
+				self.cmdLine.tag_config(keyClass, background=missingbg)
+		elif '-background-color' in key and '{}-foreground-color'.format(keyClass) not in shown:
+			if 'general-background-color' in self.COLORS:
+				missingfg = self.COLORS['general-foreground-color']
+			else:
+				missingfg = self.COLORS['foreground']
+			self.bodyText.tag_config(keyClass, foreground=missingfg)
+			if keyClass == 'command':
+				self.cmdLine.tag_config(keyClass, foreground=missingfg)
 
 	initStartTime = None
 	sessionInitialized = False
-	def disableClientSettings(self):	# disables Debug menu but destroys Settings menu as it is connection specific
+	def disableClientSettings(self):	# disables Debug menu and hides Settings menu as it is connection specific
 		if not self.connectedToOolite:
 			return 						# can be called more than once (oolite closed vs halted)
 		self.connectedToOolite = False
 		self.sessionInitialized = False
 		debugLogger.debug('disconnected {}'.format('=' * 67))
 		del self.requests[:]			# clear msg queues
-		self.replyPending = self.replyPendingTimer = None
+		self.inFlight.clear()
+		# only the game's timeouts, app ones (eg. 'saveConfig') outlive the connection
+		self.deadlines.cancelKinds(*SESSION_DEADLINES)
+		self.aliasPollGen += 1			# next poll returns all values
 		for loopID in self.afterLoopIDs.values():
 			# shut down any active .after cycles (tkinter won't complain if not active)
 			self.after_cancel(loopID)
 		self.afterLoopIDs.clear() 	
 		self.top.title('{}: disconnected'.format(DEBUGGER_TITLE))
-		if hasattr(self, 'settingsMenu'):
-			self.settingsMenu.removeOnesSelf()
-			del self.settingsMenu
+		if self.settingsMenu is not None:	# kept for the next connection, see initClientSettings
+			self.settingsMenu.menuButton.grid_remove()
 		self.debugMenu.changeAllStates(DISABLED)
 
 	plistTkvars = {}					# dict of tkinter variables for client settings
@@ -3002,8 +4032,8 @@ class AppWindow(Frame):
 		           'if( cs.hasOwnProperty( prop ) ) { '
 		             'proplst += (first ? "" : ",") + prop; '
 		             'first = false; } '
-		         '} return proplst + "<label:scriptProps><discard:yes>"; '
-		       '})()') # see mkCmdIIFE
+		         '} return proplst; '
+		       '})()') # wrapped by mkCmdIIFE
 		self.queueSilentCmd(cmd, 'scriptProps', self.scriptPropsStr)
 
 	# handler for Tk var trace: scriptPropsStr
@@ -3019,7 +4049,6 @@ class AppWindow(Frame):
 				# sign script to be able to detect game restart
 				# - polling is started when cmd completes
 				self.queueSilentCmd(cmd, 'signScript', self.sessionStartTime)	
-				self.aliasPollQueue.clear()
 				status = '* * obtained {} script property names'.format(numProps)
 			else:
 				self.sessionInitialized = False
@@ -3053,21 +4082,13 @@ class AppWindow(Frame):
 					self.queueSilentCmd( self.gameStatusCmd, 'gameStarted', self.gameStarted)
 				if self.pollElapsed == 2000:
 					self.pollElapsed = -1000
-			if len(self.aliasPollsPending) == 0:
-				self.pollAliases(5)				# only 5 at a time
-			else:
-				expired = []
-				for alias, sentTime in self.aliasPollsPending.items():
-					currTime = clock() if Python2 else perf_counter()
-					if currTime - sentTime > 5:	# after 5 seconds, abandon poll	
-						expired.append(alias)
-				for alias in expired:
-					del self.aliasPollsPending[alias]
+			if len(self.aliasPollsPending) == 0:	# unanswered polls expire via self.deadlines
+				self.pollAliases()
 					
 			self.pollCounter += 1
 			self.pollElapsed += 500
-			self.afterLoop(500, self.pollOolite) # entire cycle takes 3000 ms unless there are >  aliases
-													# locals get updated every 3 sec regardless of # of aliases
+			self.afterLoop(500, self.pollOolite) # entire cycle takes 3000 ms, locals get updated every 3 sec
+													# aliases every 500 ms (or when the last poll is answered)
 ## prob: initialization takes too long (incl'g alias polling; ?del registerAllAliases
 
 	# connection has been established, we wait for player's ship status to change from 
@@ -3134,6 +4155,141 @@ class AppWindow(Frame):
 			else:
 				debugLogger.exception(errmsg)
 
+## Sessions (hub mode) ###################################################
+
+	# With MaxConnections > 1, each Oolite connected gets a session (its
+	# SimpleConsoleDelegate).  Only the selected one is attached to the window,
+	# its output pane shown and its silent cmds & alias polls running.  The
+	# others cost no UI time: output is appended to their own LogStore, and the
+	# state in sessionState, with their alias registrations, is parked with them
+	# (replies to cmds in flight are kept for when they're shown again).  The
+	# settings & debug menus are shared, so they're set up again for the game
+	# selected.
+	sessionState = ('requests', 'inFlight', 'timedOutCmds', 'pollingSuspended',
+					'aliasPollsPending', 'aliasCurrValues')
+	sessionCount = 0
+	sessionsMenu = None
+	def createSessionsMenu(self):
+		self.sessionsMenu = OoBarMenu(self.menubar, label='Sessions',
+										font=self.defaultFont,
+										postcommand=self.postSessionsMenu)
+		self.sessionVar = IntVar(name='sessionsMenu_selected', value=0)
+		self.updateSessionsMenu()
+
+	def postSessionsMenu(self):
+		self.closeAnyOpenFrames()
+		self.updateSessionsMenu()		# refresh backlog counts
+
+	def updateSessionsMenu(self):
+		menu = self.sessionsMenu
+		if menu is None:
+			return
+		menu.delete(0, END)
+		menu.menuItems.clear()
+		if not self.sessions:
+			menu.add_command(label='No connections', state=DISABLED)
+			return
+		for session in self.sessions:
+			label = '{}: Oolite {}{}'.format(session.sessionNum, session.ooliteVersion,
+											'' if session.attached or not session.unseen
+											else ' ({} new)'.format(session.unseen))
+			menu.add_radiobutton(label=label, variable=self.sessionVar, value=session.sessionNum,
+									command=lambda s=session: self.selectSession(s))
+			if session.attached:
+				self.sessionVar.set(session.sessionNum)
+
+	def addSession(self, session):
+		self.sessionCount += 1
+		session.sessionNum = self.sessionCount
+		self.sessions.append(session)
+		if not session.attached:
+			self.colorPrint('Oolite version {} connected as session {}, see the Sessions menu'.format(
+								session.ooliteVersion, session.sessionNum))
+		self.updateSessionsMenu()
+
+	def newLogStore(self):				# each session's share of the memory for output
+		shares = max(1, self.localOptions['MaxConnections'])
+		return LogStore(LOG_STORE_RECORDS // shares, LOG_STORE_ARENA // shares)
+
+	def removeSession(self, session, shown=False, notice=None):	# shown: its log is the one in the window
+		if session not in self.sessions:	# connection was rejected
+			if notice:
+				self.colorPrint(notice)
+			return
+		self.sessions.remove(session)
+		session.logStore = session.clientState = None
+		del session.replies[:]
+		if self.client is None and self.sessions:
+			if shown:					# its undrawn output would land in the next session's log
+				self.pendingMessages.clear()
+			self.selectSession(self.sessions[0])
+			if notice:
+				notice = 'Session {} (Oolite version {}) closed. {}'.format(
+								session.sessionNum, session.ooliteVersion, notice)
+		elif not shown:
+			notice = 'Session {} (Oolite version {}) closed'.format(
+								session.sessionNum, session.ooliteVersion)
+		if notice:
+			self.colorPrint(notice)
+		self.updateSessionsMenu()
+
+	def selectSession(self, session):
+		if session.attached or session not in self.sessions:
+			return
+		current = cmdLineHandler.inputReceiver
+		switching = current is not None and current.attached
+		if switching:					# park the shown session
+			current.attached = False
+			for message in self.pendingMessages:
+				current.bufferMessage(*message)
+			self.pendingMessages.clear()
+			current.protocol.releaseInput(self)
+			current.logStore = self.logStore
+			self.parkSession(current)
+			self.client = None
+			self.disableClientSettings()
+		session.attached = True
+		cmdLineHandler.inputReceiver = session
+		self.client = session.protocol
+		self.tried = 0
+		session.unseen = 0
+		self.showLogStore(session.logStore)
+		self.colorPrint('Session {}: Oolite version {}'.format(session.sessionNum, session.ooliteVersion))
+		self.restoreSession(session)
+		config = session.protocol.configuration()
+		if config:
+			self.initClientSettings(config)
+		self.updateSessionsMenu()
+
+	def parkSession(self, session):		# keep the state of session's game with it, give the window fresh state
+		state = dict((name, getattr(self, name)) for name in self.sessionState)
+		state['aliasRegistry'] = dict((alias, tkVar.get()) for alias, tkVar in self.aliasRegistry.items())
+		session.clientState = state
+		self.requests, self.inFlight, self.timedOutCmds = [], OrderedDict(), {}
+		self.pollingSuspended = False
+		self.aliasPollsPending, self.aliasCurrValues = {}, {}
+		for tkVar in self.aliasRegistry.values():
+			tkVar.set(0)				# not registered in the next game until it says so
+
+	def restoreSession(self, session):	# resume session's silent cmds, see parkSession
+		state, session.clientState = session.clientState, None
+		if state is not None:
+			registry = state.pop('aliasRegistry')
+			for name, value in state.items():
+				setattr(self, name, value)
+			for alias, tkVar in self.aliasRegistry.items():
+				tkVar.set(registry.get(alias, 0))
+			# deadlines were cancelled when it was parked
+			for rid in self.inFlight:	# replies may be in session.replies, give the rest a full timeout
+				self.deadlines.schedule(('reply', rid), CMD_TIMEOUT, self.silentCmdTimedOut, rid)
+			for label in self.timedOutCmds:	# expires those that are stale by now
+				self.deadlines.schedule(('stale', label), 0, self.expireTimedOutCmd, label)
+			if self.aliasPollsPending:
+				self.deadlines.schedule(('aliasPoll', '*'), ALIAS_POLL_TIMEOUT, self.expireAliasPolls)
+		for message in session.replies:
+			self.handleMessage(*message)
+		del session.replies[:]
+
 ## Client functions ########################################################
 
 	def getClientSetting(self, key, default=None):
@@ -3159,30 +4315,10 @@ class AppWindow(Frame):
 		else:
 			self.client.setConfigurationValue(key, value)
 
-	def noteConfig(self, oolite): 		# ack from setConfigurationValue OR actual changes from macros!
-		key = None
-		value = None
-		try:
-			for key, value in oolite.items():
-				if 'macros' in key:
-					continue			# NB: 's' as color keys use singular
-				if key.endswith('-color'):
-					self.setMsgColor(key, value)
-				elif key.startswith('font'):
-					self.settings[key] = value
-				else:
-					value = str(value) if isinstance(value, int) else value
-					value = True if value in ['1', 'true', 'yes',] else False
-					self.settings[key] = value
-		except Exception as exc:
-			errmsg = 'Exception {}: key = {}, value = {}, hasattr(self, "settings") = {}'.format(
-										exc, key, value, hasattr(self, "settings"))
-			if dca.g['debug']:
-				print(errmsg)
-				print_exc()
-				pdb.set_trace()
-			else:
-				debugLogger.exception(errmsg)
+	def noteConfig(self, oolite, removed=()):	# ack from setConfigurationValue OR actual changes from macros!
+		self.plistShown.update(oolite)
+		self.plistShown.remove(removed)
+		self.applyClientSettings(*self.plistShown.takeChanges())
 
 ## Color functions #########################################################
 
@@ -3249,11 +4385,15 @@ class AppWindow(Frame):
 			return
 		self.setLocalColor(key, newcstr)
 
-	def setLocalColor(self, key, value):
+	def setLocalColor(self, key, value, tracked=True):	# tracked=False for colors from Oolite, not saved
 		color = self.codifyColor(value)
 		tkColor = self.findTkColour(color)
 		newColour = color if tkColor is None else tkColor
-		self.COLORS[ key ] = newColour		# assign local colors for foreground, background & cmdLine
+		if tracked:							# assign local colors for foreground, background & cmdLine
+			self.COLORS[ key ] = newColour
+		else:
+			self.COLORS.setUntracked(key, newColour)
+		self.routesChanged()
 		if key == 'foreground':
 			self.bodyText.config(foreground=newColour)
 			self.bodyText.tag_config('foreground', foreground=newColour)
@@ -3302,8 +4442,9 @@ class AppWindow(Frame):
 		self.settings[ key ] = newColour
 		return color, tkColor
 
-	def registerMsgColor(self, key, color):
-		self.COLORS[ key ] = color
+	def registerMsgColor(self, key, color):	# Oolite's colors are used, not saved
+		self.COLORS.setUntracked(key, color)
+		self.routesChanged()
 		parts = key.split('-')
 		classLen = len(parts)
 		override = classLen == 4 or self.localOptions['PlistOverrides']
@@ -3317,11 +4458,11 @@ class AppWindow(Frame):
 			return
 		if classLen == 3:				# apply to local colors
 			if key == 'general-foreground-color':
-				self.setLocalColor('foreground', color)
+				self.setLocalColor('foreground', color, tracked=False)
 			elif key == 'general-background-color':
-				self.setLocalColor('background', color)
+				self.setLocalColor('background', color, tracked=False)
 			elif key == 'command-foreground-color':
-				self.setLocalColor('command', color)
+				self.setLocalColor('command', color, tracked=False)
 			elif key == 'command-background-color':
 				self.cmdLine.config(background=color)
 
@@ -3355,7 +4496,7 @@ class AppWindow(Frame):
 		self.pollingSuspended = False
 		cmd = 'console.script["$debugConsoleSessionStarted"]'
 		self.queueSilentCmd(cmd, 'signScript', self.currentSessionTime) # fetch tag to detect game restart
-		self.sendSilentCmd()						# looping halted by pollingSuspended
+		self.sendSilentCmd()						# sending halted by pollingSuspended
 
 	# handler for Tk var trace: currentSessionTime
 	def updateDebugMenu(self, *args):
@@ -3363,26 +4504,23 @@ class AppWindow(Frame):
 			self.initDebugMenu()		# different session, re-init
 
 	requests = []
-	replyPending = None
-	replyPendingTimer = None
+	inFlight = OrderedDict()			# rid: SilentMsg, internal cmds awaiting their reply, oldest first
+	silentCmdID = 0						# last rid used
 	pollingSuspended = False
-	# SilentMsg: namedtuple('SilentMsg', 'cmd, label, tkVar, discard, timeSent')
+	# SilentMsg: namedtuple('SilentMsg', 'cmd, label, tkVar, discard, timeSent, rid')
 	def queueSilentCmd(self, cmd, label, tkVar=None, discard=True):
 		if hasattr(cmdLineHandler.inputReceiver,'receiveUserInput') and cmdLineHandler.inputReceiver.Active:
 			if label == 'USER_CMD':		# suspend all message traffic w/ Oolite during user cmds
-				if not self.pollingSuspended:
-					self.pollingSuspended = True
-					self.reSubmitPending()
+				# cmds already sent are answered before the user's, so remain in flight
+				self.pollingSuspended = True
 				cmdLineHandler.inputReceiver.receiveUserInput(cmd)
 				return
-			# all internal cmds are submitted one at a time, the receipt of its reply triggering the next
+			# internal cmds are sent up to SILENT_CMDS_IN_FLIGHT ahead, the receipt of a reply making room for the next
 			# - replies are guaranteed as while some cmds don't expect a reply, all are submitted as IIFE's
-			#   that add the cmds label & echoing instructions (aka discard) to the reply (if any) in their return
-			# debugLogger.debug('	replyPending {} => {}'.format(self.replyPending.label if self.replyPending else None,
-					# 'return w/o queuing' if self.replyPending and label in ['gameStarted', 'pollDebugFlags', 'pollStarSystem'] else 'submitRequest'))
-			if self.replyPending and label in ['gameStarted', 'pollDebugFlags', 'pollStarSystem']:
+			#   that add the cmds request ID & echoing instructions (aka discard) to the reply (if any) in their return
+			if self.inFlight and label in ['gameStarted', 'pollDebugFlags', 'pollStarSystem']:
 				return # only poll games status when idle
-			self.submitRequest(SilentMsg(cmd, label, tkVar, discard, None))
+			self.submitRequest(SilentMsg(cmd, label, tkVar, discard, None, None))
 
 	def submitRequest(self, request):	# ensure no duplicates in queue
 		label, requests = request.label, self.requests
@@ -3399,24 +4537,24 @@ class AppWindow(Frame):
 				return
 		if label not in [msg.label for msg in requests]:
 			self.requests.append(request)
+			self.sendSilentCmd()
 		
-	def reSubmitPending(self):			# re-enqueue replyPending
-		msg = self.replyPending 
-		if msg:
-			if (msg.label == 'gameStarted' and self.gameStarted.get() == 0) or \
-				msg.label not in ['gameStarted', 'pollDebugFlags', 'pollStarSystem',	# these are regularly polled
-									'setDetailLevel', 'writeMemoryStats']: 				# and these can easily timeout
-				self.submitRequest(msg)	# resubmit msg
-		
-			if dca.g['debug']:						 ###cag
-				debugLogger.debug('resetting replyPending, msg.label = {}, # timedOut = {}: {}'.format(
-					msg.label if msg else None,
-					len(self.timedOutCmds), ', '.join(c for c in self.timedOutCmds.keys()) if len(self.timedOutCmds) else ''))
-		self.replyPending = self.replyPendingTimer = None 	# allow sendSilentCmd to send next in queue
+	def reSubmitPending(self, msg):		# re-enqueue an in-flight cmd
+		self.inFlight.pop(msg.rid, None)
+		self.deadlines.cancel(('reply', msg.rid))
+		if (msg.label == 'gameStarted' and self.gameStarted.get() == 0) or \
+			msg.label not in ['gameStarted', 'pollDebugFlags', 'pollStarSystem',	# these are regularly polled
+								'setDetailLevel', 'writeMemoryStats']: 				# and these can easily timeout
+			self.submitRequest(msg._replace(timeSent=None, rid=None))	# resubmit msg
+	
+		if dca.g['debug']:						 ###cag
+			debugLogger.debug('resetting in flight msg.label = {}, # timedOut = {}: {}'.format(
+				msg.label, len(self.timedOutCmds), 
+				', '.join(c for c in self.timedOutCmds.keys()) if len(self.timedOutCmds) else ''))
 
 	def mkCmdIIFE(self, msg):			# wrap msg as an IIFE
-		iife = '(function() {{ var result, label = "<label:{}><discard:{}>", noVal = "no result" + label; '.format(
-				msg.label, 'yes' if msg.discard else 'no')
+		iife = '(function() {{ var result, label = "<rid:{}><discard:{}>", noVal = "no result" + label; '.format(
+				msg.rid, 'yes' if msg.discard else 'no')
 		iife += 'try {{ result = {}; }}'.format(msg.cmd)
 		# iife += 'try {{ result = {}; }} catch (e) {{ return noVal; }} return result + label; }})()'.format(msg.cmd)
 		if msg.discard:
@@ -3425,83 +4563,97 @@ class AppWindow(Frame):
 			iife += ' catch (e) { console.consoleMessage(e); return noVal; } return result + label; })()'
 		return iife
 
-	timedOutCmds = {}
-	def sendSilentCmd(self):
-		if self.pollingSuspended: return
-		if len(self.pendingMessages) == 0:					# don't interfere w/ large outputs
-			if not self.replyPending and len(self.requests):# wait for reply before sending next
-				if hasattr(cmdLineHandler.inputReceiver,'receiveUserInput') and cmdLineHandler.inputReceiver.Active:
-					msg = self.requests.pop(0)
-					self.replyPendingTimer = clock() if Python2 else perf_counter()	# start timeout clock
-					self.replyPending = msg._replace(timeSent=self.replyPendingTimer)
-					# wrap all internal cmds in IIFE for label & discard
-					silentCmd = msg.cmd if msg.cmd.startswith('(function()') else self.mkCmdIIFE(msg)
-					cmdLineHandler.inputReceiver.receiveUserInput(silentCmd)
-					
-					# if dca.g['debug']:						 ###cag
-						# numRequests, numTimedOut = len(self.requests), len(self.timedOutCmds)
-						# if numRequests == 0 and numTimedOut == 0:
-							# debugLogger.debug('w/ no requests and no timedOutCmds')
-						# if numRequests:
-							# debugLogger.debug('w/ {} requests{}'.format(numRequests, 
-								# '' if not numRequests else ': "{}"'.format('", "'.join(r.label for r in self.requests))))
-						# if numTimedOut:
-							# debugLogger.debug('w/ {} timed out{}'.format(numTimedOut, 
-								# '' if not numTimedOut else ': "{}"'.format('", "'.join(r for r in self.timedOutCmds))))
-						# debugLogger.debug('==> {}: {}'.format(msg.label, msg.cmd)) 
-							
-			elif self.replyPendingTimer is not None: 		# monitor elapsed time to abort for non-reply
-				currentTick = clock() if Python2 else perf_counter()
-				elapsed = currentTick - self.replyPendingTimer
-				timedOut = elapsed > CMD_TIMEOUT_LONG if self.replyPending.label \
-									   in ['setDetailLevel', 'writeMemoryStats', ] else elapsed > CMD_TIMEOUT
-				if timedOut:	# timeout after 2 or 4 secs
-					self.timedOutCmds[self.replyPending.label] = self.replyPending
-					self.reSubmitPending()
-		self.after(50, self.sendSilentCmd)
+	def sendSilentCmd(self):			# send queued cmds while there's room in flight
+		if self.pollingSuspended or len(self.pendingMessages):	# don't interfere w/ large outputs
+			return						# - processMessage calls when they're done
+		receiver = cmdLineHandler.inputReceiver
+		if not (hasattr(receiver, 'receiveUserInput') and receiver.Active):
+			return
+		requests, inFlight = self.requests, self.inFlight
+		while len(requests) and len(inFlight) < SILENT_CMDS_IN_FLIGHT:
+			self.silentCmdID += 1
+			msg = requests.pop(0)._replace(timeSent=clock() if Python2 else perf_counter(), # start timeout clock
+											rid=self.silentCmdID)
+			inFlight[msg.rid] = msg
+			timeout = CMD_TIMEOUT_LONG if msg.label in ['setDetailLevel', 'writeMemoryStats', ] else CMD_TIMEOUT
+			self.deadlines.schedule(('reply', msg.rid), timeout, self.silentCmdTimedOut, msg.rid)
+			# wrap all internal cmds in IIFE for request ID & discard
+			receiver.receiveUserInput(self.mkCmdIIFE(msg))
+
+	timedOutCmds = {}					# label: SilentMsg, for processing late replies
+	def silentCmdTimedOut(self, rid):	# deadline handler, no reply after 2 or 4 secs
+		msg = self.inFlight.get(rid)
+		if msg is None:
+			return
+		if self.pollingSuspended:		# user cmd in progress, give it more time
+			self.deadlines.schedule(('reply', rid), CMD_TIMEOUT, self.silentCmdTimedOut, rid)
+			return
+		self.timedOutCmds[msg.label] = msg
+		self.deadlines.schedule(('stale', msg.label), CMD_TIMEOUT_ABORT, self.expireTimedOutCmd, msg.label)
+		self.reSubmitPending(msg)
+		self.sendSilentCmd()			# in case it was not resubmitted
+
+	def expireTimedOutCmd(self, label):	# deadline handler, late replies no longer wanted
+		msg = self.timedOutCmds.get(label)
+		if msg is None:
+			return
+		remaining = CMD_TIMEOUT_ABORT - ((clock() if Python2 else perf_counter()) - msg.timeSent)
+		if remaining > 0:				# timeSent was reset (see submitRequest)
+			self.deadlines.schedule(('stale', label), remaining, self.expireTimedOutCmd, label)
+		else:
+			del self.timedOutCmds[label]
 		
-	def handleMessage(self, message, colorKey, emphasisRanges):
-		self.pendingMessages.append(( message, colorKey, emphasisRanges ))
+	def handleMessage(self, message, colorKey, emphasisRanges, reply=None):
 		# must buffer incoming messages, as large volume can get OSError: [Errno 28] No space left on device
-		length = len(self.pendingMessages)
-		if length > 3 * self.messageBatchSize:
-			self.messageBatchSize += self.messageBatchSize // 2
-			status = 'handleMessage, buffer has {} messages, => larger messageBatchSize {}'.format(length, self.messageBatchSize)
-			if dca.g['debug']:
-				print(status)
-			else:
-				debugLogger.debug(status)
+		pending = self.pendingMessages
+		pending.append(( message, colorKey, emphasisRanges, reply ))
+		if len(pending) >= RENDER_BACKLOG and self.client is not None:
+			self.client.holdInput(self)	# let Oolite wait, processMessage resumes
 		if self.messageQueueID is None:
-			self.messageQueueID = self.after(10, self.processMessage)
+			self.messageQueueID = self.after(RENDER_INTERVAL, self.processMessage)
 
-	pendingMessages = []
-	messageBatchSize = 25
+	pendingMessages = deque()
 	messageQueueID = None
-	def processMessage(self):
+	renderBudget = RENDER_BUDGET		# reduced on Errno 28
+	renderStats = {						# for the current/last backlog, see noteRenderFrame
+		'backlog': 0,					# messages waiting after the last frame
+		'frameCost': 0.0,				# seconds spent in the last frame
+		'peakBacklog': 0,
+		'maxFrameCost': 0.0,
+		'frames': 0,
+		'messages': 0,
+	}
+	def processMessage(self):			# print messages for up to renderBudget, then let Tk breathe
 		if self.messageQueueID:
 			self.after_cancel(self.messageQueueID)
 			self.messageQueueID = None
+		pending = self.pendingMessages
 		debugStatus = None
+		numMsgs = 0
+		collapsing = self.localOptnVars['CollapseRepeats'].get()
+		start = clock() if Python2 else perf_counter()
+		deadline = start + self.renderBudget
 		try:
-			numMsgs = min(self.messageBatchSize, len(self.pendingMessages))
-			while numMsgs > 0:
+			while len(pending):
 				debugStatus = None
-				numMsgs -= 1
-				message, colorKey, emphasisRanges = self.pendingMessages.pop(0)	
+				message, colorKey, emphasisRanges, reply = pending.popleft()
 				debugStatus = 'popped'
+				numMsgs += 1
+				outOfTime = (clock() if Python2 else perf_counter()) > deadline
 				if colorKey not in ['command', 'command-result']:	# it's an oolite message
-					isLastOfRun = colorKey != self.pendingMessages[0][1] if numMsgs > 0 else True
+					if collapsing and self.collapseRepeat(message, colorKey):
+						debugStatus = 'printed'
+						if outOfTime: break
+						continue
+					isLastOfRun = outOfTime or not len(pending) or colorKey != pending[0][1]
+					seq = self.logStore.end
 					self.colorPrint(message, colorKey, emphasisRanges, lastInBatch=isLastOfRun)
 					debugStatus = 'printed'
+					if collapsing and self.logStore.end > seq:	# not suppressed
+						self.noteRepeatable(message, colorKey, seq)
+					if outOfTime: break
 					continue
-				msgLabel = None
-				labelStart = message.find('<label:')
-				if labelStart >= 0:
-					labelStart += 7 		# len('<label:')
-					labelEnd = message.find('>', labelStart)
-					if labelEnd >= 0:
-						msgLabel = message[ labelStart:labelEnd ]
-				if msgLabel is None:		# must be part of a USER_CMD or its reply
+				if reply is None:			# must be part of a USER_CMD or its reply
 					if message.startswith('_ '):	# multi-line user cmds get echoed w/ '_ ' prefix
 						if not hasattr(self, 'suspensionMenu'):	# first time we know it's multi-line
 							self.suspendMsgTraffic()
@@ -3513,19 +4665,14 @@ class AppWindow(Frame):
 				if colorKey == 'command':			# never echo internal commands
 					debugStatus = 'printed'
 					continue
+				rid, result, keep = reply			# see SimpleConsoleDelegate.classifyOutput
 				# internal cmds always get a reply, though it may be 'no result' (done for firm control of traffic)
-				if not self.replyPending or self.replyPending.label != msgLabel:	# unexpected reply
-					# if dca.g['debug']:					###cag
-						# debugLogger.debug('not expecting msgLabel = {}, replyPending = {}'.format(
-									# msgLabel, self.replyPending.label if self.replyPending else None))
-						# debugLogger.debug('# requests = {}: {}'.format(
-									# len(self.requests), '' if len(self.requests) == 0 else [r.label for r in self.requests]))
-						# debugLogger.debug('# timedOut = {}: {}'.format(
-									# len(self.timedOutCmds), '' if len(self.timedOutCmds) == 0 else [r for r in self.timedOutCmds]))
+				if rid not in self.inFlight:		# unexpected reply
 					if 'discard:yes' not in message:
 						self.colorPrint(message, colorKey, emphasisRanges)
 						debugStatus = 'printed'
-						msg = 'no reply expected for message, replyPending: {}'.format(self.replyPending)
+						msg = 'no reply expected for message, in flight: {}'.format(
+									', '.join(str(r) for r in self.inFlight))
 						msg += '\n    colorKey {}, message: {}'.format(colorKey, message[:80] + (' ...' if len(message) > 80 else ''))
 						if dca.g['debug']:
 							print(msg)
@@ -3533,24 +4680,21 @@ class AppWindow(Frame):
 						else:
 							debugLogger.warning(msg)
 					if self.pollingSuspended:	# timed out due to user cmd 
-						self.reSubmitPending()
+						if outOfTime: break
 						continue
 				
-				# if dca.g['debug']:
-					# debugLogger.debug('processing {}\n'.format(message)) 
-
-				debugStatus = self.processSilentCmd(msgLabel, message, colorKey, emphasisRanges, lastInBatch= (numMsgs == 0) )
+				debugStatus = self.processSilentCmd(rid, result, keep, message, colorKey, emphasisRanges,
+													lastInBatch=outOfTime or not len(pending))
+				if outOfTime: break
 			# endwhile
-			if len(self.pendingMessages):
-				self.messageQueueID = self.after(10, self.processMessage)
 		except Exception as exc:
 			errmsg = 'Exception: {}'.format(exc)
 			if '[Errno 28] No space left on device' in errmsg:
 				if debugStatus != 'printed':
-					self.pendingMessages.insert(0, ( message, colorKey, emphasisRanges ))
-				if self.messageBatchSize > 1:
-					self.messageBatchSize = 1 if self.messageBatchSize < 4 else self.messageBatchSize // 2
-					status = 'processMessage, smaller messageBatchSize {}'.format(self.messageBatchSize)
+					pending.appendleft(( message, colorKey, emphasisRanges, reply ))
+				if self.renderBudget > 0.001:
+					self.renderBudget /= 2
+					status = 'processMessage, smaller renderBudget {:.1f} ms'.format(self.renderBudget * 1000)
 					if dca.g['debug']:
 						print(status)
 					else:
@@ -3562,24 +4706,172 @@ class AppWindow(Frame):
 					pdb.set_trace()
 				else:
 					debugLogger.error(errmsg)
+		if self.repeatsChanged:
+			self.showRepeatCounts()
+		self.noteRenderFrame(numMsgs, (clock() if Python2 else perf_counter()) - start)
+		if len(pending) <= RENDER_BACKLOG // 2 and self.client is not None:
+			self.client.releaseInput(self)
+		if len(pending):
+			self.messageQueueID = self.after(RENDER_INTERVAL, self.processMessage)
+		else:
+			self.sendSilentCmd()		# replies have made room
+
+	# Collapsing repeats: a message identical to the line printed just before it
+	# is not printed; instead that line gets a count, " ×N", updated once per
+	# frame.  With CollapseWindow > 0, lines are compared with their numbers
+	# masked, against any of the last CollapseWindow lines printed, so eg. an
+	# error and its location line repeating in turn are both counted, and the
+	# count shows the numbers of the latest copy that differs.  Counts are kept
+	# with the line's record in logStore, so lines paged back in show theirs.
+	repeats = {}						# key: [seq, text, noteShown, mark]
+	repeatsChanged = False
+	def repeatKey(self, message, colorKey):
+		if self.localOptions['CollapseWindow'] > 0:
+			return colorKey, DIGITS_RE.sub('#', message)
+		return colorKey, message
+
+	def collapseRepeat(self, message, colorKey):	# True if message was counted, not printed
+		entry = self.repeats.get(self.repeatKey(message, colorKey))
+		if entry is None or entry[0] < self.logStore.end - max(1, self.localOptions['CollapseWindow']):
+			return False
+		if not self.logStore.addRepeat(entry[0], None if message == entry[1] else message):
+			return False
+		self.repeatsChanged = True
+		return True
+
+	def repeatNote(self, count, variant):	# what's shown at the end of a repeated line
+		if variant is None:
+			return u' \u00d7{}'.format(count + 1)
+		return u' \u00d7{} (last: {})'.format(count + 1, ', '.join(DIGITS_RE.findall(variant)))
+
+	def noteRepeatable(self, message, colorKey, seq):	# message was printed as record seq
+		window = max(1, self.localOptions['CollapseWindow'])
+		repeats, oldest = self.repeats, seq - window
+		if len(repeats) > 2 * window + 32:	# drop those out of the window now and then
+			for key in [key for key, entry in repeats.items() if entry[0] <= oldest]:
+				self.forgetRepeat(key)
+		key = self.repeatKey(message, colorKey)
+		self.forgetRepeat(key)
+		repeats[key] = [seq, message, u'', None]
+
+	def forgetRepeat(self, key):
+		entry = self.repeats.pop(key, None)
+		if entry is not None and entry[3] is not None:
+			self.bodyText.mark_unset(entry[3])
+
+	def forgetAllRepeats(self):
+		for key in list(self.repeats):
+			self.forgetRepeat(key)
+		self.repeatsChanged = False
+
+	def showRepeatCounts(self):			# update the counts of repeated lines, called once per frame
+		self.repeatsChanged = False
+		txt, store, viewRecords = self.bodyText, self.logStore, self.viewRecords
+		try:
+			if not self.stateNormal:
+				txt.config(state=NORMAL)
+			self.flushPrintBuffer()		# the lines being counted must be in bodyText
+			lastLine = int(txt.index('end-1c').split('.')[0]) - 1
+			for key, entry in list(self.repeats.items()):
+				seq, _, shown, mark = entry
+				repeat = store.repeat(seq)
+				note = u'' if repeat is None else self.repeatNote(*repeat)
+				if note == shown:
+					continue
+				if seq < self.viewFirst or seq < store.first:	# trimmed from bodyText
+					self.forgetRepeat(key)
+					continue
+				tag = store.key(seq)
+				if mark is None:		# first repeat, mark the end of its line
+					after = sum(lines for lines, _ in islice(viewRecords, seq - self.viewFirst + 1, None))
+					mark = entry[3] = 'repeat{}'.format(seq)
+					txt.mark_set(mark, '{}.end'.format(lastLine - after))
+					txt.mark_gravity(mark, LEFT)
+				else:
+					txt.delete(mark, '{} +{}c'.format(mark, len(shown)))
+				txt.insert(mark, note, tag)
+				entry[2] = note
+		except Exception as exc:
+			errmsg = 'Exception: {}'.format(exc)
+			if dca.g['debug']:
+				print(errmsg)
+				print_exc()
+				pdb.set_trace()
+			else:
+				debugLogger.exception(errmsg)
+		finally:
+			txt.config(state=DISABLED)
+			self.stateNormal = False
+
+	def flushPrintBuffer(self):			# insert the lines colorPrint is holding, bodyText must be NORMAL
+		runs = self.printRuns
+		if self.printBuffer:
+			runs.extend((''.join(self.printBuffer), self.printTag))
+			del self.printBuffer[:]
+		if runs:
+			for idx in range(0, len(runs), 2000):	# 1000 segments per insert
+				self.bodyText.insert(END, *runs[idx:idx + 2000])
+			del runs[:]
+		self.printKey = self.printTag = None
+
+	def addEmphasisRuns(self, runs, text, tag, emphases):	# extend runs with text's (segment, tags) pairs
+		posn = 0
+		for idx in range(0, len(emphases) - 1, 2):	# ranges come in pairs: start, length
+			estart = max(emphases[idx], posn)
+			if posn < estart:
+				runs.extend((text[posn:estart], tag))
+			posn = max(estart, emphases[idx] + emphases[idx + 1])
+			if estart < posn:
+				runs.extend((text[estart:posn], ('emphasis', tag)))
+		if posn < len(text):
+			runs.extend((text[posn:], tag))
+
+	def noteRenderFrame(self, numMsgs, cost):
+		stats, backlog = self.renderStats, len(self.pendingMessages)
+		if stats['backlog'] == 0:		# start of a new backlog
+			stats['peakBacklog'] = stats['frames'] = stats['messages'] = 0
+			stats['maxFrameCost'] = 0.0
+		stats['backlog'] = backlog
+		stats['frameCost'] = cost
+		stats['frames'] += 1
+		stats['messages'] += numMsgs
+		if cost > stats['maxFrameCost']:
+			stats['maxFrameCost'] = cost
+		if backlog + numMsgs > stats['peakBacklog']:
+			stats['peakBacklog'] = backlog + numMsgs
+		if backlog == 0 and stats['peakBacklog'] >= BACKLOG_REPORT:
+			debugLogger.debug('message backlog of {} cleared: {} messages in {} frames, slowest {:.1f} ms'.format(
+								stats['peakBacklog'], stats['messages'], stats['frames'], stats['maxFrameCost'] * 1000))
 	
-	def processSilentCmd(self, msgLabel, message, colorKey, emphasisRanges, lastInBatch=True):
+	def renderStatus(self):				# renderStats as shown in the Debug menu
+		stats = self.renderStats
+		if stats['backlog']:
+			return 'Output backlog: {} messages, frame {:.1f} ms'.format(
+						stats['backlog'], stats['frameCost'] * 1000)
+		if stats['frames'] == 0:
+			return 'Output backlog: none yet'
+		return 'Output backlog: none, last peak {} in {} frames, slowest {:.1f} ms'.format(
+					stats['peakBacklog'], stats['frames'], stats['maxFrameCost'] * 1000)
+
+	def processSilentCmd(self, rid, result, keep, message, colorKey, emphasisRanges, lastInBatch=True):
 		debugStatus = 'popped'
-		result = message[ : message.find('<label:') ]
-		if self.replyPending and self.replyPending.label == msgLabel:
-			request = self.replyPending
-		elif msgLabel in self.timedOutCmds:
-			# SilentMsg: namedtuple('SilentMsg', 'cmd, label, tkVar, discard, timeSent')
-			request = self.timedOutCmds[msgLabel]
+		request = self.inFlight.pop(rid, None)
+		if request is not None:
+			self.deadlines.cancel(('reply', rid))
+		else:
+			# SilentMsg: namedtuple('SilentMsg', 'cmd, label, tkVar, discard, timeSent, rid')
+			for request in self.timedOutCmds.values():	# only a few, so search by rid
+				if request.rid == rid:
+					break
+			else:								# a timed out command that's expired
+				return 'printed'
 			elapsed = (clock() if Python2 else perf_counter()) - request.timeSent
 			if elapsed > CMD_TIMEOUT_ABORT:	# only process if not too stale
-				del self.timedOutCmds[msgLabel]	# delete expired comand
+				del self.timedOutCmds[request.label]	# delete expired comand
 				return 'printed'
-		else:									# a timed out command that's expired
-			return 'printed'
 		if message.startswith('_ '):			# internal cmd failed
 			debugLogger.warning('**** internal error: {}'.format(message))
-			self.reSubmitPending()
+			self.reSubmitPending(request)
 		elif request.tkVar is not None:			# it's a command-result
 			if request.label.startswith('alias-'):
 				self.setAliasRegistry(request.label, result, request.tkVar)
@@ -3590,31 +4882,38 @@ class AppWindow(Frame):
 			elif result != 'no result':
 				self.setDebugOption(request.label, result, request.tkVar)
 			else:
-				print('Yikes! unsupported result "{}" for label "{}"'.format(result, msgLabel))
+				print('Yikes! unsupported result "{}" for label "{}"'.format(result, request.label))
 				pdb.set_trace()
 		elif request.label.startswith('alias-'):# the response from -send'g the alias definition
 			self.setAliasRegistry(request.label, result)
-		if not message.startswith('no result') and \
-			   message.find('<discard:no>') >= 0:
+		if keep:
 			self.colorPrint(message, colorKey, emphasisRanges, lastInBatch)
 			debugStatus = 'printed'
-		if request == self.replyPending:
-			self.replyPending = self.replyPendingTimer = None
 		return debugStatus
 
+	# bodyText holds the newest records of logStore, from viewFirst on, about
+	# maxBufferSize chars.  checkBufferSize trims the oldest of them from the top
+	# without asking Tk to count anything, and scrolling to the top pages older
+	# records back in from logStore.
 	maxBufferSize = 200000
-	screenLines = None
-	def checkBufferSize(self):	# keep the buffer at a reasonable size, called 1/100 colorPrints
-		txt = self.bodyText		#   (?cause of OSError [Errno 28] No space left on device)
+	viewFirst = 0						# seq of the record on bodyText's first line
+	viewRecords = deque()				# (lines, chars) of each record shown, from viewFirst
+	viewChars = 0
+	def checkBufferSize(self):	# trim bodyText to half of maxBufferSize, called by colorPrint when over it
+		txt = self.bodyText
 		try:
-			if self.screenLines is None:		# 1st check or font has changed (is reset in updateForFontChange)
-				height = txt.winfo_reqheight()						# pix
-				self.screenLines = int(height / self.lineSpace)		# number of lines on screen
-			lines, chars = txt.count('1.0', END, 'lines', 'chars')
-			if chars > self.maxBufferSize:
+			viewRecords, target = self.viewRecords, self.maxBufferSize // 2
+			lines, chars, count = 0, self.viewChars, 0
+			while viewRecords and chars > target:
+				recLines, recChars = viewRecords.popleft()
+				lines += recLines
+				chars -= recChars
+				count += 1
+			self.viewFirst += count
+			self.viewChars = chars
+			if lines:
 				txt.config(state=NORMAL)
-				txt.delete('1.0', '{}.end'.format(int(lines / 2)))
-				txt.config(state=DISABLED)		
+				txt.delete('1.0', '{}.0'.format(lines + 1))
 		except Exception as exc:
 			errmsg = 'Exception: {},  bodyText.index(END) "{}"'.format(exc, txt.index(END))
 			if dca.g['debug']:
@@ -3623,57 +4922,165 @@ class AppWindow(Frame):
 				pdb.set_trace()
 			else:
 				debugLogger.exception(errmsg)
-	
-	def setColorKey(self, key):
-		colorKeys = self.COLORS.keys()
-		if key == 'dumpObject':
-			key = 'foreground' 		# bug in oolite-debug-console.js, function dumpObject()
-		elif key == 'debugger':
-			key = 'foreground' 		# msg from debugger
-		key = key.lower() if key else 'foreground'
+
+	pageInID = None
+	def bodyScrolled(self, first, last):	# bodyText's yscrollcommand
+		self.bodyText.scrollbar.set(first, last)
+		if float(first) <= 0 and self.viewFirst > self.logStore.first and self.pageInID is None:
+			self.pageInID = self.after_idle(self.pageInOlder)
+
+	def pageInOlder(self, pageSize=None):	# insert older records from logStore at the top, keeping the view
+		self.pageInID = None
+		txt, store = self.bodyText, self.logStore
+		try:
+			stop = self.viewFirst
+			if stop <= store.first:
+				return
+			if pageSize is None:
+				pageSize = self.maxBufferSize // 4
+			start, size = stop, 0
+			while start > store.first and size < pageSize:
+				start -= 1
+				size += store.lengths[start % store.maxRecords]
+			runs, counts = [], []
+			for seq, (_, tag, text, emphases) in enumerate(store.records(start, stop), start):
+				repeat = store.repeat(seq)
+				if repeat is not None:	# its count goes at the end of its last line
+					note = self.repeatNote(*repeat)
+					text, newline = (text[:-1], '\n') if text.endswith('\n') else (text, '')
+				if emphases:
+					self.addEmphasisRuns(runs, text, tag, emphases)
+				else:
+					runs.extend((text, tag))
+				if repeat is not None:
+					runs.extend((note + newline, tag))
+					text += note + newline
+				counts.append((text.count('\n'), len(text)))
+			line, column = txt.index('@0,0').split('.')
+			txt.config(state=NORMAL)
+			for idx in range(len(runs) - 2000, -2000, -2000):	# 1000 segments per insert, last first
+				txt.insert('1.0', *runs[max(0, idx):idx + 2000])
+			txt.config(state=DISABLED)
+			self.stateNormal = False
+			self.viewRecords.extendleft(reversed(counts))
+			self.viewFirst = start
+			self.viewChars += sum(chars for _, chars in counts)
+			txt.yview('{}.{}'.format(int(line) + sum(lines for lines, _ in counts), column))
+		except Exception as exc:
+			errmsg = 'Exception: {}'.format(exc)
+			if dca.g['debug']:
+				print(errmsg)
+				print_exc()
+				pdb.set_trace()
+			else:
+				debugLogger.exception(errmsg)
+
+	def showLogStore(self, store):		# replace bodyText's contents with the latest of store's records
+		self.logStore = store
+		self.clearView()
+		self.viewFirst = store.end
+		self.pageInOlder(self.maxBufferSize // 2)
+		self.bodyText.yview(END)
+
+	# Every color key gets a route, (tag, action, rules, truncate), compiled on
+	# first use and kept until something it depends on changes (colors, Show Log,
+	# Expand macro, Truncate commands or the Routes section of the .cfg file), so
+	# classifying a message is one dict lookup.  action is 'show', 'drop' or
+	# 'log' (written to the log file only); rules are the user's (regex, action)
+	# pairs for the key, tried in order, the first match overriding action.
+	routes = {}
+	routeRules = []						# (color keys or None for all, regex, action) from .cfg
+	routeLogger = None
+	def compileRoute(self, colorKey):
+		colorKeys = self.COLORS
+		if colorKey == 'dumpObject':
+			key = 'foreground' 			# bug in oolite-debug-console.js, function dumpObject()
+		elif colorKey == 'debugger':
+			key = 'foreground' 			# msg from debugger
+		else:
+			key = colorKey.lower() if colorKey else 'foreground'
+		action = 'show'
 		if key == 'macro-expansion' and self.localOptnVars['MacroExpansion'].get() == 0:
-			return None				# suppress print
+			action = 'drop'
 		elif key == 'log':
 			if self.debugOptions['showLog'].get() > 0:
 				key = 'foreground' if key not in colorKeys else key
 			else:
-				return None			# suppress print
-		return key
-	
-	def setColorTag(self, key):
-		colorKeys = self.COLORS.keys()
-		if key in colorKeys:
-			tag = key
-		elif key + '-foreground-color' in colorKeys:
-			tag = key
-		elif key + '-background-color' in colorKeys:
+				action = 'drop'
+		if key in colorKeys or key + '-foreground-color' in colorKeys \
+				or key + '-background-color' in colorKeys:
 			tag = key
 		else:
 			tag = 'foreground'
-		return tag
-		
-	printCount = 0
+		rules = tuple((regex, ruleAction) for keys, regex, ruleAction in self.routeRules
+						if keys is None or colorKey in keys)
+		truncate = colorKey == 'command' and self.localOptnVars['TruncateCmdEcho'].get() == 1
+		route = self.routes[colorKey] = (tag, action, rules, truncate)
+		return route
+
+	def routesChanged(self, *args):		# also a Tk var trace handler
+		self.routes.clear()
+
+	def loadRoutes(self, specs):		# specs: {name: 'action:colorKeys:regex'}, see defaultConfig
+		rules = []
+		for name, spec in specs.items():
+			action, _, rest = spec.partition(':')
+			keys, _, pattern = rest.partition(':')
+			action, keys = action.strip().lower(), keys.strip()
+			try:
+				if action not in ['show', 'drop', 'log']:
+					raise ValueError('action must be show, drop or log')
+				keys = None if keys in ['', '*'] else frozenset(key.strip() for key in keys.split(','))
+				rules.append((keys, compile(pattern), action))
+			except Exception as exc:
+				debugLogger.error('ignoring route {} = {}: {}'.format(name, spec, exc))
+		self.routeRules = rules
+		if self.routeLogger is None:
+			self.routeLogger = getLogger('DebugConsole.routed')	# level INFO reaches the log
+			self.routeLogger.setLevel(INFO)						#   file but not consoleHandler
+		self.routesChanged()
+
+	def storeMessage(self, store, text, colorKey, emphasisRanges):	# a message for a session not shown
+		tag, action, rules, truncate = self.routes.get(colorKey) or self.compileRoute(colorKey)
+		for regex, ruleAction in rules:	# as colorPrint routes it, without touching Tk
+			if regex.search(text):
+				action = ruleAction
+				break
+		if action == 'log':
+			self.routeLogger.info('{}: {}'.format(colorKey, text.rstrip()))
+		if action != 'show':
+			return False
+		store.append(text.rstrip(' \t\n\r') + '\n', tag, emphasisRanges)
+		return True
+
 	stateNormal = False
-	printBuffer = []
+	# Lines are held in printBuffer while messages of one color key arrive in a
+	# batch, then inserted with one call: printBuffer's plain lines are joined
+	# into a single segment, emphasised lines become (segment, tags) pairs in
+	# printRuns, and flushPrintBuffer sends them all as insert(END, seg, tags, ...).
+	printBuffer = []					# plain lines in printTag, after printRuns
+	printRuns = []						# segment, tags, segment, tags, ...
 	printTag = None
 	printKey = None
 	def colorPrint(self, text, colorKey='debugger', emphasisRanges=None, lastInBatch=True):
 		txt = self.bodyText
 		try:
-			sameColorKey = self.printKey and self.printKey == colorKey
-			if lastInBatch or not sameColorKey:
-				self.printKey = colorKey
-				key = self.setColorKey(colorKey)
-				if key is None: return			# print suppressed
-				tag = self.setColorTag(key)
-			else:		# avoid unnecessary calls to setColorKey/Tag
-				key, tag = self.printKey, self.printTag
-			sameColorTag = not self.printTag or self.printTag == tag
-
-			self.printCount += 1
-			if self.screenLines and self.printCount > 5 * self.screenLines:
-				self.checkBufferSize()
-				self.printCount = 0
+			tag, action, rules, truncate = self.routes.get(colorKey) or self.compileRoute(colorKey)
+			for regex, ruleAction in rules:
+				if regex.search(text):
+					action = ruleAction
+					break
+			if action != 'show':
+				if action == 'log':
+					self.routeLogger.info('{}: {}'.format(colorKey, text.rstrip()))
+				if lastInBatch and (self.printBuffer or self.printRuns):
+					self.flushPrintBuffer()
+				return
+			if self.printKey != colorKey:	# a key's tag is fixed by its route
+				if self.printBuffer or self.printRuns:
+					self.flushPrintBuffer()		# the previous key's lines
+				self.printKey, self.printTag = colorKey, tag
+
 			try:
 				text = text.rstrip(' \t\n\r') + '\n'
 			except UnicodeEncodeError:
@@ -3683,50 +5090,31 @@ class AppWindow(Frame):
 				self.stateNormal = True
 				
 			maxWidth = None
-			if colorKey == 'command' and self.localOptnVars['TruncateCmdEcho'].get():
-				self.bodyText.update_idletasks()# required for winfo_width
-				maxWidth = self.bodyText.winfo_width()
-
-			posn = 0
-			if emphasisRanges is None and maxWidth is None:
-				bufferLen = len(self.printBuffer)
-				# here's where voluminous log statements can cause a bottleneck
-				if not lastInBatch and sameColorKey and sameColorTag:	
-					self.printBuffer.append(text)				# buffer lines to reduce # of .insert calls
-				elif not lastInBatch and sameColorKey:			# new tag, flush buffer and restart buffering
-					if bufferLen:
-						txt.insert(END, ''.join(self.printBuffer), tag)
-						del self.printBuffer[:]
-					self.printTag = tag
-					self.printBuffer.append(text)
-				elif bufferLen and (lastInBatch or not sameColorKey):# flush buffer completely
-					if sameColorTag:
-						self.printBuffer.append(text)
-					if bufferLen:
-						txt.insert(END, ''.join(self.printBuffer), tag)
-						del self.printBuffer[:]
-					if not sameColorTag:
-						txt.insert(END, text, tag)
-					self.printKey = self.printTag = None
-				else:
-					txt.insert(END, text, tag)
-			elif maxWidth is None:				# not trucating output
-				while len(emphasisRanges) > 1:	# ranges come in pairs
-					estart = emphasisRanges.pop(0)
-					elen = emphasisRanges.pop(0)
-					if posn < estart: 			# text before emphasis
-						txt.insert(END, text[ posn:estart ], tag)
-					posn = estart + elen		# emphasis text
-					txt.insert(END, text[ estart:posn ], ('emphasis',tag))
-					if len(emphasisRanges) < 2: break
-					nextE = emphasisRanges[0]
-					if posn < nextE: 			# text after emphases
-						txt.insert(END, text[ posn:nextE ], tag)
-						posn = nextE
-				if posn < len(text): 			# text after all the emphases
-					txt.insert(END, text[ posn: ], tag)
-			else:
+			if truncate:
+				if self.bodyWidth is None:		# before bodyText's first <Configure>
+					self.bodyText.update_idletasks()# required for winfo_width
+					self.bodyWidth = self.bodyText.winfo_width()
+				maxWidth = self.bodyWidth
+
+			self.logStore.append(text, tag, emphasisRanges)
+			self.viewRecords.append((1 if maxWidth else text.count('\n'), len(text)))
+			self.viewChars += len(text)
+
+			# here's where voluminous log statements can cause a bottleneck
+			if maxWidth is not None:			# truncating output
+				if self.printBuffer or self.printRuns:
+					self.flushPrintBuffer()		# keep lines in order
+					self.printKey, self.printTag = colorKey, tag
 				self.addWords(text, tag, maxWidth, emphasisRanges)
+			elif emphasisRanges:
+				if self.printBuffer:
+					self.printRuns.extend((''.join(self.printBuffer), tag))
+					del self.printBuffer[:]
+				self.addEmphasisRuns(self.printRuns, text, tag, emphasisRanges)
+			else:
+				self.printBuffer.append(text)	# buffer lines to reduce # of .insert calls
+			if lastInBatch and (self.printBuffer or self.printRuns):
+				self.flushPrintBuffer()
 		except Exception as exc:
 			errmsg = 'Exception: {}'.format(exc)
 			if dca.g['debug']:
@@ -3737,85 +5125,76 @@ class AppWindow(Frame):
 				debugLogger.error(errmsg)
 		finally:
 			if lastInBatch:
+				if self.viewChars > self.maxBufferSize and not self.printBuffer:
+					self.checkBufferSize()
 				txt.config(state=DISABLED)
 				self.stateNormal = False
 				txt.yview(END)
 				txt.tag_raise(SEL)
 
-	spaceLen = eSpaceLen = None
-	measuredWords = {}
-	measuredEWords = {}
-	def addWords(self, text, tag, maximumWidth, emphases=None):
+	glyphWidths = None					# (default, emphasis) GlyphWidths, None after a font change
+	def fontGlyphs(self):
+		if self.glyphWidths is None:
+			self.glyphWidths = GlyphWidths(self.defaultFont), GlyphWidths(self.emphasisFont)
+		return self.glyphWidths
+
+	bodyWidth = None					# bodyText's width, kept by bodyResized
+	def bodyResized(self, event):
+		self.bodyWidth = event.width
+
+	def addWords(self, text, tag, maximumWidth, emphases=None):	# insert text as one line of whole words
+		# Whitespace, including newlines, is collapsed to single spaces.  Each word
+		# is split where emphasis starts/stops and measured from the glyph tables,
+		# adding words (and a space) until the next would pass maximumWidth.
+		runs, index = [], 0				# segment, tags, ... for a single insert
 		try:
-			txt, font, efont = self.bodyText, self.defaultFont, self.emphasisFont
-			measuredWords, measuredEWords = self.measuredWords, self.measuredEWords
-			if self.spaceLen is None or self.eSpaceLen is None:	# 1st time or font's changed (see showAliasValue)
-				self.spaceLen, self.eSpaceLen = font.measure(' '), efont.measure(' ')
-			spaceLen, eSpaceLen = self.spaceLen, self.eSpaceLen
-			words = text.split()
-			hasEmphasis = False
-			buffer, index, estop = [], 0, -1
-			
-			def nextEmphasis():
-				if emphases is not None and len(emphases) > 1:	# ranges come in pairs
-					start = emphases.pop(0)
-					stop = start + emphases.pop(0)
-				else:
-					start = stop = maximumWidth
-				return start, stop
-				
-			def measuredWidth(phrase):
-				if hasEmphasis:
-					if phrase in measuredEWords:
-						return measuredEWords[phrase]
-					width = measuredEWords[phrase] = efont.measure(phrase)
-					return width
+			glyphs, eGlyphs = self.fontGlyphs()
+			ranges = [(emphases[idx], emphases[idx] + emphases[idx + 1]) 
+							for idx in range(0, len(emphases) - 1, 2)] if emphases else []
+			ranges.append((len(text), len(text)))	# sentinel
+			spaceLen, eSpaceLen = glyphs.advances[' '], eGlyphs.advances[' ']
+			words, width, rangeIdx = [], 0, 0	# the parts of words that fit, their width
+			for match in WORD_RE.finditer(text):
+				start, stop = match.span()
+				while ranges[rangeIdx][1] <= start:	# skip emphases ending before this word
+					rangeIdx += 1
+				if ranges[rangeIdx][0] >= stop:	# plain word, the common case
+					word = match.group()
+					parts = ((word, False),)
+					wordWidth = glyphs.measure(word) + spaceLen
 				else:
-					if phrase in measuredWords:
-						return measuredWords[phrase]
-					width = measuredWords[phrase] = font.measure(phrase)
-					return width
-				
-			
-			[estart, estop] = nextEmphasis() 
-			maxWidth, finished = maximumWidth, False
-			for word in words:
-				index = text.find(word, index)
-				wordLen = len(word)
-				wordEnd = index + wordLen
-				if index > estop:
-					[estart, estop] = nextEmphasis()
-				hasEmphasis = index < estop and wordEnd > estart
-				if hasEmphasis and (estart > index or estop <= wordEnd): # word partially emphasized
-					wordStart = index
-					wordIdx = 0
-					del buffer[0:] # save word parts until we know whole word will fit
-					while index < wordEnd:
-						hasEmphasis = index >= estart
-						wBreak = estop if hasEmphasis else estart
-						output = word[ wordIdx:wBreak-wordStart ]
-						width = measuredWidth(output)
-						if wBreak >= wordEnd:	# detect last part, only then add spaceLen into calcs
-							width += eSpaceLen if hasEmphasis else spaceLen
-						if width > maxWidth:
-							finished = True
-							break
-						buffer.append([output, ('emphasis',tag) if hasEmphasis else (tag,)])
-						wordIdx += len(output)
-						index += len(output)
-						maxWidth -= width
-						if index >= estop:
-							[estart, estop] = nextEmphasis()
-					if finished: break			# word does not fit
-					for chs, tags in buffer:	# output word
-						txt.insert(END, chs, tags)
-					txt.insert(END, ' ', ('emphasis',tag) if hasEmphasis else tag)
-				else:	# output whole word
-					width = measuredWidth(word) + (eSpaceLen if hasEmphasis else spaceLen)
-					if width > maxWidth: break
-					txt.insert(END, '{} '.format(word), ('emphasis',tag) if hasEmphasis else tag)
-					index += wordLen
-					maxWidth -= width
+					parts, posn, idx = [], start, rangeIdx
+					while posn < stop:
+						estart, estop = ranges[idx]
+						if posn < estart:
+							parts.append((text[posn:min(estart, stop)], False))
+							posn = min(estart, stop)
+						elif posn < estop:
+							parts.append((text[posn:min(estop, stop)], True))
+							posn = min(estop, stop)
+						else:
+							idx += 1
+					wordWidth = eSpaceLen if parts[-1][1] else spaceLen
+					for part, emphasised in parts:
+						wordWidth += eGlyphs.measure(part) if emphasised else glyphs.measure(part)
+				if width + wordWidth > maximumWidth:
+					break					# no need to measure the rest
+				width += wordWidth
+				words.append(parts)
+				index = stop
+			eTag, lastTag, segment = ('emphasis', tag), None, []
+			for parts in words:
+				for part, emphasised in parts:
+					partTag = eTag if emphasised else tag
+					if partTag is not lastTag and segment:
+						runs.extend((''.join(segment), lastTag))
+						del segment[:]
+					lastTag = partTag
+					segment.append(part)
+				segment.append(' ')
+			if segment:
+				runs.extend((''.join(segment), lastTag))
+			maximumWidth -= width
 
 		except Exception as exc:
 			errmsg = 'Exception: {}'.format(exc)
@@ -3826,10 +5205,15 @@ class AppWindow(Frame):
 			else:
 				debugLogger.error(errmsg)
 
-		txt.insert(END, '\n', tag)	# lose \n when tokenize
-		return index, maxWidth
+		runs.extend(('\n', tag))		# lose \n when tokenize
+		self.bodyText.insert(END, *runs)
+		return index, maximumWidth
 
 	def bodyClear(self):
+		self.logStore.clear()
+		self.clearView()
+
+	def clearView(self):
 		self.tried = 0
 		self.bodyText.config(state=NORMAL)
 		self.bodyText.delete('1.0', END)
@@ -3837,6 +5221,10 @@ class AppWindow(Frame):
 		self.bodyText.edit_modified(False)
 		self.delCount = 0
 		self.bodyText.config(state=DISABLED)
+		self.viewFirst = self.logStore.end
+		self.viewRecords.clear()
+		self.viewChars = 0
+		self.forgetAllRepeats()
 
 	def cmdClear(self, event=None):
 		self.closeAnyOpenFrames()
@@ -3869,14 +5257,14 @@ class AppWindow(Frame):
 	#	oops += "\nthe default port." if (TCP_Port == defaultOoliteConsolePort) else "port " + str(TCP_Port) +"."
 		oops += "\n\nThis debug console will close now.\n"
 		self.top.minsize(1, 1)
-		self.top.protocol("WM_DELETE_WINDOW", reactor.stop)
+		self.top.protocol("WM_DELETE_WINDOW", stopEventLoop)
 		self.menubar.destroy() 			# grid_forget does nothing!
 
 		self.cmdLine.frame.destroy()
 		self.bodyText.scrollbar.grid_forget()
 
 		titleFont = tkFont.Font(family='Arial', size=16, weight='bold')
-		self.btnOK = Button(self.bodyText, text='OK', font=titleFont, bg='#eee', padx=10, command=reactor.stop)
+		self.btnOK = Button(self.bodyText, text='OK', font=titleFont, bg='#eee', padx=10, command=stopEventLoop)
 		self.btnOK.grid(row=0, column=0, sticky=S)
 		self.btnOK.rowconfigure(0, minsize=50)
 		self.btnOK.columnconfigure(0, minsize=50)
@@ -3910,8 +5298,8 @@ class AppWindow(Frame):
 		self.top.geometry('320x{}'.format( str(errHeight) ))
 		self.unbind_all('<Return>')
 		self.unbind_all('<Escape>')
-		self.bind_all('<Return>', lambda event: reactor.stop())
-		self.bind_all('<Escape>', lambda event: reactor.stop())
+		self.bind_all('<Return>', lambda event: stopEventLoop())
+		self.bind_all('<Escape>', lambda event: stopEventLoop())
 		self.btnOK.focus_set()
 		self.top.resizable(NO, NO) 		# will cause window to blink, so do last
 
@@ -3922,9 +5310,9 @@ class AppWindow(Frame):
 			self.exitCmd()
 		else:
 			if len(cmd) > 0:
-				while cmd in self.cmdHistory:
-					self.cmdHistory.remove(cmd)
-				self.cmdHistory.append(cmd)
+				self.cmdHistory.add(cmd, journal=self.localOptions['SaveHistoryOnExit'])
+				if self.historySearch:
+					self.historySearch.add(cmd)
 			self.cmdSearchClear()
 			self.cmdHistoryIdx = -1	# so cmdHistoryBack will show this cmd first 
 			if hasattr(cmdLineHandler.inputReceiver,'receiveUserInput') and cmdLineHandler.inputReceiver.Active:
@@ -3946,111 +5334,93 @@ class AppWindow(Frame):
 ## cmd history  ############################################################
 
 	def loadCmdHistory(self): 			# Restore CLI history from its savefile
-		self.cmdHistory = None
+		self.cmdHistory = CommandHistory(histVersions, HISTJOURNAL)
 		self.cmdHistoryIdx = -1
 		try:
-			hfile = open(HISTFILE, 'rb')
-			self.cmdHistory = pickle_load(hfile)
-			hfile.close()
-		except IOError as exc:
-			if exc.errno == ENOENT:
-				debugLogger.debug('No command history file found')
-			else:
-				debugLogger.exception('IOError loading command history: {}'.format(exc))
+			if self.cmdHistory.load():	# last session didn't exit cleanly
+				self.cmdHistory.save()
 		except Exception as exc:
 			debugLogger.exception('Error loading command history: {}'.format(exc))
-		if not isinstance(self.cmdHistory, list):
-			self.cmdHistory = []
-		self.loadedCommands = self.cmdHistory[:]
 		self.trimHistory()
 
 	def trimHistory(self):
-		history = self.cmdHistory
-		currLen = len(history)
-		if currLen > MAX_HIST_CMDS:
-			history = self.cmdHistory = history[-MAX_HIST_CMDS:]
-			currLen = len(history)
-		histSize = sum(len(cmd) for cmd in history)
-		while histSize > MAX_HIST_SIZE and currLen:
-			histSize -= len(history.pop(0))
-			currLen -= 1
+		self.cmdHistory.trim()
 		self.cmdSearchClear(reset=True)
 			
-	loadedCommands = None
-	def saveCmdHistory(self): 			# write CLI history to its savefile
+	def saveCmdHistory(self, keep=True): # write CLI history to its savefile
 		try:
-			orig, curr = self.loadedCommands, self.cmdHistory
-			currLen = len(curr)
-			if len(orig) == currLen and all(cmd in orig for cmd in curr):
-				# with file versioning, we now only write when there has been changes
-				return
-			self.trimHistory()
-			hfile = open(nextVersion(HIST_BASE, HIST_EXT, MAX_HIST_VERSION), 'wb')
-			pickle_dump(curr, hfile, protocol=2)
-			hfile.close()
+			# with file versioning, we only write when there has been changes
+			self.cmdHistory.save(keep)
 		except Exception as exc:
 			debugLogger.exception('Failed to save command history: {}'.format(exc))
 
 	def cmdHistoryBack(self, event):
-		histLen = len(self.cmdHistory)
-		if histLen:
+		history = self.cmdHistory
+		if len(history):
 			if self.cmdHistoryIdx < 0:	# just ran a cmd
-				self.cmdHistoryIdx = histLen - 1
-			elif self.cmdHistoryIdx > 0:
-				self.cmdHistoryIdx -= 1
+				self.cmdHistoryIdx = history.last()
+			else:
+				pos = history.older(self.cmdHistoryIdx)
+				if pos >= 0:
+					self.cmdHistoryIdx = pos
 			self.cmdHistoryShow()
-			self.cmdSearchClear(reset=not (0 <= self.cmdHistoryIdx < histLen))
+			self.cmdSearchClear(reset=history.get(self.cmdHistoryIdx) is None)
 		return 'break'
 
 	def cmdHistoryForward(self, event):
-		histLen = len(self.cmdHistory)
-		if histLen:
-			if 0 <= self.cmdHistoryIdx < histLen - 1:
-				self.cmdHistoryIdx += 1
+		history = self.cmdHistory
+		if len(history):
+			if history.get(self.cmdHistoryIdx) is not None:
+				pos = history.newer(self.cmdHistoryIdx)
+				if pos >= 0:
+					self.cmdHistoryIdx = pos
 			self.cmdHistoryShow()
-			self.cmdSearchClear(reset=not (0 <= self.cmdHistoryIdx < histLen))
+			self.cmdSearchClear(reset=history.get(self.cmdHistoryIdx) is None)
 		return 'break'
 
 	def cmdHistoryShow(self, cmd=None):
-		histLen = len(self.cmdHistory)
 		self.cmdLine.delete('1.0', END)
-		if 0 <= self.cmdHistoryIdx < histLen:
-			cmd = self.cmdHistory[self.cmdHistoryIdx]
+		cmd = self.cmdHistory.get(self.cmdHistoryIdx)
+		if cmd is not None:
 			self.cmdLine.insert(END, cmd.rstrip(), 'command')
-		elif histLen == 0:
+		elif len(self.cmdHistory) == 0:
 			self.cmdHistoryIdx = -1
 	
 	def cmdSearchClear(self, reset=False):
 		if self.cmdSearchStr is not None:
 			self.cmdSearchStr = None
+		self.cmdSearchHits = None
 		if reset:
-			self.cmdHistoryIdx = len(self.cmdHistory) - 1
+			self.cmdHistoryIdx = self.cmdHistory.last()
 		
 	cmdSearchStr = None
+	cmdSearchHits = None				# positions of the commands matching cmdSearchStr
 	def cmdSearchHistory(self, direction):
 		try: #######
 		
-			histLen = len(self.cmdHistory)
-			if histLen and self.cmdHistoryIdx < 0:	# just ran a cmd
-				self.cmdHistoryIdx = len(self.cmdHistory) - 1
+			history = self.cmdHistory
+			if len(history) and self.cmdHistoryIdx < 0:	# just ran a cmd
+				self.cmdHistoryIdx = history.last()
 			if self.cmdHistoryIdx >= 0:
 				cmd = self.cmdLine.get('1.0', '1.end').strip()
 				if self.cmdSearchStr is None or len(cmd) == 0:
 					self.cmdSearchStr = cmd if len(cmd) else None
-					curr = self.cmdHistoryIdx = histLen - 1
+					hits = self.cmdSearchHits = history.matches(cmd)
+					last = self.cmdHistoryIdx = history.last()
+					# the newest match, or when searching forward only the newest command
+					idx = len(hits) - 1 if direction < 0 or (hits and hits[-1] == last) else len(hits)
 				else:
-					cmd = self.cmdSearchStr
-					curr = self.cmdHistoryIdx + direction
-					if curr < 0 or curr >= histLen:
-						return
-				cmdLen = len(cmd)
-				history = self.cmdHistory
-				while curr >= 0 and curr < histLen:
-					if history[curr][:cmdLen] == cmd:
-						self.cmdHistoryIdx = curr
+					hits = self.cmdSearchHits
+					if direction < 0:
+						idx = bisect_left(hits, self.cmdHistoryIdx) - 1
+					else:
+						idx = bisect_right(hits, self.cmdHistoryIdx)
+				while 0 <= idx < len(hits):
+					if history.get(hits[idx]) is not None:	# not deleted since
+						self.cmdHistoryIdx = hits[idx]
 						self.cmdHistoryShow()
 						break
-					curr += direction
+					idx += direction
 			return 'break'
 
 		except Exception as exc: ########
@@ -4063,15 +5433,131 @@ class AppWindow(Frame):
 				debugLogger.error(errmsg)
 		
 	def deleteCurrentCmd(self, event=None):
-		histLen = len(self.cmdHistory)
-		if histLen > 0 and 0 <= self.cmdHistoryIdx < histLen:
-			cmd = self.cmdHistory[self.cmdHistoryIdx]
-			self.cmdHistory.remove(cmd)
-			if self.cmdHistoryIdx >= len(self.cmdHistory):
-				self.cmdHistoryIdx = len(self.cmdHistory) - 1
+		history = self.cmdHistory
+		if history.get(self.cmdHistoryIdx) is not None:
+			pos = self.cmdHistoryIdx
+			if self.historySearch:
+				self.historySearch.remove(history.get(pos))
+			history.remove(pos, journal=self.localOptions['SaveHistoryOnExit'])
+			self.cmdHistoryIdx = history.newer(pos)
+			if self.cmdHistoryIdx < 0:
+				self.cmdHistoryIdx = history.last()
 			self.cmdHistoryShow()
 		return 'break'
 
+## history search ##########################################################
+
+	# Ctrl-R opens a list, over cmdLine, of the commands in every kept version of
+	# the history that best match what's typed, refiltered with each key.  The
+	# index is built on first use, in slices of LIVE_SEARCH_BUDGET; until it's
+	# done, only the newer commands are searched.
+	historySearch = None				# HistorySearch, built on first use
+	histSearchBuild = None				# generator of the running build
+	histSearchAfterID = None
+	histSearchResults = []
+	def createHistorySearch(self):
+		top = self.histSearchTop = TopWindow(self.top, 'Search command history', enduring=True, showNow=False)
+		frame = top.twFrame
+		defaultFont = self.defaultFont
+		self.histSearchTarget = StringVar(name='histSearchTarget')
+		self.histSearchEntry = Entry(frame, textvariable=self.histSearchTarget, exportselection=0,
+									width=80, font=defaultFont, bg='#ddd')
+		self.histSearchList = ScrollingListBox(frame, suppressHelper=True, exportselection=0,
+									width=80, height=12, font=defaultFont)
+		self.histSearchStatus = StringVar(name='histSearchStatus')
+		self.histSearchLabel = Label(frame, textvariable=self.histSearchStatus, anchor=W, font=defaultFont)
+
+		self.histSearchEntry.grid(				row=0,	column=0,	sticky=E+W,	padx=4, pady=4)
+		self.histSearchList.restoreBox(			row=1,	column=0,	sticky=E+W,	padx=4)
+		self.histSearchLabel.grid(				row=2,	column=0,	sticky=W,	padx=4)
+
+		self.addTraceTkVar(self.histSearchTarget, lambda *args: self.histSearchRefresh())
+		top.bind('<Escape>', self.closeHistorySearch)
+		self.histSearchEntry.bind('<Return>', self.histSearchChoose)
+		self.histSearchEntry.bind('<Up>', lambda event: self.histSearchMove(-1))
+		self.histSearchEntry.bind('<Down>', lambda event: self.histSearchMove(1))
+		self.histSearchList.bind('<Return>', self.histSearchChoose)
+		self.histSearchList.bind('<Double-ButtonRelease-1>', self.histSearchChoose)
+
+	def openHistorySearch(self, event=None):
+		self.closeAnyOpenFrames()
+		if not hasattr(self, 'histSearchTop'):
+			self.createHistorySearch()
+		if self.historySearch is None:
+			self.historySearch = HistorySearch(self.cmdHistory)
+			self.histSearchBuild = self.historySearch.build()
+			self.histSearchStep()
+		self.histSearchTarget.set(self.cmdLine.get('1.0', '1.end').strip())
+		self.histSearchEntry.icursor(END)
+		top = self.histSearchTop
+		top.update_idletasks()
+		posY = max(0, self.cmdLine.winfo_rooty() - top.winfo_reqheight())
+		top.showAtMouse(coords=[self.cmdLine.winfo_rootx(), posY])
+		self.histSearchEntry.focus_set()
+		return 'break'
+
+	def closeHistorySearch(self, event=None):
+		self.histSearchTop.closeTop()
+		self.cmdLine.focus_set()
+		return 'break'
+
+	def histSearchStep(self):			# index another slice of the history
+		self.histSearchAfterID = None
+		build = self.histSearchBuild
+		if build is None:
+			return
+		deadline = (clock() if Python2 else perf_counter()) + LIVE_SEARCH_BUDGET
+		try:
+			while (clock() if Python2 else perf_counter()) < deadline:
+				next(build)
+		except StopIteration:
+			self.histSearchBuild = None
+		except Exception as exc:
+			self.histSearchBuild = None
+			errmsg = 'Exception indexing command history: {}'.format(exc)
+			if dca.g['debug']:
+				print(errmsg)
+				print_exc()
+				pdb.set_trace()
+			else:
+				debugLogger.exception(errmsg)
+		if self.histSearchTop.state() == 'normal':
+			self.histSearchRefresh()
+		if self.histSearchBuild is not None:
+			self.histSearchAfterID = self.after(1, self.histSearchStep)
+
+	def histSearchRefresh(self):
+		results = self.histSearchResults = self.historySearch.search(self.histSearchTarget.get())
+		listBox = self.histSearchList
+		listBox.setContents([cmd.replace('\n', ' ') for cmd in results])
+		if results:
+			listBox.selection_set(0)
+			listBox.activate(0)
+		self.histSearchStatus.set('indexing history ...' if self.histSearchBuild is not None
+									else '' if results else 'no matches')
+
+	def histSearchMove(self, step):		# Up/Down in the entry move through the list
+		listBox = self.histSearchList
+		size = listBox.size()
+		if size:
+			selected = listBox.curselection()
+			index = max(0, min(size - 1, selected[0] + step if selected else 0))
+			listBox.selection_clear(0, END)
+			listBox.selection_set(index)
+			listBox.activate(index)
+			listBox.see(index)
+		return 'break'
+
+	def histSearchChoose(self, event=None):	# put the selected command in cmdLine
+		selected = self.histSearchList.curselection()
+		if selected and selected[0] < len(self.histSearchResults):
+			cmd = self.histSearchResults[selected[0]]
+			self.cmdLine.delete('1.0', END)
+			self.cmdLine.insert(END, cmd.rstrip(), 'command')
+			self.cmdSearchClear()
+			self.cmdHistoryIdx = self.cmdHistory.where.get(cmd, -1)
+		return self.closeHistorySearch()
+
 ## config IO ###############################################################
 
 	def initCfgParser(self):
@@ -4116,16 +5602,18 @@ class AppWindow(Frame):
 				debugLogger.exception('Error loading configuration: {}'.format(exc))
 
 			opt['SaveConfigOnExit'] =	cfg.getboolean('Settings','SaveConfigOnExit')
-			self.saveConfigRead = opt['SaveConfigOnExit']
 			opt['MaxHistoryCmds'] =		cfg.getint('Settings','MaxHistoryCmds')
 			MAX_HIST_CMDS = opt['MaxHistoryCmds']
 			opt['SaveHistoryOnExit'] =	cfg.getboolean('Settings','SaveHistoryOnExit')
 			opt['Geometry'] = 			cfg.get('Settings','Geometry')
 			opt['AliasWindow'] = 		cfg.get('Settings','AliasWindow')
 			opt['ConsolePort'] = 	 	cfg.getint('Settings','ConsolePort')
+			opt['MaxConnections'] = 	cfg.getint('Settings','MaxConnections')
 			opt['EnableShowConsole'] =  cfg.getboolean('Settings','EnableShowConsole')
 			opt['MacroExpansion'] =  	cfg.getboolean('Settings','MacroExpansion')
 			opt['TruncateCmdEcho'] =  	cfg.getboolean('Settings','TruncateCmdEcho')
+			opt['CollapseRepeats'] =  	cfg.getboolean('Settings','CollapseRepeats')
+			opt['CollapseWindow'] =  	cfg.getint('Settings','CollapseWindow')
 			opt['ResetCmdSizeOnRun'] =  cfg.getboolean('Settings','ResetCmdSizeOnRun')
 			opt['MsWheelHistory'] =  	cfg.getboolean('Settings','MsWheelHistory')
 			opt['PlistOverrides'] = 	cfg.getboolean('Settings','PlistOverrides')
@@ -4153,7 +5641,15 @@ class AppWindow(Frame):
 					self.aliasesPolled[ key ] = False if self.isAliasExec(value) else polled.lower() != 'n'
 					opt['Aliases'][key] = self.aliasDefns[ key ] = aliasDef
 
-			self.loadedConfig = self.copyConfig()	# save copy to detect changes on Save Config Now
+			for key in cfg.options('Routes'):
+				if not key.startswith('_'):
+					opt['Routes'][key] = cfg.get('Routes', key, raw=True).replace('%%', '%')
+			self.loadRoutes(opt['Routes'])
+
+			self.loadedConfig = self.copyConfig()	# values as loaded, see createAliasFrame & the Settings menu
+			self.cfgParser, self.cfgText = cfg, self.configText(cfg)
+			for options in self.configDicts():
+				options.dirty.clear()
 
 		except Exception as exc:
 			debugLogger.exception('Failed to read configuration file: {}'.format(exc))
@@ -4165,99 +5661,78 @@ class AppWindow(Frame):
 		config['Aliases'].update(self.aliasDefns)
 		return config	
 		
-	def saveConfigFile(self):
-		writing = False
+	def configDicts(self):				# the options that are saved, each tracking its changes
+		return self.localOptions, self.COLORS, self.FONTS, self.aliasDefns, self.aliasesPolled
+
+	def configChanged(self):			# save once changes stop coming
+		self.deadlines.schedule('saveConfig', CONFIG_SAVE_DELAY, self.saveConfigFile)
+
+	def configText(self, cfg):			# cfg as it's written
+		text = StringIO()
+		cfg.write(text)
+		return text.getvalue()
+
+	cfgParser = None					# CFGFILE as read, with changes applied since
+	cfgText = None						# what CFGFILE holds
+	cfgVersioned = False				# the previous CFGFILE is kept as a version, once a session
+	def saveConfigFile(self):			# apply changes to cfgParser, write it if that changed it
 		try:
 			opt, col, font = self.localOptions, self.COLORS, self.FONTS
-			if opt['SaveConfigOnExit'] or \
-					opt['SaveConfigNow'] or self.saveConfigRead:
-				# - saveConfigRead is the SaveConfigOnExit when loaded; if user changed True -> False,
-				#   still have to update that one option
-				writing = True
-				cfg = self.initCfgParser()
-				if opt.get('AliasWindow', DEFAULT_ALIAS_POSN) == DEFAULT_ALIAS_POSN:
-					cfg.remove_option('Settings','AliasWindow') # don't save any until user has opened
+			opt['Geometry'] = self.top.geometry()
+			if hasattr(self.aliasWindow, 'mouseXY'): # window was actually opened
+				opt['AliasWindow'] = str(self.aliasWindow.mouseXY)
+			self.deadlines.cancel('saveConfig')	# scheduled by any changes so far, this is it
+			cfg = self.cfgParser
+			if cfg is None:				# reading failed, start from the defaults
+				cfg = self.cfgParser = self.initCfgParser()
+			everything = opt['SaveConfigOnExit'] or opt['SaveConfigNow']
+			if everything:				## all values must be strings
+				settings = list(opt.dirty)
+			elif 'SaveConfigOnExit' in opt.dirty:	# turned off, so update that option only
+				settings = ['SaveConfigOnExit']
 			else:
-				return
-			
-			if opt['SaveConfigOnExit'] or opt['SaveConfigNow']:	## all values must be strings
-				cfg.set('Settings', 'SaveConfigOnExit',  'yes' if opt['SaveConfigOnExit'] else 'no')
-				cfg.set('Settings', 'PlistOverrides', 	 'yes' if opt['PlistOverrides'] else 'no')
-				# cfg.set('Settings', 'MaxHistoryCmds', 	 str(MAX_HIST_CMDS)) # not set by user via app
-				cfg.set('Settings', 'SaveHistoryOnExit', 'yes' if opt['SaveHistoryOnExit'] else 'no')
-				cfg.set('Settings', 'Geometry', 		 self.top.geometry())
-				if hasattr(self.aliasWindow, 'mouseXY'): # window was actually opened
-					cfg.set('Settings', 'AliasWindow', 	 str(self.aliasWindow.mouseXY))
-				cfg.set('Settings', 'ConsolePort', 		 str(opt['ConsolePort']))
-				cfg.set('Settings', 'EnableShowConsole', 'yes' if opt['EnableShowConsole'] else 'no')
-				cfg.set('Settings', 'MacroExpansion', 	 'yes' if opt['MacroExpansion'] else 'no')
-				cfg.set('Settings', 'TruncateCmdEcho',   'yes' if opt['TruncateCmdEcho'] else 'no')
-				cfg.set('Settings', 'ResetCmdSizeOnRun', 'yes' if opt['ResetCmdSizeOnRun'] else 'no')
-				cfg.set('Settings', 'MsWheelHistory', 	 'yes' if opt['MsWheelHistory'] else 'no')
-				cfg.set('Settings', 'MaxBufferSize', 	 str(self.maxBufferSize))
-				cfg.set('Settings', 'DebugToggle', 	 	'yes' if opt['DebugToggle'] else 'no')
-
-				cfg.set('Font', 'Family', font['Family'])
-				cfg.set('Font', 'Size',   str(font['Size']))
-				cfg.set('Font', 'Weight', font['Weight'])
-				cfg.set('Font', 'Slant',  font['Slant'])
-
+				return False
+			if opt.get('AliasWindow', DEFAULT_ALIAS_POSN) == DEFAULT_ALIAS_POSN:
+				cfg.remove_option('Settings','AliasWindow') # don't save any until user has opened
+			for key in settings:
+				if key == 'AliasWindow' and opt[key] == DEFAULT_ALIAS_POSN:
+					continue
+				if key in opt and key != 'SaveConfigNow' and cfg.has_option('Settings', key):
+					value = opt[key]
+					cfg.set('Settings', key, ('yes' if value else 'no')
+						if defaultConfig['Settings'].get(key) in ('Yes', 'No') else str(value))
+			opt.dirty.difference_update(settings)
+			if everything:
+				for key in font.dirty:
+					cfg.set('Font', key, str(font[key]))
 				for key in defaultConfig['Colors'].keys(): # prevent extra colors being saved
-					cfg.set('Colors', key, col[key.lower()])
-
-				sortedAliases = OrderedDict(sorted(self.aliasDefns.items(), key=lambda t: t[0]))
-				for key, value in sortedAliases.items():
-					cfg.set('Aliases', key, '{}:{}'.format('P' if self.aliasesPolled.get(key, True) else 'N', value))
-
-			elif self.saveConfigRead:  # update that option only
-				with open(CFGFILE, 'r') as fp:
-					if Python2:
-						cfg.readfp(fp)
-					else:
-						cfg.read_file(fp)
-				cfg.set('Settings', 'SaveConfigOnExit', 'no')
-
-			if writing and (opt['SaveConfigNow'] or self.optionsChanged()):
-				fp = open(nextVersion(CFG_BASE, CFG_EXT), 'w')
-				cfg.write(fp)
-				fp.close()
-				self.loadedConfig = self.copyConfig()	# record changes after successful write
-				return True
+					if key.lower() in col.dirty:
+						cfg.set('Colors', key, col[key.lower()])
+				if self.aliasDefns.dirty or self.aliasesPolled.dirty:
+					cfg.remove_section('Aliases')
+					cfg.add_section('Aliases')
+					sortedAliases = OrderedDict(sorted(self.aliasDefns.items(), key=lambda t: t[0]))
+					for key, value in sortedAliases.items():
+						cfg.set('Aliases', key, '{}:{}'.format('P' if self.aliasesPolled.get(key, True) else 'N', value))
+				for options in self.configDicts()[1:]:
+					options.dirty.clear()
+			text = self.configText(cfg)
+			if text == self.cfgText:
+				return False
+			replaceFile(CFGFILE, text, None if self.cfgVersioned else
+									cfgVersions.rotate)
+			self.cfgText, self.cfgVersioned = text, True
+			return True
 
 		except Exception as exc:
 			debugLogger.exception('Failed to save configuration file: {}'.format(exc))
 		return False
-				
-	def optionsChanged(self):		# check if any options have changed before writing
-		orig, curr = self.loadedConfig, self.localOptions
-		if len(orig['Aliases']) != len(self.aliasDefns):
-			return True
-		for key, value in self.aliasDefns.items():
-			if key not in orig['Aliases'] or value != orig['Aliases'][key]:
-				return True
-		if hasattr(self.aliasWindow, 'mouseXY'):	# window has been opened
-			if 'AliasWindow' not in orig: 			# not in config file
-				return True
-			if str(self.aliasWindow.mouseXY) != orig['AliasWindow']:
-				return True
-		col, font = self.COLORS, self.FONTS
-		for key, value in col.items():
-			if key in orig and orig[key] != value:
-				return True
-		for key, value in font.items():
-			if key in orig and orig[key] != value:
-				return True
-		for key, value in curr.items():
-			if key == 'SaveConfigNow': continue	# dummy option for making menu, never saved
-			if key in orig and orig[key] != value:
-				return True
-		return False
 
 	def exitCmd(self):
 		self.saveConfigFile()
-		if self.localOptions['SaveHistoryOnExit']:
-			self.saveCmdHistory()
-		reactor.stop()
+		# without SaveHistoryOnExit, any journal (kept while it was set) is dropped
+		self.saveCmdHistory(keep=self.localOptions['SaveHistoryOnExit'])
+		stopEventLoop()
 # end class AppWindow 
 
 def toggleDebugMsgs():
@@ -4276,59 +5751,200 @@ def getInputReceiver():
 	return currentInputReceiver
 
 class OoDebugConsoleHandler(StreamHandler):
-	_buffer = []
+	# Records are formatted as they're logged, on whatever thread, and queued in
+	# lines; drain(), on the Tk thread, moves up to CONSOLE_LOG_BATCH of them to
+	# the render queue every CONSOLE_LOG_INTERVAL, so a flood of them (eg. prints,
+	# when stdout is redirected here) is drawn like a flood of Oolite's messages,
+	# instead of a colorPrint each.  Beyond CONSOLE_LOG_BACKLOG waiting, records
+	# are counted as dropped and the count shown once there's room.
 	def __init__(self):
 		StreamHandler.__init__(self)
-	def flush(self):
-		if not app: return
-		for line in self._buffer:
-			app.colorPrint(line, colorKey='debug', emphasisRanges=[0,len(line)])
-		del self._buffer[:]
-	def emit(self, record):
+		self.lines = deque()			# (text, emphasisRanges); append & popleft are thread safe
+		self.dropped = 0				# changed with the handler's lock held
+	def emit(self, record):				# the handler's lock is held
 		try:
-			if app:
-				app.colorPrint(self.format(record), colorKey='debug')
+			lines = self.lines
+			if len(lines) >= CONSOLE_LOG_BACKLOG:
+				self.dropped += 1
+			elif app:
+				lines.append((self.format(record), None))
 			else:
-				self._buffer.append('{}: {}, {}(), line {}: {}'.format(
+				line = '{}: {}, {}(), line {}: {}'.format(
 								record.levelname, record.filename, record.funcName, 
-								record.lineno, record.msg))
+								record.lineno, record.msg)
+				lines.append((line, [0, len(line)]))
 				if not FROZEN and record.exc_info:
 					if len(record.exc_info) > 2:
 						tb = format_tb(record.exc_info[2])[0].split('\n')
 						if len(tb) > 1:
-							self._buffer.append('\n'.join(tb[1:]))
+							line = '\n'.join(tb[1:])
+							lines.append((line, [0, len(line)]))
 		except Exception:
 			self.handleError(record)
+	def drain(self):					# on the Tk thread, rescheduling itself
+		lines, handleMessage = self.lines, app.handleMessage
+		for _ in range(min(len(lines), CONSOLE_LOG_BATCH)):
+			text, emphasisRanges = lines.popleft()
+			handleMessage(text, 'debug', emphasisRanges)
+		if self.dropped and not lines:	# after the messages logged before them
+			self.acquire()
+			dropped, self.dropped = self.dropped, 0
+			self.release()
+			handleMessage('{} log messages were too many to show here (see {})'.format(
+								dropped, LOGFILE), 'debug', None)
+		app.after(CONSOLE_LOG_INTERVAL, self.drain)
+
+if QueueHandler:
+	class LogQueueHandler(QueueHandler):
+		# Puts records for logListener's thread to write to the log file; when
+		# it has LOG_QUEUE_SIZE waiting, records are counted and dropped, and
+		# the count is written in their place once there's room.
+		dropped = 0						# changed with the handler's lock held
+		def enqueue(self, record):
+			try:
+				if self.dropped:
+					self.queue.put_nowait(makeLogRecord({'name': 'DebugConsole',
+							'levelno': WARNING, 'levelname': 'WARNING',
+							'msg': '{} log records dropped, logging faster than the file was written'.format(self.dropped)}))
+					self.dropped = 0
+				self.queue.put_nowait(record)
+			except Full:
+				self.dropped += 1
+
+class FileVersions:					# the older versions of a file, each under a timestamped name
+	# rotate() moves the file aside with a single rename, to base.YYYYMMDD-HHMMSS.ext,
+	# instead of renaming every version along by one.  The versions are listed,
+	# newest first, in a manifest (fname + '.versions', json) so there's no
+	# directory scan either; one is made by a scan if it's missing (picking up
+	# the base.N.ext versions of earlier releases).  The manifest is updated,
+	# and versions beyond the retention policy (keep of them, and optionally
+	# none older than maxAge seconds nor more than maxBytes in all) deleted, on
+	# a worker thread.
+	def __init__(self, base, ext, keep, maxAge=None, maxBytes=None):
+		self.base, self.ext = base, ext
+		self.fname = base + ext
+		self.folder = os.path.dirname(base)
+		self.manifestPath = self.fname + '.versions'
+		self.keep, self.maxAge, self.maxBytes = keep, maxAge, maxBytes
+		self.lock = Lock()				# held while entries are read or changed
+		self.entries = None				# [name, time, size] newest first, once read
+
+	def rotate(self):					# move fname aside; returns fname, free to be written
+		try:
+			size = os.path.getsize(self.fname)
+		except OSError:
+			return self.fname
+		if size == 0:					# nothing to keep, it'll be overwritten
+			return self.fname
+		now = time()
+		stamp = strftime('%Y%m%d-%H%M%S', localtime(now))
+		path, serial = '{}.{}{}'.format(self.base, stamp, self.ext), 1
+		while os.path.exists(path):		# already rotated this second
+			serial += 1
+			path = '{}.{}-{}{}'.format(self.base, stamp, serial, self.ext)
+		os.rename(self.fname, path)
+		# not a daemon, so the manifest is written even if we're exiting
+		Thread(target=self.added, args=([os.path.basename(path), now, size],),
+				name='FileVersions').start()
+		return self.fname
+
+	def versions(self):					# paths of the older versions, newest first
+		with self.lock:
+			return [os.path.join(self.folder, entry[0]) for entry in self.load()]
+
+	def added(self, entry):				# on the worker thread
+		try:
+			with self.lock:
+				entries = self.load()
+				if not any(e[0] == entry[0] for e in entries):	# a scan may have found it
+					entries.append(entry)
+				entries.sort(key=lambda e: e[1], reverse=True)
+				self.prune(entries)
+				replaceFile(self.manifestPath, json_dumps(entries))
+		except Exception as exc:
+			getLogger('DebugConsole').exception('Failed to rotate {}: {}'.format(self.fname, exc))
 
-def nextVersion(fn, ext, max=None):
-	def fmtVernFn(num):
-		return '{}{}{}'.format(fn, '.{}'.format(num) if num > 0 else '', ext)
-	versToIncr = []
-	maxVerNum = max if max else MAX_LOG_VERSION
-	for vern in range(0, maxVerNum):
-		currFn = fmtVernFn(vern)
-		if os.path.exists(currFn):
-			if os.path.getsize(currFn) == 0:
-				os.remove(currFn)
-			else:
-				versToIncr.append((vern, currFn))
-		else:	# leave older versions alone
-			break
-	for vern, currFn in reversed(versToIncr):
-		nextFn = fmtVernFn(vern + 1)
-		if vern + 1 == maxVerNum and os.path.exists(nextFn):
-			os.remove(nextFn)
-		if Python2:
-			os.rename(currFn, nextFn)
+	def load(self):						# entries, reading or making the manifest first time
+		if self.entries is None:
+			try:
+				with open(self.manifestPath, 'r') as mfile:
+					entries = json_loads(mfile.read())
+				if not isinstance(entries, list):
+					raise ValueError('not a list')
+			except (IOError, OSError, ValueError):
+				entries = self.scan()
+			self.entries = entries
+		return self.entries
+
+	def scan(self):						# [name, mtime, size] of each version found, newest first
+		name = os.path.basename(self.base)
+		pattern = compile(re_escape(name) + r'\.(?:\d+|\d{8}-\d{6}(?:-\d+)?)' + re_escape(self.ext) + '$')
+		entries = []
+		for fname in os.listdir(self.folder or os.curdir):
+			if pattern.match(fname):
+				try:
+					stat = os.stat(os.path.join(self.folder, fname))
+				except OSError:
+					continue
+				entries.append([fname, stat.st_mtime, stat.st_size])
+		entries.sort(key=lambda e: e[1], reverse=True)
+		return entries
+
+	def prune(self, entries):			# delete versions the policy doesn't keep
+		now, total = time(), 0
+		for index, (name, when, size) in enumerate(entries):
+			total += size
+			if index >= self.keep \
+					or (self.maxAge is not None and now - when > self.maxAge) \
+					or (self.maxBytes is not None and total > self.maxBytes):
+				break
 		else:
-			os.replace(currFn, nextFn)
-	return fmtVernFn(0)
+			return
+		for name, when, size in entries[index:]:
+			try:
+				os.remove(os.path.join(self.folder, name))
+			except OSError as exc:		# listed no more, but left behind
+				if exc.errno != ENOENT:
+					getLogger('DebugConsole').warning('Failed to delete {}: {}'.format(name, exc))
+		del entries[index:]
+# end class FileVersions
+
+logVersions = FileVersions(LOG_BASE, LOG_EXT, MAX_LOG_VERSION,
+							LOG_VERSIONS_MAX_AGE, LOG_VERSIONS_MAX_BYTES)
+cfgVersions = FileVersions(CFG_BASE, CFG_EXT, MAX_CFG_VERSION)
+histVersions = FileVersions(HIST_BASE, HIST_EXT, MAX_HIST_VERSION)
+
+def replaceFile(fname, text, beforeReplace=None, mode='w'):	# readers find the old file or the new, never part of one
+	tmpName = fname + '.tmp'
+	with open(tmpName, mode) as fp:
+		fp.write(text)
+		fp.flush()
+		os.fsync(fp.fileno())
+	if beforeReplace:					# eg. FileVersions.rotate, moving fname aside
+		beforeReplace()
+	if Python2:
+		if platformIsWindows and os.path.exists(fname):
+			os.remove(fname)			# rename won't replace a file on Windows
+		os.rename(tmpName, fname)
+	else:
+		os.replace(tmpName, fname)
 
+logListener = None						# writes the log file, if a QueueListener is available
 def initLogger():
-	global consoleHandler, debugLogger
-	# set up logging to file
-	basicConfig(level=WARNING, filename=nextVersion(LOG_BASE, LOG_EXT), filemode='w',
-						format='%(asctime)s %(levelname)-8s %(message)s (%(filename)s: %(funcName)s, line %(lineno)s)')
+	global consoleHandler, debugLogger, logListener, logQueueHandler, logFileHandler
+	# set up logging to file, on logListener's thread
+	logFileHandler = FileHandler(logVersions.rotate(), 'w')
+	logFileHandler.setFormatter(Formatter('%(asctime)s %(levelname)-8s %(message)s (%(filename)s: %(funcName)s, line %(lineno)s)'))
+	rootLogger = getLogger()
+	rootLogger.setLevel(WARNING)
+	if QueueHandler:
+		logQueueHandler = LogQueueHandler(Queue(LOG_QUEUE_SIZE))
+		logListener = QueueListener(logQueueHandler.queue, logFileHandler)
+		logListener.start()
+		atexit_register(stopLogListener)		# runs before logging's own shutdown
+		rootLogger.addHandler(logQueueHandler)
+	else:
+		rootLogger.addHandler(logFileHandler)
 	if FROZEN or not sys.stdout.isatty():
 		consoleHandler = OoDebugConsoleHandler()	# handler for WARNING messages or higher to debug console
 	else:
@@ -4352,33 +5968,94 @@ def initLogger():
 	elif dca.g['debug']:
 		debugLogger.setLevel(DEBUG) 
 
+def stopLogListener():					# write what's queued, then write records as they're logged
+	global logListener
+	if logListener:
+		rootLogger = getLogger()
+		rootLogger.addHandler(logFileHandler)
+		rootLogger.removeHandler(logQueueHandler)
+		logListener.stop()				# after the queue's emptied
+		logListener = None
+
+TK_PUMP_INTERVAL = 0.01				# seconds between Tk updates under asyncio, as tksupport
+
+eventLoop = None						# the asyncio loop, if not running Twisted
+def stopEventLoop():
+	if reactor:
+		reactor.stop()
+	elif eventLoop:
+		eventLoop.stop()
+
+def pumpTk(loop, root):
+	# Tk has no file descriptor to wait on, so it's polled, as tksupport does,
+	# but only the events already pending are handled (no full update()).
+	try:
+		dooneevent = root.tk.dooneevent
+		while dooneevent(ALL_EVENTS | DONT_WAIT):
+			pass
+	except TclError:					# window destroyed
+		loop.stop()
+		return
+	loop.call_later(TK_PUMP_INTERVAL, pumpTk, loop, root)
+
+def readStdin(loop, handler):
+	# Feed stdin to handler (an OoliteDebugCLIProtocol), as stdio.StandardIO
+	# does; not every platform's loop can watch it (eg. Windows' Proactor), nor
+	# every stdin (eg. none, when frozen).
+	try:
+		fd = sys.stdin.fileno()
+		def stdinReadable():
+			data = os.read(fd, 4096)
+			if data:
+				handler.dataReceived(data)
+			else:						# end of file
+				loop.remove_reader(fd)
+		loop.add_reader(fd, stdinReadable)
+	except (AttributeError, ValueError, OSError, NotImplementedError):
+		return
+	handler.makeConnection(None)
+
 app = None
 def main():
-	global app, cmdLineHandler
+	global app, cmdLineHandler, eventLoop
 	
 	initLogger()
 	app = AppWindow()							## required global for SimpleConsoleDelegate
-	consoleHandler.flush()
+	if isinstance(consoleHandler, OoDebugConsoleHandler):
+		consoleHandler.drain()					# what was logged before, then every CONSOLE_LOG_INTERVAL
 
 	# Set up console server protocol
-	factory = Factory()
+	factory = Factory() if reactor else ServerFactory()
 	factory.delegateClass = SimpleConsoleDelegate
 	factory.activeCount = 0
+	factory.maxConnections = max(1, app.localOptions['MaxConnections'])
 	factory.protocol = OoliteDebugConsoleProtocol
 
 	# Set up command line I/O protocol
 	cmdLineHandler = OoliteDebugCLIProtocol()	## required global for SimpleConsoleDelegate
 	cmdLineHandler.getInputReceiver = getInputReceiver
-	stdio.StandardIO(cmdLineHandler)
+	cmdLineHandler.stop = stopEventLoop
 
-	# Install the Reactor support
-	tksupport.install(app.top)
+	if reactor:
+		factory.decoder = PacketDecoder(reactor.callFromThread)	# decode packets off the Tk thread
+		stdio.StandardIO(cmdLineHandler)
+		# Install the Reactor support
+		tksupport.install(app.top)
+	else:
+		eventLoop = asyncio.new_event_loop()
+		asyncio.set_event_loop(eventLoop)
+		factory.decoder = PacketDecoder(eventLoop.call_soon_threadsafe)
+		readStdin(eventLoop, cmdLineHandler)
+		eventLoop.call_soon(pumpTk, eventLoop, app.top)
 
 	lineNum = app.bodyText.index(END).split('.')[0]
 	if int(lineNum) > 2:
 		app.colorPrint('') 				# add blank line after any error msg
 	try:
-		app.listener=reactor.listenTCP(TCP_Port, factory)
+		if reactor:
+			app.listener = reactor.listenTCP(TCP_Port, factory)
+		else:
+			app.listener = listenTCP(TCP_Port, factory, loop=eventLoop)
 		app.colorPrint("Oolite Debug Console (version " + __version__ + ")")
 		app.colorPrint("Use Up and Down arrows to scroll through the command history.")
 		app.colorPrint("Type /quit to quit.")
@@ -4389,7 +6066,20 @@ def main():
 		if app: app.conflictAbort(exc)
 
 	# Wait for user input.
-	reactor.run()
+	if reactor:
+		reactor.run()
+		factory.decoder.stop(DECODER_STOP_TIMEOUT)
+	else:
+		try:
+			eventLoop.run_forever()
+		except KeyboardInterrupt:
+			pass
+		finally:
+			if getattr(app, 'listener', None):
+				app.listener.close()
+			factory.decoder.stop(DECODER_STOP_TIMEOUT)	# it calls into the loop till it's done
+			eventLoop.close()
+	stopLogListener()
 	shutdown()
 	if os.path.exists(LOGFILE) and os.path.getsize(LOGFILE) == 0:
 		os.remove(LOGFILE)
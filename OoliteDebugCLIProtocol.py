@@ -6,8 +6,7 @@
 #  Copyright (c) 2007 Jens Ayton. All rights reserved.
 #
 
-from twisted.internet import stdio, reactor
-from twisted.protocols import basic
+from ooliteConsoleServer.PropertyListPacketProtocol import Protocol
 # import sys
 from sys import version_info as version_info
 from sys import stderr as stderr
@@ -16,14 +15,22 @@ import logging
 cmdLogger = logging.getLogger('DebugConsole.CLIProtocol')
 
 
-class OoliteDebugCLIProtocol(basic.LineReceiver):
+class OoliteDebugCLIProtocol(Protocol):
 	delimiter = "\n" if version_info[0] == 2 else b"\n"
 	inputReceiver = None
+	stop = None							# set by main: stops the event loop
+	__buffer = delimiter[:0]
 	
 	
 	def connectionMade(self):
 		pass
 	
+	def dataReceived(self, data):
+		lines = (self.__buffer + data).split(self.delimiter)
+		self.__buffer = lines.pop()		# an incomplete line, or empty
+		for line in lines:
+			self.lineReceived(line)
+	
 	def lineReceived(self, bsline):
 		if not bsline:  return
 		try:
@@ -50,7 +57,8 @@ class OoliteDebugCLIProtocol(basic.LineReceiver):
 		# cmdLogger.debug('Internal command "' + command  + '" with arguments "' + argMsg + '".')
 		
 		if command == "quit":  
-			reactor.stop()
+			if self.stop:
+				self.stop()
 		elif command == "close":
 			# Note: I don't recommend using the /close command, as it crashes Oolite.
 			if self.inputReceiver:  
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+#
+#  benchPacketFraming.py
+#
+#  Measures PropertyListPacketProtocol's packet framing (dataReceived) on its
+#  own, with plist decoding stubbed out: a stream of packets is fed to it in
+#  chunks of 1 KB and 1 MB, as a socket would, and the throughput reported in
+#  MB/s and packets/s (best of a few runs).
+#
+#  python benchPacketFraming.py [megabytes [packetBytes]]
+#
+
+from __future__ import print_function
+import os, sys
+
+megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+packetBytes = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ooliteConsoleServer.PropertyListPacketProtocol import PropertyListPacketProtocol, HEADER
+
+Python2 = sys.version_info[0] == 2
+if Python2:
+	from time import clock as timer
+else:
+	from time import perf_counter as timer
+
+CHUNK_SIZES = [('1 KB', 1024), ('1 MB', 1024 * 1024)]
+RUNS = 3
+
+class FramingOnly(PropertyListPacketProtocol):
+	packets = 0
+	def decodePacket(self, data):		# no plist decoding, just count what's framed
+		return len(data), None, None
+
+	def packetDecoded(self, plist, prepared, data):
+		self.packets += 1
+
+def makeStream():
+	payload = (b'x' * packetBytes)
+	frame = HEADER.pack(len(payload)) + payload
+	count = max(1, megabytes * 1024 * 1024 // len(frame))
+	return frame * count, count
+
+def run(stream, count, chunkSize):
+	protocol = FramingOnly()
+	chunks = [stream[start:start + chunkSize] for start in range(0, len(stream), chunkSize)]
+	start = timer()
+	for chunk in chunks:
+		protocol.dataReceived(chunk)
+	elapsed = timer() - start
+	if protocol.packets != count:
+		raise AssertionError('framed {} packets of {}'.format(protocol.packets, count))
+	return elapsed
+
+def main():
+	stream, count = makeStream()
+	print('{} packets of {} bytes, {:.1f} MB'.format(count, packetBytes, len(stream) / 1048576.0))
+	for label, chunkSize in CHUNK_SIZES:
+		elapsed = min(run(stream, count, chunkSize) for _ in range(RUNS))
+		print('  {} chunks: {:6.0f} MB/s, {:5.0f}k packets/s'.format(
+				label, len(stream) / 1048576.0 / elapsed, count / elapsed / 1000))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
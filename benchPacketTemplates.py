@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+#
+#  benchPacketTemplates.py
+#
+#  Times sending string packets (Perform Command, Pong, Close Connection)
+#  from a pre-encoded template (sendStringPacket) against encoding the whole
+#  packet with plistlib (sendPlistPacket), into a transport that only keeps
+#  what is written, and checks both write the same bytes.  The commands are
+#  an alias poll of the size the console sends, and random short strings.
+#
+#  python benchPacketTemplates.py [packets]
+#
+
+from __future__ import print_function
+import os, sys, random
+
+packets = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import ooliteConsoleServer._protocol as P
+from ooliteConsoleServer.PropertyListPacketProtocol import PropertyListPacketProtocol
+
+Python2 = sys.version_info[0] == 2
+if Python2:
+	from time import clock as timer
+else:
+	from time import perf_counter as timer
+
+RUNS = 3
+ALIASES = [('pos', 'player.ship.position'), ('spd', 'player.ship.speed'),
+			('ene', 'player.ship.energy'), ('tgt', 'player.ship.target && player.ship.target.displayName'),
+			('sys', 'system.name'), ('clk', 'clock.clockStringForTime(clock.adjustedSeconds)')]
+
+class KeepWrites(object):
+	def __init__(self):
+		self.writes = []
+
+	def write(self, data):
+		self.writes.append(data)
+
+def aliasPoll(gen):						# as AppWindow.pollAliases builds it
+	cmd = ['(function() {{ var cs = console.script, cache = cs["$debugConsolePolled"], changed = {{}}, value; '
+			'if (!cache || cache.gen !== {0}) cache = cs["$debugConsolePolled"] = {{ gen: {0}, values: {{}} }}; '
+			.format(gen)]
+	for alias, defn in ALIASES:
+		cmd.append('try {{ value = "" + eval("console.script.{0} = {1}"); }} catch (e) {{ value = "no result"; }} '
+					'if (cache.values.{0} !== value) changed.{0} = cache.values.{0} = value; '
+					.format(alias, defn))
+	cmd.append('return JSON.stringify(changed); })()')
+	return ''.join(cmd)
+
+def makeSends():
+	rand = random.Random(1)
+	chars = u'abcxyz 0189.,;:<>&"\'()[]{}\u00e9'
+	sends = []
+	while len(sends) < packets:
+		kind = rand.random()
+		if kind < 0.5:
+			sends.append(({P.packetTypeKey: P.performCommandPacket}, P.messageKey, aliasPoll(len(sends))))
+		elif kind < 0.9:
+			text = u''.join(rand.choice(chars) for _ in range(rand.randint(1, 80)))
+			sends.append(({P.packetTypeKey: P.performCommandPacket}, P.messageKey, text))
+		else:
+			sends.append(({P.packetTypeKey: P.pongPacket}, P.messageKey, str(rand.randint(0, 10**9))))
+	return sends
+
+def viaPlistlib(protocol, fixed, key, string):
+	packet = dict(fixed)
+	packet[key] = string
+	protocol.sendPlistPacket(packet)
+
+def viaTemplate(protocol, fixed, key, string):
+	protocol.sendStringPacket(fixed, key, string)
+
+def run(send, sends):
+	protocol = PropertyListPacketProtocol()
+	protocol.transport = KeepWrites()
+	start = timer()
+	for fixed, key, string in sends:
+		send(protocol, fixed, key, string)
+	return timer() - start, protocol.transport.writes
+
+def main():
+	sends = makeSends()
+	print('{} packets, half of them alias polls of {} chars'.format(len(sends), len(aliasPoll(0))))
+	results = {}
+	for name, send in [('sendPlistPacket', viaPlistlib), ('sendStringPacket', viaTemplate)]:
+		elapsed, writes = min((run(send, sends) for _ in range(RUNS)), key=lambda result: result[0])
+		results[name] = writes
+		print('  {:<17} {:5.1f} us/packet, {:4.0f}k packets/s'.format(
+				name, elapsed / len(sends) * 1e6, len(sends) / elapsed / 1000))
+	if results['sendPlistPacket'] != results['sendStringPacket']:
+		print('template and plistlib wrote different bytes')
+		return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+#
+#  benchPlistDecoder.py
+#
+#  Times decodePacketPlist, the decoder for the plists Oolite sends, against
+#  readPlistFromString (plistlib) on the same packets, and checks they read
+#  every packet alike.  The packets are a recording of Oolite's traffic, as
+#  framed on the wire (4-byte length, then the plist), or without one, made
+#  up in the same shapes: log lines, silent cmd replies, errors with
+#  emphasis ranges and a full 'Note Configuration' of colors.
+#
+#  python benchPlistDecoder.py [recording]
+#
+
+from __future__ import print_function
+import os, sys, random
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import ooliteConsoleServer._protocol as P
+from ooliteConsoleServer.PropertyListPacketProtocol import (
+		HEADER, HEADER_SIZE, readPlistFromString, writePlistToString)
+from ooliteConsoleServer._plistDecoder import decodePacketPlist, UnsupportedPlist
+
+Python2 = sys.version_info[0] == 2
+if Python2:
+	from time import clock as timer
+else:
+	from time import perf_counter as timer
+
+PACKETS = 5000
+RUNS = 3
+
+def readRecording(fname):
+	with open(fname, 'rb') as recording:
+		data = recording.read()
+	packets, offset = [], 0
+	while offset + HEADER_SIZE <= len(data):
+		length, = HEADER.unpack_from(data, offset)
+		offset += HEADER_SIZE
+		packets.append(data[offset:offset + length])
+		offset += length
+	return packets
+
+def output(message, colorKey, emphasis=None):
+	packet = {P.packetTypeKey: P.consoleOutputPacket, P.messageKey: message, P.colorKeyKey: colorKey}
+	if emphasis:
+		packet[P.emphasisRangesKey] = emphasis
+	return writePlistToString(packet)
+
+def makeTraffic():
+	rand = random.Random(1)
+	words = ['ship', 'station', 'Lave', 'Diso', 'energy', '0.75', 'laser', '<null>', '&', 'shield']
+	config = dict(('{}-{}-color'.format(key, part), [rand.random(), rand.random(), rand.random()])
+					for key in ['general', 'command', 'warning', 'error', 'exception', 'log', 'dumpObject',
+								'command-result', 'macro-expansion', 'debug', 'console', 'script',
+								'message', 'unknown', 'foreground', 'background', 'header', 'footer',
+								'selection', 'cursor', 'input', 'prompt', 'status', 'notice', 'info',
+								'trace', 'fatal', 'alert', 'hint', 'note']
+					for part in ['foreground', 'background'])
+	config.update({'font-face': 'Courier', 'font-size': 12, 'show-console-on-warning': True})
+	packets = [writePlistToString({P.packetTypeKey: P.noteConfigurationPacket,
+									P.configurationKey: config})]
+	while len(packets) < PACKETS:
+		line = ' '.join(rand.choice(words) for _ in range(rand.randint(3, 20)))
+		kind = rand.random()
+		if kind < 0.6:
+			packets.append(output(line, 'log'))
+		elif kind < 0.9:
+			packets.append(output('{}<rid:{}><discard:yes>'.format(line, len(packets)), 'command-result'))
+		else:
+			start = rand.randint(0, len(line) - 1)
+			packets.append(output(line, 'error', [start, rand.randint(1, len(line) - start)]))
+	return packets
+
+def timeDecoder(decode, packets):
+	best = None
+	for _ in range(RUNS):
+		start = timer()
+		for data in packets:
+			decode(data)
+		elapsed = timer() - start
+		best = elapsed if best is None else min(best, elapsed)
+	return best
+
+def decodes(data):
+	try:
+		decodePacketPlist(data)
+		return True
+	except UnsupportedPlist:			# readPacketPlist leaves it to plistlib
+		return False
+
+def main():
+	if len(sys.argv) > 1:
+		packets, source = readRecording(sys.argv[1]), sys.argv[1]
+	else:
+		packets, source = makeTraffic(), 'made-up traffic'
+	supported = [data for data in packets if decodes(data)]
+	print('{} packets from {}, {} left to plistlib'.format(len(packets), source, len(packets) - len(supported)))
+	if not supported:
+		return 1
+	differ = sum(1 for data in supported
+					if writePlistToString(decodePacketPlist(data)) != writePlistToString(readPlistFromString(data)))
+	size = sum(len(data) for data in supported) / 1048576.0
+	for name, decode in [('readPlistFromString', readPlistFromString), ('decodePacketPlist', decodePacketPlist)]:
+		elapsed = timeDecoder(decode, supported)
+		print('  {:<20} {:5.1f} us/packet, {:5.1f} MB/s'.format(
+				name, elapsed / len(supported) * 1e6, size / elapsed))
+	if differ:
+		print('{} packets decoded differently from plistlib'.format(differ))
+	return 1 if differ else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+#
+#  checkLogStore.py
+#
+#  Checks DebugConsole's LogStore against a plain list of what was appended:
+#  every record it still holds must read back exactly as appended, and the
+#  records held must be the newest ones, whatever the mix of lengths
+#  (including empty lines, which have no bytes in the arena).
+#
+#  python checkLogStore.py [rounds]
+#
+
+from __future__ import print_function
+import os, sys, random, tempfile
+
+rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+workDir = tempfile.mkdtemp()					# for DebugConsole's cfg & log paths
+sys.argv = [sys.argv[0], '-c', workDir, '-l', workDir]
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from DebugConsole import LogStore
+
+def check(store, appended):
+	held = [record[2] for record in store.records(0, store.end)]
+	expected = [text[:store.arenaSize] for text in appended[store.first:store.end]]
+	if held != expected:
+		return 'held {!r}\n  expected {!r}'.format(held, expected)
+	if store.end != len(appended):
+		return 'end {} after {} appends'.format(store.end, len(appended))
+	return None
+
+def run(seed):
+	rand = random.Random(seed)
+	store = LogStore(maxRecords=rand.randint(1, 12), arenaSize=rand.randint(1, 40))
+	appended = []
+	for count in range(rand.randint(1, 200)):
+		size = rand.choice([0, 0, 1, rand.randint(0, 10), rand.randint(0, 50)])
+		text = ''.join(rand.choice('abcdefgh') for _ in range(size))
+		store.append(text, 'debug')
+		appended.append(text)
+		error = check(store, appended)
+		if error:
+			return 'seed {}, maxRecords {}, arenaSize {}, after {!r}:\n  {}'.format(
+						seed, store.maxRecords, store.arenaSize, appended, error)
+	return None
+
+def main():
+	# the stream that once left a corrupted record after an empty one
+	store = LogStore(maxRecords=1000, arenaSize=20)
+	appended = ['aaaaa', '', 'bbbbbbbbbb', 'ccccc', 'ddddd', 'eeeee']
+	for text in appended:
+		store.append(text, 'debug')
+	failures = [error for error in [check(store, appended)] if error]
+	failures.extend(error for error in (run(seed) for seed in range(rounds)) if error)
+	for error in failures[:5]:
+		print(error)
+	print('{} failed of {} streams'.format(len(failures), rounds + 1))
+	return 1 if failures else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+#
+#  checkPlistCodec.py
+#
+#  Checks ooliteConsoleServer's own plist encoding and decoding against
+#  plistlib, which it must match exactly:
+#  - packets sent from a template (sendStringPacket) must be byte for byte
+#    what plistlib writes for the same packet;
+#  - decodePacketPlist must read back what plistlib reads, for plistlib's
+#    output and for the same plists laid out differently (as Oolite writes
+#    them), and must refuse what it doesn't handle so plistlib gets it.
+#
+#  python checkPlistCodec.py [rounds]
+#
+
+from __future__ import print_function
+import os, sys, random, re
+
+rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import ooliteConsoleServer._protocol as P
+from ooliteConsoleServer.PropertyListPacketProtocol import (
+		packetTemplate, escapePlistString, writePlistToString,
+		readPlistFromString, readPacketPlist)
+from ooliteConsoleServer._plistDecoder import decodePacketPlist, UnsupportedPlist
+
+Python2 = sys.version_info[0] == 2
+
+# the packets the console sends as fixed part + one string
+SENT_PACKETS = [
+	({P.packetTypeKey: P.performCommandPacket}, P.messageKey),
+	({P.packetTypeKey: P.closeConnectionPacket}, P.messageKey),
+	({P.packetTypeKey: P.pongPacket}, P.messageKey),
+]
+CHARS = u'ab z09&<>;"\'\r\n\t]]>\u00e9\u2713\U0001f680'
+CONTROL_CHARS = u'\x00\x01\x08\x0b\x0c\x1f'
+
+def randomText(rand, controls=False):
+	chars = CHARS + CONTROL_CHARS if controls else CHARS
+	text = u''.join(rand.choice(chars) for _ in range(rand.choice([0, 1, 5, rand.randint(0, 60)])))
+	if Python2 and rand.random() < 0.3:			# py2 callers also pass ascii str
+		text = text.encode('ascii', 'ignore')
+	return text
+
+def randomValue(rand, depth=0):
+	kind = rand.choice(['str', 'str', 'int', 'float', 'bool', 'list', 'dict'] if depth < 3
+						else ['str', 'int', 'float', 'bool'])
+	if kind == 'str':
+		return randomText(rand)
+	if kind == 'int':
+		return rand.choice([0, 1, -1, rand.randint(-2**63, 2**64 - 1), rand.randint(-1000, 1000)])
+	if kind == 'float':
+		return rand.choice([0.0, -0.5, 1e-300, 1e300, rand.uniform(-1e6, 1e6), rand.random()])
+	if kind == 'bool':
+		return rand.random() < 0.5
+	if kind == 'list':
+		return [randomValue(rand, depth + 1) for _ in range(rand.randint(0, 4))]
+	return randomDict(rand, depth + 1)
+
+def randomDict(rand, depth=0):
+	return dict((randomText(rand), randomValue(rand, depth)) for _ in range(rand.randint(0, 5)))
+
+def canonical(value):
+	# plistlib's encoding tells True from 1 and 1.0 from 1, which == doesn't
+	return writePlistToString({'v': value})
+
+# whitespace between tags, other than inside <string> & <key>
+_LAYOUT_RE = re.compile(br'(?<!<string)(?<!<key)>\s+<')
+
+def relayout(data, rand):
+	# the same plist as Oolite might write it: other indentation,
+	# no whitespace, or <string/> style empty elements
+	spacing = rand.choice([b'', b'\n', b'\n\t\t', b' \r\n  '])
+	data = _LAYOUT_RE.sub(b'>' + spacing + b'<', data)
+	if rand.random() < 0.5:
+		data = data.replace(b'<string></string>', b'<string/>')
+	if rand.random() < 0.3:
+		data = data.replace(b'<dict>' + spacing + b'</dict>', b'<dict/>')
+	return data
+
+def checkTemplates(rand):
+	fixed, key = rand.choice(SENT_PACKETS)
+	text = randomText(rand, controls=rand.random() < 0.2)
+	template = packetTemplate(fixed, key)
+	if template is None:
+		return 'no template for {!r}'.format(fixed)
+	escaped = escapePlistString(text)
+	if escaped is None:
+		return None								# sent through plistlib instead
+	packet = dict(fixed)
+	packet[key] = text
+	sent = template[0] + escaped.encode('utf-8') + template[1]
+	expected = writePlistToString(packet)
+	if sent != expected:
+		return 'template for {!r}:\n  sent {!r}\n  expected {!r}'.format(text, sent, expected)
+	return None
+
+def checkDecoder(rand):
+	packet = randomDict(rand)
+	data = writePlistToString(packet)
+	if rand.random() < 0.5:
+		data = relayout(data, rand)
+	expected = canonical(readPlistFromString(data))
+	try:
+		decoded = canonical(decodePacketPlist(data))
+	except UnsupportedPlist:
+		return 'refused {!r}'.format(data)
+	if decoded != expected:
+		return 'decoded {!r}\n  as {!r}\n  expected {!r}'.format(data, decoded, expected)
+	return None
+
+# plists outside the decoder's subset, which readPacketPlist must still read
+UNSUPPORTED = [
+	b'<plist version="1.0"><dict><key>a</key><data>AAE=</data></dict></plist>',
+	b'<plist version="1.0"><dict><key>a</key><date>2007-11-29T00:00:00Z</date></dict></plist>',
+	b'<plist version="1.0"><dict><key>a</key><string><![CDATA[x<y]]></string></dict></plist>',
+	b'<plist version="1.0"><dict><!-- note --><key>a</key><string>b</string></dict></plist>',
+]
+
+def checkUnsupported():
+	failures = []
+	for data in UNSUPPORTED:
+		try:
+			decodePacketPlist(data)
+			failures.append('accepted {!r}'.format(data))
+			continue
+		except UnsupportedPlist:
+			pass
+		if canonical(readPacketPlist(data)) != canonical(readPlistFromString(data)):
+			failures.append('fallback misread {!r}'.format(data))
+	return failures
+
+def main():
+	failures = checkUnsupported()
+	for seed in range(rounds):
+		rand = random.Random(seed)
+		for check in (checkTemplates, checkDecoder):
+			error = check(rand)
+			if error:
+				failures.append('seed {}: {}'.format(seed, error))
+	for error in failures[:5]:
+		print(error)
+	print('{} failed of {} checks'.format(len(failures), 2 * rounds + len(UNSUPPORTED)))
+	return 1 if failures else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
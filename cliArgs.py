@@ -32,6 +32,7 @@ g = dict(
   hext = 'dat',
   lext = 'log',
   debug = False,
+  twisted = False,
 )
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help', '-?'])
@@ -69,8 +70,12 @@ CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help', '-?'])
   help=(
   "Enable some internal debug functions. Default=" +
   str(g['debug'])), is_flag=True) #seems to like file OR dir.
+@click.option("--twisted","-t",
+  help=(
+  "Run on Twisted's reactor instead of asyncio (always so on Python 2). Default=" +
+  str(g['twisted'])), is_flag=True)
 
-def cli(base,cpath,lpath,cext,lext,hext,debug):
+def cli(base,cpath,lpath,cext,lext,hext,debug,twisted):
   """Oolite Debug Console.
 
   Command history and log are written to log directory.
@@ -80,6 +85,8 @@ def cli(base,cpath,lpath,cext,lext,hext,debug):
 
   if debug:
     g['debug'] = True
+  if twisted or Python2:
+    g['twisted'] = True
 
   #Parse dirs. Use defaults if not in cli args.
   isDir(g['cpath'],'cpath') if cpath is None else isDir(cpath,'cpath') 
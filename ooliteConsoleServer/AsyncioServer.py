@@ -0,0 +1,108 @@
+#
+#  AsyncioServer.py
+#  ooliteConsoleServer
+#
+#  Serving the debug console protocol from an asyncio event loop.
+#
+
+
+"""
+Runs the protocols in this package on asyncio instead of Twisted (Python 3).
+
+The protocols are written against Twisted's interface: makeConnection(),
+dataReceived(), connectionLost() and a transport with write(),
+loseConnection(), pauseProducing() and resumeProducing().  AsyncioProtocol
+is the asyncio.Protocol that drives one of them, and wraps the asyncio
+transport in TransportAdapter, so a delegate sees no difference.
+
+	factory = ServerFactory()
+	factory.protocol = OoliteDebugConsoleProtocol
+	factory.delegateClass = ...
+	server = listenTCP(port, factory, loop=loop)
+	loop.run_forever()
+"""
+
+import asyncio
+
+
+class ConnectionDone(Exception):
+	"""The reason given to connectionLost() for a clean close, as with Twisted."""
+	pass
+
+
+class ServerFactory(object):
+	"""
+	Builds a protocol per connection, as Twisted's Factory does; any other
+	attributes (eg. delegateClass) are for the protocols to read.
+	"""
+
+	protocol = None
+
+	def buildProtocol(self, addr):
+		protocol = self.protocol()
+		protocol.factory = self
+		return protocol
+
+
+class TransportAdapter(object):
+	"""An asyncio transport with the Twisted method names the protocols use."""
+
+	__slots__ = ('transport',)
+
+	def __init__(self, transport):
+		self.transport = transport
+
+	def write(self, data):
+		self.transport.write(data)
+
+	def writeSequence(self, data):
+		self.transport.writelines(data)
+
+	def loseConnection(self):
+		self.transport.close()
+
+	def pauseProducing(self):
+		if not self.transport.is_closing():
+			self.transport.pause_reading()
+
+	def resumeProducing(self):
+		if not self.transport.is_closing():
+			self.transport.resume_reading()
+
+	def getPeer(self):
+		return self.transport.get_extra_info('peername')
+
+	def getHost(self):
+		return self.transport.get_extra_info('sockname')
+
+
+class AsyncioProtocol(asyncio.Protocol):
+	"""The asyncio.Protocol for one connection, passing events to factory's protocol."""
+
+	def __init__(self, factory):
+		self.factory = factory
+		self.protocol = None
+
+	def connection_made(self, transport):
+		self.protocol = self.factory.buildProtocol(transport.get_extra_info('peername'))
+		self.protocol.makeConnection(TransportAdapter(transport))
+
+	def data_received(self, data):
+		self.protocol.dataReceived(data)
+
+	def connection_lost(self, exc):
+		protocol, self.protocol = self.protocol, None
+		protocol.connected = 0
+		protocol.connectionLost(exc if exc is not None else ConnectionDone('Connection was closed cleanly.'))
+
+
+def listenTCP(port, factory, interface='', loop=None):
+	"""
+	Listen on port (all interfaces unless one is given) before the loop is
+	run, as reactor.listenTCP does; returns the asyncio Server.  Raises
+	OSError if the port can't be had.
+	"""
+	if loop is None:
+		loop = asyncio.get_event_loop()
+	return loop.run_until_complete(loop.create_server(lambda: AsyncioProtocol(factory),
+										interface or None, port))
@@ -0,0 +1,118 @@
+#
+#  ConfigurationState.py
+#  ooliteConsoleServer
+#
+#  Per-connection copy of Oolite's debug console configuration.
+#
+
+
+"""
+Configuration values received from one Oolite connection.
+
+Oolite sends its whole configuration in a 'Note Configuration' packet and
+later changes in 'Note Configuration Change' packets.  ConfigurationState
+keeps the current values for a single connection and remembers which keys
+changed or were removed since the last takeChanges(), so the delegate only
+has to act on the difference.
+
+snapshot() hands out the underlying dict without copying it; the next
+change copies it first, so a snapshot never changes under its holder.
+"""
+
+
+def _same(a, b):
+	# == that also tells True from 1 and 1.0 from 1, as the plist does
+	if type(a) is not type(b):
+		return False
+	if isinstance(a, (list, tuple)):
+		return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+	if isinstance(a, dict):
+		return len(a) == len(b) and all(key in b and _same(value, b[key]) for key, value in a.items())
+	return a == b
+
+
+class ConfigurationState(object):
+	"""
+	Public methods:
+		get(key, default=None)
+		snapshot()  -- current values as a dict, which must not be modified
+		replace(values)  -- a full configuration; keys not in values are removed
+		update(values)  -- a partial configuration
+		remove(keys)
+		takeChanges()  -- (changed, removed): a dict of new/changed values and
+						  a list of removed keys since the last call
+
+	Also supports `key in state`, state[key] and len(state).
+	"""
+
+	__slots__ = ('__values', '__shared', '__changed', '__removed')
+
+	def __init__(self):
+		self.__values = {}
+		self.__shared = False
+		self.__changed = {}
+		self.__removed = set()
+
+
+	def __contains__(self, key):
+		return key in self.__values
+
+
+	def __getitem__(self, key):
+		return self.__values[key]
+
+
+	def __len__(self):
+		return len(self.__values)
+
+
+	def get(self, key, default=None):
+		return self.__values.get(key, default)
+
+
+	def snapshot(self):
+		self.__shared = True
+		return self.__values
+
+
+	def replace(self, values):
+		removed = [key for key in self.__values if key not in values]
+		self.update(values)
+		self.remove(removed)
+
+
+	def update(self, values):
+		current, changed, removed = self.__values, self.__changed, self.__removed
+		for key, value in values.items():
+			if key in current and _same(current[key], value):
+				continue
+			if self.__shared:
+				current = self.__unshare()
+			current[key] = value
+			changed[key] = value
+			removed.discard(key)
+
+
+	def remove(self, keys):
+		current, changed, removed = self.__values, self.__changed, self.__removed
+		for key in keys:
+			if key not in current:
+				continue
+			if self.__shared:
+				current = self.__unshare()
+			del current[key]
+			changed.pop(key, None)
+			removed.add(key)
+
+
+	def takeChanges(self):
+		changed, removed = self.__changed, list(self.__removed)
+		self.__changed = {}
+		self.__removed.clear()
+		return changed, removed
+
+
+	def __unshare(self):
+		self.__values = dict(self.__values)
+		self.__shared = False
+		return self.__values
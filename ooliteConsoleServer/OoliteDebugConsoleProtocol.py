@@ -7,11 +7,50 @@
 #
 
 from .PropertyListPacketProtocol import PropertyListPacketProtocol
+from .ConfigurationState import ConfigurationState
 import ooliteConsoleServer._protocol as P
 
 import logging
 consoleLogger = logging.getLogger('DebugConsole.ODCProtocol')
 
+from sys import version_info
+if version_info[0] == 2:
+	from time import clock as perf_counter
+else:
+	from time import perf_counter
+
+
+class PacketHandler(object):
+	"""
+	Callable wrapper for a packet handler, counting calls and time spent.
+	
+	Public properties:
+		handler  -- the callable, taking the packet dictionary
+		count    -- number of packets handled
+		elapsed  -- total seconds spent in handler
+		slowest  -- longest single call, in seconds
+	"""
+	
+	__slots__ = ('handler', 'count', 'elapsed', 'slowest')
+	
+	def __init__(self, handler):
+		self.handler = handler
+		self.count = 0
+		self.elapsed = self.slowest = 0.0
+	
+	
+	def __call__(self, packet):
+		start = perf_counter()
+		try:
+			return self.handler(packet)
+		finally:
+			spent = perf_counter() - start
+			self.count += 1
+			self.elapsed += spent
+			if spent > self.slowest:
+				self.slowest = spent
+
+
 class OoliteDebugConsoleProtocol (PropertyListPacketProtocol):
 	"""
 	Class handling a debug console connection.
@@ -22,9 +61,12 @@ class OoliteDebugConsoleProtocol (PropertyListPacketProtocol):
 		isOpen()
 		sendCommand(commandString)
 		closeConnection()
+		configuration()  -- all configuration values received, as a read-only dict
 		configurationValue(key)
 		hasConfigurationValue(key)
 		setConfigurationValue(key, value)  -- the effect is not immediate, and does nothing if connection is not oepn.
+		registerPacketHandler(packetType, handler)  -- handle (or override) a packet type; handler(packet)
+		packetStats()  -- [(packetType, count, elapsed, slowest), ...], busiest first
 	
 	Public properties:
 		rejectMessage  -- message used when rejecting connection because there is no delegate.
@@ -34,19 +76,36 @@ class OoliteDebugConsoleProtocol (PropertyListPacketProtocol):
 		acceptConnection()
 		connectionOpened(ooliteVersionString)
 		connectionClosed(message)
+		loadConfig(config, removed)  -- optional; the full configuration first, then only
+			changed values and a list of the keys removed
 		writeToConsole(message, colorKey, emphasisRanges)
+		classifyOutput(message, colorKey, emphasisRanges)  -- optional; returns the arguments
+			for writeToConsole, so work on output can be done when a packet is decoded.
+			With a decoder that's on its worker thread, so it must not touch the UI.
 		clearConsole()
 		showConsole()
 	
 	Delegate properties:
 		identityString  -- The name of the console server, sent to Oolite when accepting connection.
+	
+	If the factory has a decoder attribute (a PacketDecoder), each connection
+	decodes its packets with it.
 	"""
 	
 	rejectMessage = None
 	
-	__configuration = {}
+	# constant parts of outgoing packets sent with sendStringPacket
+	__performCommand = { P.packetTypeKey: P.performCommandPacket }
+	__closeConnection = { P.packetTypeKey: P.closeConnectionPacket }
+	__pong = { P.packetTypeKey: P.pongPacket }
+	
+	__configuration = None				# ConfigurationState, per connection
+	__configLoaded = False
+	__classify = None					# delegate's classifyOutput
+	__outputRecord = None				# its result for the packet being handled, see preparePacket
 	__open = False
 	__closed = False
+	__handlers = None
 	
 	
 	def isOpen(self):
@@ -57,36 +116,42 @@ class OoliteDebugConsoleProtocol (PropertyListPacketProtocol):
 		if self.__open:
 			# cmdStr = commandString.decode('ascii') if isinstance(commandString, bytes) else commandString
 			cmdStr = commandString.decode('utf-8') if isinstance(commandString, bytes) else commandString
-			packet = { P.packetTypeKey: P.performCommandPacket, P.messageKey: cmdStr or "" }
-			self.sendPlistPacket(packet)
+			self.sendStringPacket(self.__performCommand, P.messageKey, cmdStr or "")
 	
 	
 	def closeConnection(self, message):
 		if self.__open:
 			self.__open = False
-			packet = { P.packetTypeKey: P.closeConnectionPacket }
 			if message != None:
 				# msgStr = message.decode('ascii') if isinstance(message, bytes) else message
 				msgStr = message.decode('utf-8') if isinstance(message, bytes) else message
-				packet[P.messageKey] = msgStr
-			self.sendPlistPacket(packet)
+				self.sendStringPacket(self.__closeConnection, P.messageKey, msgStr)
+			else:
+				self.sendPlistPacket(self.__closeConnection)
 			
 			self.__closed = True
 			self.transport.loseConnection()
 			self.delegate.connectionClosed(message)
 
 			
+	def configuration(self):
+		# Current values as a dict, which must not be modified.
+		if self.__configuration is None:
+			return {}
+		return self.__configuration.snapshot()
+	
+	
 	def configurationValue(self, key):
-		if key in self.__configuration:
-			return self.__configuration[key]
+		if self.__configuration is not None:
+			return self.__configuration.get(key)
 	
 	
 	def hasConfigurationValue(self, key):
-		return key in self.__configuration
+		return self.__configuration is not None and key in self.__configuration
 	
 	
 	def setConfigurationValue(self, key, value):
-		if self.__open and (not hasattr(self.__configuration, key) or self.__configuration[key] != value):
+		if self.__open and (key not in self.__configuration or self.__configuration[key] != value):
 			packet = { P.packetTypeKey: P.noteConfigurationChangePacket }
 			# packet = { P.packetTypeKey: P.noteConfigurationPacket } # these types of packets are receive only
 			if value != None:
@@ -95,12 +160,42 @@ class OoliteDebugConsoleProtocol (PropertyListPacketProtocol):
 				packet[P.removedConfigurationKeysKey] = [key]
 			self.sendPlistPacket(packet)
 	
+	def registerPacketHandler(self, packetType, handler):
+		# Handlers registered before the delegate is created (eg. in its
+		# __init__) are in place for the first packet.
+		self.__packetHandlers()[packetType] = PacketHandler(handler)
+	
+	
+	def packetStats(self):
+		stats = [(packetType, handler.count, handler.elapsed, handler.slowest)
+					for packetType, handler in self.__packetHandlers().items()
+					if handler.count]
+		stats.sort(key=lambda stat: stat[2], reverse=True)
+		return stats
+	
+	
 	# Internals beyod this point
 	def connectionMade(self):
+		self.__configuration = ConfigurationState()
+		self.__packetHandlers()
+		self.decoder = getattr(self.factory, 'decoder', None)
 		self.delegate = self.factory.delegateClass(self)
+		self.__classify = getattr(self.delegate, 'classifyOutput', None)
 
 		
 	def connectionLost(self, reason):
+		# Packets still with the decoder arrived first, so are handled first.
+		if self.decoder is not None:
+			self.decoder.callAfter(self, self.__connectionLost, reason)
+		else:
+			self.__connectionLost(reason)
+	
+	
+	def __connectionLost(self, reason):
+		if consoleLogger.isEnabledFor(logging.DEBUG):
+			for stat in self.packetStats():
+				consoleLogger.debug('{!r}: {} packets, {:.3f}s total, {:.2f}ms slowest'.format(
+										stat[0], stat[1], stat[2], stat[3] * 1000))
 		if self.__open:
 			self.__open = False
 			self.delegate.connectionClosed(None)
@@ -110,29 +205,36 @@ class OoliteDebugConsoleProtocol (PropertyListPacketProtocol):
 		self.delegate.connectionClosed(reason)
 
 		
-	def plistPacketReceived(self, packet):
+	def plistPacketReceived(self, packet, prepared=None):
 		# Dispatch based on packet type.
 		type = packet[P.packetTypeKey]
-		if type == P.requestConnectionPacket:
-			self.__requestConnectionPacket(packet)
-		elif type == P.closeConnectionPacket:
-			self.__closeConnectionPacket(packet)
-		elif type == P.consoleOutputPacket:
-			self.__consoleOutputPacket(packet)
-		elif type == P.clearConsolePacket:
-			self.__clearConsolePacket(packet)
-		elif type == P.showConsolePacket:
-			self.__showConsolePacket(packet)
-		elif type == P.noteConfigurationPacket:
-			self.__noteConfigurationPacket(packet)
-		elif type == P.noteConfigurationChangePacket:
-			self.__noteConfigurationChangePacket(packet)
-		elif type == P.pingPacket:
-			self.__pingPacket(packet)
-		elif type == P.pongPacket:
-			self.__pongPacket(packet)
-		else:
+		handler = (self.__handlers or self.__packetHandlers()).get(type)
+		if handler is None:
 			self.__unknownPacket(type, packet)
+		else:
+			self.__outputRecord = prepared	# for __consoleOutputPacket, handlers take just the packet
+			try:
+				handler(packet)
+			finally:
+				self.__outputRecord = None
+	
+	
+	def preparePacket(self, packet):
+		# Runs on the decoder's thread if there is one; returns classifyOutput's
+		# result for console output, which plistPacketReceived gets with the packet.
+		if self.__classify is not None and isinstance(packet, dict) and \
+				packet.get(P.packetTypeKey) == P.consoleOutputPacket:
+			return self.__classify(packet.get(P.messageKey),
+								packet.get(P.colorKeyKey), packet.get(P.emphasisRangesKey))
+		return None
+	
+	
+	def __packetHandlers(self):
+		# Bind the class table (below) to this connection on first use.
+		if self.__handlers is None:
+			self.__handlers = dict((packetType, PacketHandler(method.__get__(self, type(self))))
+									for packetType, method in self.__handlerTable.items())
+		return self.__handlers
 	
 	
 	def DebugConsole(self, data):
@@ -191,6 +293,9 @@ class OoliteDebugConsoleProtocol (PropertyListPacketProtocol):
 	
 	def __consoleOutputPacket(self, packet):
 		if self.__open:
+			if self.__outputRecord is not None:	# already classified by the delegate
+				self.delegate.writeToConsole(*self.__outputRecord)
+				return
 			message = None
 			colorKey = None
 			emphasisRanges = None
@@ -217,27 +322,39 @@ class OoliteDebugConsoleProtocol (PropertyListPacketProtocol):
 	
 	def __noteConfigurationPacket(self, packet):
 		if self.__open and P.configurationKey in packet:
-			self.__configuration = packet[P.configurationKey]
-			if hasattr(self.delegate, 'loadConfig'):
-				self.delegate.loadConfig(self.__configuration)
+			self.__configuration.replace(packet[P.configurationKey])
+			self.__configChanged(full=True)
 	
 	
 	def __noteConfigurationChangePacket(self, packet):
 		if self.__open:
 			if P.configurationKey in packet:
-				for k, v in packet[P.configurationKey].items():
-					self.__configuration[k] = v
+				self.__configuration.update(packet[P.configurationKey])
 			if P.removedConfigurationKeysKey in packet:
-				for k in packet[P.removedConfigurationKeysKey]:
-					del self.__configuration[k]
+				self.__configuration.remove(packet[P.removedConfigurationKeysKey])
+			self.__configChanged()
+	
+	
+	def __configChanged(self, full=False):
+		# The delegate gets the whole configuration from the first 'Note
+		# Configuration', then only what changed or was removed.
+		changed, removed = self.__configuration.takeChanges()
+		if not hasattr(self.delegate, 'loadConfig'):
+			return
+		if not self.__configLoaded:
+			if full:
+				self.__configLoaded = True
+				self.delegate.loadConfig(self.__configuration.snapshot(), [])
+		elif changed or removed:
+			self.delegate.loadConfig(changed, removed)
 	
 	
 	def __pingPacket(self, packet):
 		# Respond to ping packet by sending back pong packet with same message (if any).
-		response = { P.packetTypeKey: P.pongPacket }
 		if P.messageKey in packet:
-			response[P.messageKey] = packet[P.messageKey]
-		self.sendPlistPacket(response)
+			self.sendStringPacket(self.__pong, P.messageKey, packet[P.messageKey])
+		else:
+			self.sendPlistPacket(self.__pong)
 	
 	
 	def __pongPacket(self, packet):
@@ -248,3 +365,17 @@ class OoliteDebugConsoleProtocol (PropertyListPacketProtocol):
 	def __unknownPacket(self, type, packet):
 		#unknown packet, complain.
 		consoleLogger.error('Unkown packet type "{}", ignoring.'.format(type))
+	
+	
+	# Built once per class; the methods are bound per connection by __packetHandlers().
+	__handlerTable = {
+		P.requestConnectionPacket:			__requestConnectionPacket,
+		P.closeConnectionPacket:			__closeConnectionPacket,
+		P.consoleOutputPacket:				__consoleOutputPacket,
+		P.clearConsolePacket:				__clearConsolePacket,
+		P.showConsolePacket:				__showConsolePacket,
+		P.noteConfigurationPacket:			__noteConfigurationPacket,
+		P.noteConfigurationChangePacket:	__noteConfigurationChangePacket,
+		P.pingPacket:						__pingPacket,
+		P.pongPacket:						__pongPacket,
+	}
@@ -0,0 +1,157 @@
+#
+#  PacketDecoder.py
+#  ooliteConsoleServer
+#
+#  Decoding of received packets on a worker thread.
+#
+
+
+"""
+A worker thread that decodes packets for PropertyListPacketProtocols.
+
+A protocol with a decoder submits each packet's bytes from dataReceived()
+instead of decoding them there. The worker runs the protocol's
+decodePacket() (plist decoding plus preparePacket(), the subclass's own
+off-thread work) and the reactor thread is handed the results, in the
+order the packets arrived, through packetDecoded().
+
+Both hand-offs are deques, whose append() and popleft() are atomic, so
+neither side takes a lock per packet; the worker sleeps on an Event while
+it has nothing to do, and wakes the reactor with callFromThread() only when
+the reactor has no results waiting already.  The 'reactor' is whichever
+event loop runs the protocols: callFromThread is Twisted's reactor method of
+that name, or an asyncio loop's call_soon_threadsafe().
+"""
+
+from collections import deque
+from threading import Thread, Event, current_thread
+
+import logging
+decoderLogger = logging.getLogger('DebugConsole.PacketDecoder')
+
+
+class PacketDecoder(object):
+	"""
+	Public methods:
+		submit(protocol, data)  -- called on the reactor thread with a packet's
+								   bytes, which must not change afterwards
+		callAfter(protocol, fn, *args)  -- call fn(*args) on the reactor thread
+								   once packets submitted so far for protocol
+								   have been delivered
+		pending(protocol)  -- packets submitted for protocol not yet delivered
+		stop(timeout=None)  -- end the worker, dropping packets not yet decoded, and
+								   wait up to timeout seconds for it to finish, so it's
+								   done with the reactor before that is closed
+
+	A protocol with more than maxPending packets not yet delivered has its
+	input held (see PropertyListPacketProtocol.holdInput) until half of them
+	have been, so a burst waits in the socket rather than in memory.  The
+	reactor is woken when batchSize results are waiting, or the worker is
+	idle, whichever comes first.
+	"""
+
+	def __init__(self, callFromThread=None, maxPending=2000, batchSize=200):
+		if callFromThread is None:	# Twisted's reactor; asyncio passes loop.call_soon_threadsafe
+			from twisted.internet import reactor
+			callFromThread = reactor.callFromThread
+		self.callFromThread = callFromThread
+		self.maxPending = maxPending
+		self.batchSize = batchSize		# results that wake the reactor before the worker is idle
+		self.__received = deque()		# (protocol, data or None, callable or None), to the worker
+		self.__decoded = deque()		# (protocol, result or None, callable or None), to the reactor
+		self.__ready = Event()
+		self.__wakePending = False		# a deliver() is scheduled on the reactor
+		self.__pending = {}				# protocol: count, on the reactor thread only
+		self.__thread = None
+
+
+	def submit(self, protocol, data):
+		pending = self.__pending[protocol] = self.__pending.get(protocol, 0) + 1
+		if pending > self.maxPending:
+			protocol.holdInput(self)
+		self.__put((protocol, data, None))
+
+
+	def callAfter(self, protocol, fn, *args):
+		if self.__pending.get(protocol):
+			self.__put((protocol, None, (fn, args)))
+		else:
+			fn(*args)
+
+
+	def pending(self, protocol):
+		return self.__pending.get(protocol, 0)
+
+
+	def stop(self, timeout=None):
+		thread = self.__thread
+		if thread is not None:
+			self.__received.appendleft(None)	# ahead of what's waiting, which is dropped
+			self.__ready.set()
+			self.__thread = None
+			if thread is not current_thread():
+				thread.join(timeout)
+
+
+	def __put(self, item):
+		if self.__thread is None:
+			self.__thread = Thread(target=self.__run, name='PacketDecoder')
+			self.__thread.daemon = True	# never keeps the process alive
+			self.__thread.start()
+		self.__received.append(item)
+		if not self.__ready.is_set():	# the worker clears it before it empties received
+			self.__ready.set()
+
+
+	def __run(self):
+		received, decoded, ready = self.__received, self.__decoded, self.__ready
+		while True:
+			ready.wait()
+			ready.clear()				# before emptying received, so a later submit sets it again
+			while received:
+				item = received.popleft()
+				if item is None:
+					return				# stop()
+				protocol, data, call = item
+				if call is None:
+					try:
+						item = (protocol, protocol.decodePacket(data), None)
+					except Exception:
+						decoderLogger.exception('Failed to decode packet')
+						item = (protocol, (None, None, data), None)
+				decoded.append(item)
+				if len(decoded) >= self.batchSize:
+					self.__wake()
+			self.__wake()				# caught up
+
+
+	def __wake(self):
+		if self.__decoded and not self.__wakePending:
+			self.__wakePending = True
+			try:
+				self.callFromThread(self.__deliver)
+			except RuntimeError:		# an asyncio loop closed before stop() was done waiting
+				decoderLogger.warning('Decoded packets left undelivered, the event loop is closed')
+
+
+	def __deliver(self):
+		# On the reactor thread.  Cleared before emptying decoded, so anything
+		# the worker appends after that schedules another call.
+		self.__wakePending = False
+		decoded, pending = self.__decoded, self.__pending
+		while decoded:
+			protocol, result, call = decoded.popleft()
+			try:
+				if call is not None:
+					fn, args = call
+					fn(*args)
+					continue
+				count = pending[protocol] = pending[protocol] - 1
+				if count == self.maxPending // 2:
+					protocol.releaseInput(self)
+				elif count == 0:
+					del pending[protocol]
+					protocol.releaseInput(self)
+				protocol.packetDecoded(*result)
+			except Exception:
+				decoderLogger.exception('Failed to deliver packet')
@@ -8,8 +8,6 @@
 #  Trivial fixes (c) 2024 MrFlibble CC-by-NC-SA 4
 #
 
-from twisted.internet.protocol import Protocol
-
 from sys import version_info
 Python2 = version_info[0] == 2
 if Python2:
@@ -18,10 +16,19 @@ if Python2:
 else:
 	from plistlib import loads, dumps
 
+from struct import Struct
+from re import compile
+from ._plistDecoder import decodePacketPlist
+
 import logging
 plistLogger = logging.getLogger('DebugConsole.PLPProtocol')
 
 
+# Packet header: data length as a big-endian 32-bit integer
+HEADER = Struct('>I')
+HEADER_SIZE = HEADER.size
+
+
 def readPlistFromString(data):
 	"""Read a plist data from a string. Return the root object.
 	"""
@@ -31,6 +38,18 @@ def readPlistFromString(data):
 		return loads(data)
 
 
+def readPacketPlist(data):
+	"""Read a packet's plist data (bytes or memoryview). Return the root object.
+	The plists Oolite sends are decoded directly; anything else goes to plistlib.
+	"""
+	if Python2 and isinstance(data, memoryview):
+		data = data.tobytes()
+	try:
+		return decodePacketPlist(data)
+	except Exception:
+		return readPlistFromString(data)
+
+
 def writePlistToString(rootObject):
 	"""Return 'rootObject' as a plist-formatted string.
 	"""
@@ -40,6 +59,84 @@ def writePlistToString(rootObject):
 		return dumps(rootObject)
 
 
+_CONTROL_CHARS_RE = compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def escapePlistString(text):
+	"""Escape text as plistlib does for a <string>, returning None for
+	text plistlib would reject (control characters) or that isn't text.
+	"""
+	if Python2 and isinstance(text, str):
+		try:
+			text = text.decode('ascii')
+		except UnicodeError:
+			return None
+	elif not isinstance(text, type(u'')):
+		return None
+	if _CONTROL_CHARS_RE.search(text) is not None:
+		return None
+	if '\r' in text:
+		text = text.replace('\r\n', '\n').replace('\r', '\n')
+	return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+_TEMPLATE_MARKER = 'OoTemplateMarker'
+_TEMPLATE_PROBE = u'a <b> & c\r\nd\re \u00e9 \u2713'
+_templates = {}						# (fixed items, key) -> (prefix, suffix), or None if unusable
+
+def packetTemplate(fixed, key):
+	"""
+	Return the encoded plist for fixed plus key split around key's value as
+	(prefix, suffix), so that prefix + escaped value + suffix is the packet.
+	Templates are built once and kept only if they reproduce plistlib's
+	output exactly for a probe string; otherwise None is cached.
+	"""
+	cacheKey = (tuple(sorted(fixed.items())), key)
+	if cacheKey in _templates:
+		return _templates[cacheKey]
+	template = None
+	try:
+		packet = dict(fixed)
+		packet[key] = _TEMPLATE_MARKER
+		data = writePlistToString(packet)
+		if data.count(_TEMPLATE_MARKER.encode('ascii')) == 1:
+			prefix, _, suffix = data.partition(_TEMPLATE_MARKER.encode('ascii'))
+			packet[key] = _TEMPLATE_PROBE
+			probe = prefix + escapePlistString(_TEMPLATE_PROBE).encode('utf-8') + suffix
+			if probe == writePlistToString(packet):
+				template = (prefix, suffix)
+	except Exception:
+		plistLogger.exception('Failed to build packet template for {}'.format(cacheKey))
+	_templates[cacheKey] = template
+	return template
+
+
+class Protocol(object):
+	"""
+	The parts of Twisted's IProtocol that its transports, and AsyncioServer's,
+	use; so the protocols here don't need Twisted to be imported to exist.
+	"""
+	
+	connected = 0
+	transport = None
+	
+	def makeConnection(self, transport):
+		self.connected = 1
+		self.transport = transport
+		self.connectionMade()
+	
+	def connectionMade(self):
+		pass
+	
+	def dataReceived(self, data):
+		pass
+	
+	def connectionLost(self, reason):
+		pass
+	
+	def logPrefix(self):
+		return self.__class__.__name__
+
+
 class PropertyListPacketProtocol(Protocol):
 	"""
 	Class handling a property list packet stream.
@@ -54,22 +151,33 @@ class PropertyListPacketProtocol(Protocol):
 	packet data. This is followed by packet data. The packet data is an XML
 	property list.
 	
-	This class is a Twisted protocol implementing the packet framing and XML
-	property list decoding (using plistlib to handle the details of that). It
-	is implemented as an implicit state machine, with two states: receiving
-	header (identified by a __sizeCount less than 4) and receiving data. When
-	a full data packet is received, it is decoded as a plist and dispatched
-	to a subclass's plistPacketReceived() method.
+	This class is a protocol, for Twisted or (through AsyncioServer) asyncio,
+	implementing the packet framing and XML property list decoding (using a
+	decoder specialised for the plists Oolite sends, and plistlib for
+	anything else).
+	Incoming data is appended to a single receive buffer which is consumed
+	through a read offset: a header is decoded only once all four of its
+	bytes are present, and a packet only once all of its data is present, so
+	partial frames simply wait for the next call. Packet data is handed on as
+	a memoryview slice of the buffer, and the consumed part of the buffer is
+	discarded only when it is empty or the offset has grown large. When a
+	full data packet is received, it is decoded as a plist and dispatched to
+	a subclass's plistPacketReceived() method.
+	
+	If decoder is set to a PacketDecoder, packets are decoded on its worker
+	thread instead, along with whatever the subclass does in preparePacket(),
+	and dispatched when the reactor thread gets them back.  holdInput() and
+	releaseInput() pause reading from the transport while any holder needs
+	it to, which is how the decoder, or the application, pushes back on a
+	burst it can't keep up with.
 	"""
 	
-	if Python2:
-		__buffer = ""
-		__received = ""
-	else: # in pdb, prepend to key: _PropertyListPacketProtocol
-		__buffer = bytearray()
-		__received = bytearray()
-	__expect = 0
-	__sizeCount = 0
+	# in pdb, prepend to key: _PropertyListPacketProtocol
+	__received = None					# receive buffer, created per connection on first data
+	__offset = 0						# start of unconsumed data in __received
+	__holds = None						# holders of input, see holdInput
+	compactThreshold = 64 * 1024		# consumed bytes tolerated before buffer is compacted
+	decoder = None						# PacketDecoder, or None to decode in dataReceived
 	
 	def dataReceived(self, data):
 		"""
@@ -80,34 +188,43 @@ class PropertyListPacketProtocol(Protocol):
 		"""
 
 		# Append data to incoming buffer
-		self.__received += data
-
-		# Loop over buffer
-		while len(self.__received) > 0:
-			if self.__sizeCount < 4:
-				# Receiving header (size)
-				# Decode as big-endian 32-bit integer
-				if Python2:
-					self.__expect = (self.__expect << 8) + ord(self.__received[0])
-				else:
-					self.__expect = (self.__expect << 8) + self.__received[0]
-				self.__received = self.__received[1:]
-				self.__sizeCount += 1
-			else:
-				# Receiving data
-				if len(self.__received) < self.__expect:
-					# This is not the end of the data
-					self.__buffer += self.__received
-					self.__expect -= len(self.__received)
-					self.__received = "" if Python2 else bytearray()
-				else:
-					self.__buffer += self.__received[:self.__expect]
-					self.__received = self.__received[self.__expect:]
-					try:
-						self.__dispatchPacket()
-					finally:
-						# Expect new packet
-						self.__reset()
+		if self.__received is None:
+			self.__received = bytearray()
+		received = self.__received
+		received += data
+
+		# Loop over complete packets in buffer
+		offset, available = self.__offset, len(received)
+		view = memoryview(received)
+		try:
+			while available - offset >= HEADER_SIZE:
+				# Decode header as big-endian 32-bit integer
+				length, = HEADER.unpack_from(received, offset)
+				start = offset + HEADER_SIZE
+				end = start + length
+				if end > available:
+					break				# rest of packet not yet received
+				offset = end
+				packet = view[start:end]
+				try:
+					self.__dispatchPacket(packet)
+				finally:
+					if not Python2:
+						packet.release()
+					del packet			# a live slice would pin the buffer's size
+		finally:
+			if not Python2:
+				view.release()
+			del view
+			# Discard consumed data; cheap when everything was used, otherwise
+			# only worth the copy once the dead space is large
+			if offset == available:
+				del received[:]
+				offset = 0
+			elif offset > self.compactThreshold and offset > available - offset:
+				del received[:offset]
+				offset = 0
+			self.__offset = offset
 
 
 	def sendPlistPacket(self, packet):
@@ -124,42 +241,85 @@ class PropertyListPacketProtocol(Protocol):
 		except:
 			data = None
 		if data:
-			length = len(data)
-			if Python2:
-				self.transport.write(chr((length >> 24) & 0xFF))
-				self.transport.write(chr((length >> 16) & 0xFF))
-				self.transport.write(chr((length >> 8) & 0xFF))
-				self.transport.write(chr(length & 0xFF))
-			else:
-				hdr = bytearray( ((length >> 24) & 0xFF, (length >> 16) & 0xFF, (length >> 8) & 0xFF, length & 0xFF) )
-				self.temp=bytes(hdr)
-				self.transport.write(self.temp)
-			self.transport.write(data)
+			self.__writePacket(data)
 		else:
 			self.badPListSend(packet)
 
-	def __dispatchPacket(self):
-		# Decode plist and send to subclass method
-		plist = None
+	def sendStringPacket(self, fixed, key, string):
+		"""
+		Send a packet made of fixed (a dict of constant strings) plus key: string.
+		
+		The plist around the string is encoded once per distinct fixed and
+		key, so only the escaped string is encoded per call. The result is
+		byte for byte what sendPlistPacket would send.
+		"""
+		template = packetTemplate(fixed, key)
+		escaped = escapePlistString(string) if template else None
+		if escaped is None:				# no template, or string needs plistlib's judgement
+			packet = dict(fixed)
+			packet[key] = string
+			self.sendPlistPacket(packet)
+		else:
+			prefix, suffix = template
+			self.__writePacket(prefix + escaped.encode('utf-8') + suffix)
+
+	def __writePacket(self, data):
+		# Header and data in a single write
+		self.transport.write(HEADER.pack(len(data)) + data)
+
+	def holdInput(self, holder):
+		"""
+		Stop reading from the transport until releaseInput(holder); input
+		resumes once every holder has released it.
+		"""
+		if self.__holds is None:
+			self.__holds = set()
+		if not self.__holds and self.transport is not None:
+			self.transport.pauseProducing()
+		self.__holds.add(holder)
+
+	def releaseInput(self, holder):
+		holds = self.__holds
+		if holds and holder in holds:
+			holds.remove(holder)
+			if not holds and self.transport is not None:
+				self.transport.resumeProducing()
+
+	def __dispatchPacket(self, data):
+		if self.decoder is not None:
+			self.decoder.submit(self, data.tobytes())	# a copy, as the buffer is reused
+		else:
+			self.packetDecoded(*self.decodePacket(data))
+
+	def decodePacket(self, data):
+		"""
+		Decode a packet's data, returning (plist, prepared, None), where
+		prepared is what preparePacket() made of it, or (None, None, data)
+		if it isn't a plist.  With a decoder this runs on its worker thread.
+		"""
 		try:
-			plist = readPlistFromString(self.__buffer)
+			plist = readPacketPlist(data)
 		except:
 			plist = None
 		if plist:
-			self.plistPacketReceived(plist)
-		else:
-			self.DebugConsole(self.__buffer)
-
-	def __reset(self):
-		# Reset to waiting-for-beginning-of-packet state.
-		self.__expect = 0
-		self.__sizeCount = 0
-		if Python2:
-			self.__buffer = "" 
+			return plist, self.preparePacket(plist), None
+		return None, None, data
+
+	def packetDecoded(self, plist, prepared, data):
+		# Send a decoded plist to subclass method
+		if plist:
+			self.plistPacketReceived(plist, prepared)
 		else:
-			del self.__buffer[:]
+			self.DebugConsole(data.tobytes() if isinstance(data, memoryview) else data)
+
+	def preparePacket(self, plist):
+		# Work on a received plist that needn't be on the reactor thread (and
+		# so must not touch anything there) is a subclass option; what it
+		# returns is passed to plistPacketReceived() with the plist, which
+		# is left as it is.
+		return None
 
-	def plistPacketReceived(self, plist):
+	def plistPacketReceived(self, plist, prepared=None):
 		# Doing something useful with the plist is a subclass responsibilitiy.
 		pass
 
@@ -0,0 +1,166 @@
+#
+#  _plistDecoder.py
+#  ooliteConsoleServer
+#
+#  Fast decoding of the XML property lists used by the debug console protocol.
+#
+
+
+"""
+Decoder for the small XML property lists Oolite sends as packets.
+
+Packets are dictionaries of strings, numbers, booleans and arrays of those
+(eg. 'packet type', 'message', 'color key', 'emphasis ranges' and the nested
+'configuration' dictionary). decodePacketPlist() pulls these tag by tag with
+one compiled pattern and builds the Python objects directly. Anything outside
+that subset (data, date, comments, CDATA, attributes, other encodings) raises
+UnsupportedPlist so the caller can fall back to plistlib.
+"""
+
+from codecs import decode
+from re import compile, VERBOSE, IGNORECASE
+
+from sys import version_info
+Python2 = version_info[0] == 2
+if Python2:
+	unichr_ = unichr
+else:
+	unichr_ = chr
+
+
+class UnsupportedPlist(ValueError):
+	"""The data is not a plist this decoder handles; use plistlib instead."""
+	pass
+
+
+# optional xml declaration & doctype, then the <plist> root element
+_PROLOG_RE = compile(r'''\s*
+	(?: <\?xml (?P<decl>[^>]*) \?> \s* )?
+	(?: <!DOCTYPE [^>\[]* > \s* )?
+	<plist (?: \s+ version="1\.0" )? \s* >''', VERBOSE)
+_ENCODING_RE = compile(r'encoding\s*=\s*["\'](?!utf-?8["\'])', IGNORECASE)
+
+_TOKEN_RE = compile(r'''\s*<(?:
+	(?P<tag>key|string|integer|real)>(?P<body>[^<]*)</(?P=tag)>	# element with text
+	| (?P<empty>string|dict|array|true|false)\s*/>					# empty element
+	| (?P<open>dict|array)>											# container start
+	| /(?P<close>dict|array|plist)>									# container end
+)''', VERBOSE)
+_TRAILING_RE = compile(r'\s*$')
+
+_ENTITY_RE = compile(r'&(?:(lt|gt|amp|quot|apos)|\#([0-9]+)|\#x([0-9a-fA-F]+));')
+_ENTITIES = {'lt': '<', 'gt': '>', 'amp': '&', 'quot': '"', 'apos': "'"}
+
+_EMPTY_VALUES = {'true': True, 'false': False}
+
+
+def _entity(match):
+	name, dec, hexa = match.groups()
+	if name:
+		return _ENTITIES[name]
+	return unichr_(int(dec) if dec else int(hexa, 16))
+
+
+def _unescape(text):
+	if '&' in text:
+		if '&' in _ENTITY_RE.sub('', text):
+			raise UnsupportedPlist('unsupported entity')
+		text = _ENTITY_RE.sub(_entity, text)
+	if Python2:						# plistlib returns str for ascii strings
+		try:
+			return text.encode('ascii')
+		except UnicodeError:
+			pass
+	return text
+
+
+def _integer(text):
+	text = text.strip()
+	if text.startswith('0x') or text.startswith('0X'):
+		return int(text, 16)
+	return int(text)
+
+
+def decodePacketPlist(data):
+	"""
+	Decode a packet's XML plist (bytes, bytearray or memoryview).
+	Returns the root object, raising UnsupportedPlist for anything
+	outside the subset described in the module docstring.
+	"""
+	try:
+		text = decode(data, 'utf-8')
+	except UnicodeError:
+		raise UnsupportedPlist('not utf-8')
+	if text.startswith(u'\ufeff'):	# byte order mark
+		text = text[1:]
+	if '\r' in text:				# as the XML parser does for character data
+		text = text.replace('\r\n', '\n').replace('\r', '\n')
+
+	match = _PROLOG_RE.match(text)
+	if match is None:
+		raise UnsupportedPlist('no plist prolog')
+	decl = match.group('decl')
+	if decl and _ENCODING_RE.search(decl):
+		raise UnsupportedPlist('not utf-8')
+	pos = match.end()
+
+	stack = []						# open containers
+	keys = []						# pending key for each open container (None for arrays)
+	root = closing = None
+	haveRoot = False
+	for match in _TOKEN_RE.finditer(text, pos):
+		if match.start() != pos:
+			break					# something other than a supported element
+		pos = match.end()
+		tag, body, empty, opening, closing = match.groups()
+		if tag == 'key':
+			if not stack or keys[-1] is not None or stack[-1].__class__ is not dict:
+				raise UnsupportedPlist('misplaced key')
+			keys[-1] = _unescape(body) if '&' in body or Python2 else body
+			continue
+		if closing:
+			if closing == 'plist':
+				if stack or not haveRoot:
+					raise UnsupportedPlist('unbalanced plist')
+				break
+			if not stack or keys[-1] is not None or \
+					(closing == 'dict') != (stack[-1].__class__ is dict):
+				raise UnsupportedPlist('unbalanced {}'.format(closing))
+			stack.pop()
+			keys.pop()
+			continue
+		if tag == 'string':
+			value = _unescape(body) if '&' in body or Python2 else body
+		elif tag == 'integer':
+			value = _integer(body)
+		elif tag == 'real':
+			value = float(body)
+		elif empty:
+			value = _EMPTY_VALUES[empty] if empty in _EMPTY_VALUES \
+						else {} if empty == 'dict' else [] if empty == 'array' else ''
+		else:
+			value = {} if opening == 'dict' else []
+
+		if stack:
+			container = stack[-1]
+			if container.__class__ is dict:
+				key = keys[-1]
+				if key is None:
+					raise UnsupportedPlist('value without key')
+				container[key] = value
+				keys[-1] = None
+			else:
+				container.append(value)
+		elif haveRoot:
+			raise UnsupportedPlist('multiple root objects')
+		else:
+			root, haveRoot = value, True
+		if opening:
+			stack.append(value)
+			keys.append(None)
+	if closing != 'plist':
+		raise UnsupportedPlist('unsupported element at {}'.format(pos))
+
+	if _TRAILING_RE.match(text, pos) is None:
+		raise UnsupportedPlist('data after plist')
+	return root
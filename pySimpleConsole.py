@@ -91,6 +91,7 @@ factory.protocol = OoliteDebugConsoleProtocol
 # Set up command line I/O protocol
 cliHandler = OoliteDebugCLIProtocol()
 cliHandler.getInputReceiver = getInputReceiver
+cliHandler.stop = reactor.stop
 stdio.StandardIO(cliHandler)
 
 print("Python Oolite debug console")